@@ -12,9 +12,15 @@
 #   License for the specific language governing permissions and limitations
 #   under the License.
 
+import time
+
 import pbr.version
 
-from novaclient import api_versions
+# Time the import of novaclient started at, the start of the profiles of the
+# shell commands.
+_import_start = time.time()
+
+from novaclient import api_versions  # noqa: E402
 
 
 __version__ = pbr.version.VersionInfo('python-novaclient').version_string()
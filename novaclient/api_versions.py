@@ -16,7 +16,7 @@ import logging
 import os
 import pkgutil
 import re
-import traceback
+import sys
 import warnings
 
 from oslo_utils import strutils
@@ -35,6 +35,8 @@ HEADER_NAME = "OpenStack-API-Version"
 SERVICE_TYPE = "compute"
 
 _SUBSTITUTIONS = {}
+# (name, major, minor) -> function picked in _SUBSTITUTIONS for that version
+_RESOLVED_METHODS = {}
 
 _type_error_msg = _("'%(other)s' should be an instance of '%(cls)s'")
 
@@ -238,16 +240,33 @@ def get_api_version(version_string):
     return api_version
 
 
-def _get_server_version_range(client):
+def _get_version_cache_key(client):
+    # NOTE: The endpoint and the project identify the deployment and the
+    # auth scope, which is all the version document depends on.
+    return "%s %s" % (client.client.get_endpoint(),
+                      client.project_id or client.project_name or "")
+
+
+def _get_server_version_range(client, version_cache=None):
+    if version_cache is not None:
+        key = _get_version_cache_key(client)
+        cached = version_cache.get(key)
+        if cached is not None:
+            return APIVersion(cached[0]), APIVersion(cached[1])
+
     version = client.versions.get_current()
 
     if not hasattr(version, 'version') or not version.version:
-        return APIVersion(), APIVersion()
+        version_range = (None, None)
+    else:
+        version_range = (version.min_version, version.version)
 
-    return APIVersion(version.min_version), APIVersion(version.version)
+    if version_cache is not None:
+        version_cache.set(key, *version_range)
+    return APIVersion(version_range[0]), APIVersion(version_range[1])
 
 
-def discover_version(client, requested_version):
+def discover_version(client, requested_version, version_cache=None):
     """Discover most recent version supported by API and client.
 
     Checks ``requested_version`` and returns the most recent version
@@ -255,10 +274,13 @@ def discover_version(client, requested_version):
 
     :param client: client object
     :param requested_version: requested version represented by APIVersion obj
+    :param version_cache: `novaclient.cache.VersionCache` object to reuse
+        the version range of the server discovered by previous calls
+        (optional)
     :returns: APIVersion
     """
     server_start_version, server_end_version = _get_server_version_range(
-        client)
+        client, version_cache)
 
     if (not requested_version.is_latest() and
             requested_version != APIVersion('2.0')):
@@ -335,6 +357,7 @@ def check_headers(response, api_version):
 def _add_substitution(versioned_method):
     _SUBSTITUTIONS.setdefault(versioned_method.name, [])
     _SUBSTITUTIONS[versioned_method.name].append(versioned_method)
+    _RESOLVED_METHODS.clear()
 
 
 def _get_function_name(func):
@@ -345,11 +368,13 @@ def _get_function_name(func):
     #    ("im_class" property does not exist at that moment)
     #  we need to write own logic to obtain the full function name which
     #  include module name, owner name(optional) and just function name.
-    filename, _lineno, _name, line = traceback.extract_stack()[-4]
-    module, _file_extension = os.path.splitext(filename)
-    module = module.replace("/", ".")
-    if module.endswith(func.__module__):
-        return "%s.[%s].%s" % (func.__module__, line, func.__name__)
+    # The frame which applies the decorator is the body of the owner class
+    # if there is one. Class bodies always define __module__ and their code
+    # object is named after the class.
+    frame = sys._getframe(2)
+    if "__module__" in frame.f_locals:
+        return "%s.%s.%s" % (func.__module__, frame.f_code.co_name,
+                             func.__name__)
     else:
         return "%s.%s" % (func.__module__, func.__name__)
 
@@ -365,6 +390,27 @@ def get_substitutions(func_name, api_version=None):
     return sorted(substitutions, key=lambda m: m.start_version)
 
 
+def _get_versioned_method(name, api_version):
+    """Returns the function implementing ``name`` for ``api_version``.
+
+    The result only depends on the registered substitutions and on the
+    version, so it is resolved once per version and reused by the following
+    calls.
+    """
+    key = (name, api_version.ver_major, api_version.ver_minor)
+    try:
+        return _RESOLVED_METHODS[key]
+    except KeyError:
+        pass
+
+    methods = get_substitutions(name, api_version)
+    if not methods:
+        raise exceptions.VersionNotFoundForAPIMethod(
+            api_version.get_string(), name)
+    _RESOLVED_METHODS[key] = methods[-1].func
+    return methods[-1].func
+
+
 # FIXME(mriedem): This breaks any ManagerWithFind.list method that has a
 # 'detailed' kwarg since the ManagerWithFind.findall won't find the correct
 # argspec from the wrapped list method.
@@ -385,12 +431,8 @@ def wraps(start_version, end_version=None):
 
         @functools.wraps(func)
         def substitution(obj, *args, **kwargs):
-            methods = get_substitutions(name, obj.api_version)
-
-            if not methods:
-                raise exceptions.VersionNotFoundForAPIMethod(
-                    obj.api_version.get_string(), name)
-            return methods[-1].func(obj, *args, **kwargs)
+            method = _get_versioned_method(name, obj.api_version)
+            return method(obj, *args, **kwargs)
 
         # Let's share "arguments" with original method and substitution to
         # allow put utils.arg and wraps decorators in any order
@@ -399,10 +441,10 @@ def wraps(start_version, end_version=None):
         substitution.arguments = func.arguments
 
         # NOTE(andreykurilin): The way to obtain function's name in Python 2
-        #   bases on traceback(see _get_function_name for details). Since the
-        #   right versioned method is used in several places, one object
-        #   can have different names. Let's generate name of function one time
-        #   and use __id__ property in all other places.
+        #   bases on the calling frame(see _get_function_name for details).
+        #   Since the right versioned method is used in several places, one
+        #   object can have different names. Let's generate name of function
+        #   one time and use __id__ property in all other places.
         substitution.__id__ = name
 
         return substitution
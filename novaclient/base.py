@@ -22,9 +22,9 @@ Base utilities to build API operation managers and objects on top of.
 import abc
 import contextlib
 import copy
-import hashlib
-import os
 import threading
+import types
+import warnings
 
 from oslo_utils import reflection
 from oslo_utils import strutils
@@ -32,6 +32,9 @@ import requests
 import six
 
 from novaclient import exceptions
+from novaclient.i18n import _
+from novaclient import profiling
+from novaclient import tracing
 from novaclient import utils
 
 
@@ -47,6 +50,9 @@ def getid(obj):
         return obj
 
 
+_hooks_lock = threading.Lock()
+
+
 # TODO(aababilov): call run_hooks() in HookableMixin's child classes
 class HookableMixin(object):
     """Mixin so classes can register and run hooks."""
@@ -60,10 +66,11 @@ class HookableMixin(object):
         :param hook_type: hook type, e.g., '__pre_parse_args__'
         :param hook_func: hook function
         """
-        if hook_type not in cls._hooks_map:
-            cls._hooks_map[hook_type] = []
-
-        cls._hooks_map[hook_type].append(hook_func)
+        # The lists of hooks are replaced instead of being changed, so the
+        # hooks run concurrently by other threads are not affected.
+        with _hooks_lock:
+            cls._hooks_map[hook_type] = (
+                cls._hooks_map.get(hook_type, []) + [hook_func])
 
     @classmethod
     def run_hooks(cls, hook_type, *args, **kwargs):
@@ -227,6 +234,118 @@ class Resource(RequestIdMixin):
         return copy.deepcopy(self._info)
 
 
+class _CompactResourceMixin(object):
+    """Memory efficient variant of a `Resource` class.
+
+    Attributes are not copied into the instance ``__dict__`` but served from
+    the ``_info`` dict when they are looked up, and the request ids list is
+    shared with the listing the resource comes from.
+    """
+
+    _resource_class = None
+
+    def __init__(self, manager, info, loaded=False, resp=None,
+                 request_ids=None):
+        self.manager = manager
+        self._info = info
+        self._loaded = loaded
+        if request_ids is not None:
+            self.x_openstack_request_ids = request_ids
+        else:
+            self.request_ids_setup()
+            self.append_request_ids(resp)
+
+    def __getattr__(self, k):
+        if k.startswith('__') or k in ('_info', '_loaded', 'manager'):
+            raise AttributeError(k)
+        try:
+            return self._info[k]
+        except KeyError:
+            # NOTE(bcwaldon): disallow lazy-loading if already loaded once
+            if not self.is_loaded():
+                self.get()
+                return self.__getattr__(k)
+            raise AttributeError(k)
+
+    def _repr(self):
+        # NOTE: Used as __repr__ only by classes without their own __repr__.
+        reprkeys = sorted(
+            k for k in set(self._info) | set(self.__dict__)
+            if k[0] != '_' and
+            k not in ['manager', 'x_openstack_request_ids'])
+        info = ", ".join("%s=%s" % (k, getattr(self, k)) for k in reprkeys)
+        return "<%s %s>" % (self.__class__.__name__, info)
+
+    def __eq__(self, other):
+        if not isinstance(other, Resource):
+            return NotImplemented
+        if not isinstance(other, self._resource_class):
+            return False
+        if hasattr(self, 'id') and hasattr(other, 'id'):
+            return self.id == other.id
+        return self._info == other._info
+
+    def __ne__(self, other):
+        return not self == other
+
+    def _add_details(self, info):
+        self._info.update(info)
+
+    def append_request_ids(self, resp):
+        # The list is shared with the other resources of the listing, so it
+        # is copied before being changed.
+        self.x_openstack_request_ids = list(self.x_openstack_request_ids)
+        super(_CompactResourceMixin, self).append_request_ids(resp)
+
+
+_COMPACT_CLASSES = {}
+
+
+def get_compact_class(resource_class):
+    """Returns the compact variant of a `Resource` class.
+
+    Instances of the returned class are also instances of
+    ``resource_class`` and behave the same, but they hold the resource
+    attributes only once, in their ``_info`` dict. Resource classes which
+    override ``_add_details`` to reshape the response are returned
+    unchanged.
+
+    :param resource_class: subclass of :class:`Resource`
+    """
+    if (not issubclass(resource_class, Resource) or
+            resource_class._add_details != Resource._add_details):
+        return resource_class
+    try:
+        return _COMPACT_CLASSES[resource_class]
+    except KeyError:
+        attrs = {'_resource_class': resource_class,
+                 '__module__': resource_class.__module__}
+        if resource_class.__repr__ == Resource.__repr__:
+            attrs['__repr__'] = _CompactResourceMixin.__dict__['_repr']
+        compact_class = type(resource_class.__name__,
+                             (_CompactResourceMixin, resource_class), attrs)
+        _COMPACT_CLASSES[resource_class] = compact_class
+        return compact_class
+
+
+class _TracedManagerMeta(abc.ABCMeta):
+    """Traces the public methods of the managers as operations, see
+    `novaclient.tracing`.
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        # the helpers of Manager itself are not operations
+        if any(isinstance(base, _TracedManagerMeta) for base in bases):
+            for attr, value in list(attrs.items()):
+                if (not attr.startswith('_') and
+                        isinstance(value, types.FunctionType) and
+                        not getattr(value, 'traced', False)):
+                    attrs[attr] = tracing.traced(attr, value)
+        return super(_TracedManagerMeta, mcs).__new__(mcs, name, bases,
+                                                      attrs)
+
+
+@six.add_metaclass(_TracedManagerMeta)
 class Manager(HookableMixin):
     """Manager for API service.
 
@@ -234,7 +353,6 @@ class Manager(HookableMixin):
     etc.) and provide CRUD operations for them.
     """
     resource_class = None
-    cache_lock = threading.RLock()
 
     def __init__(self, api):
         self.api = api
@@ -247,10 +365,17 @@ class Manager(HookableMixin):
     def api_version(self):
         return self.api.api_version
 
+    @property
+    def compact_resources(self):
+        return getattr(self.api, 'compact_resources', False)
+
     def _list(self, url, response_key, obj_class=None, body=None,
               filters=None):
         if filters:
             url = utils.get_url_with_filter(url, filters)
+        # NOTE: Only complete listings replace the values recorded for
+        # completion, pages and filtered listings add theirs.
+        complete = not body and '?' not in url
         if body:
             resp, body = self.api.client.post(url, body=body)
         else:
@@ -268,87 +393,92 @@ class Manager(HookableMixin):
             except KeyError:
                 pass
 
-        with self.completion_cache('human_id', obj_class, mode="w"):
-            with self.completion_cache('uuid', obj_class, mode="w"):
-                items = [obj_class(self, res, loaded=True)
-                         for res in data if res]
-                return ListWithMeta(items, resp)
+        with profiling.phase('parse'):
+            if self.compact_resources:
+                items = self._list_compact(obj_class, data, resp)
+            else:
+                items = ListWithMeta([obj_class(self, res, loaded=True)
+                                      for res in data if res], resp)
+        self._index_for_completion(obj_class, items, replace=complete)
+        return items
+
+    def _list_compact(self, obj_class, data, resp):
+        compact_class = get_compact_class(obj_class)
+        items = ListWithMeta([], resp)
+        if compact_class is obj_class:
+            items.extend(obj_class(self, res, loaded=True)
+                         for res in data if res)
+        else:
+            request_ids = items.request_ids
+            items.extend(compact_class(self, res, loaded=True,
+                                       request_ids=request_ids)
+                         for res in data if res)
+        return items
 
     @contextlib.contextmanager
     def alternate_service_type(self, default, allowed_types=()):
-        original_service_type = self.api.client.service_type
-        if original_service_type in allowed_types:
+        """Sends the requests of the current thread to another service.
+
+        :param default: Service type of the endpoint of the requests
+        :param allowed_types: Service types of the client which are used
+            unchanged
+        """
+        client = self.api.client
+        if client.service_type in allowed_types:
             yield
         else:
-            self.api.client.service_type = default
-            try:
+            with client.override_service_type(default):
                 yield
-            finally:
-                self.api.client.service_type = original_service_type
-
-    @contextlib.contextmanager
-    def completion_cache(self, cache_type, obj_class, mode):
-        """The completion cache for bash autocompletion.
 
-        The completion cache store items that can be used for bash
-        autocompletion, like UUIDs or human-friendly IDs.
+    @property
+    def completion_index(self):
+        return getattr(self.api, 'completion_index', None)
 
-        A resource listing will clear and repopulate the cache.
+    def _index_for_completion(self, obj_class, items, replace=False):
+        """Record the ids and human ids of resources for shell completion.
 
-        A resource create will append to the cache.
+        Nothing is done unless the client has a completion index, which is
+        the case of the nova shell only.
 
-        Delete is not handled because listings are assumed to be performed
-        often enough to keep the cache reasonably up-to-date.
+        :param obj_class: class of the resources
+        :param items: resources to record
+        :param replace: drop the values recorded by previous calls
         """
-        # NOTE(wryan): This lock protects read and write access to the
-        # completion caches
-        with self.cache_lock:
-            base_dir = utils.env('NOVACLIENT_UUID_CACHE_DIR',
-                                 default="~/.novaclient")
-
-            # NOTE(sirp): Keep separate UUID caches for each username +
-            # endpoint pair
-            username = utils.env('OS_USERNAME', 'NOVA_USERNAME')
-            url = utils.env('OS_URL', 'NOVA_URL')
-            uniqifier = hashlib.md5(username.encode('utf-8') +
-                                    url.encode('utf-8')).hexdigest()
-
-            cache_dir = os.path.expanduser(os.path.join(base_dir, uniqifier))
-
-            try:
-                os.makedirs(cache_dir, 0o755)
-            except OSError:
-                # NOTE(kiall): This is typically either permission denied while
-                #              attempting to create the directory, or the
-                #              directory already exists. Either way, don't
-                #              fail.
-                pass
-
-            resource = obj_class.__name__.lower()
-            filename = "%s-%s-cache" % (resource, cache_type.replace('_', '-'))
-            path = os.path.join(cache_dir, filename)
-
-            cache_attr = "_%s_cache" % cache_type
+        index = self.completion_index
+        if index is None:
+            return
+        values = set()
+        for item in items:
+            # NOTE: Only look at the known attributes, a lazy load here
+            # would cost a request per resource.
+            known = dict(item._info)
+            known.update(vars(item))
+            if known.get('id') is not None:
+                values.add(six.text_type(known['id']))
+            if item.NAME_ATTR in known and item.human_id is not None:
+                values.add(item.human_id)
+        resource = obj_class.__name__.lower()
+        if replace:
+            index.replace(resource, values)
+        elif values:
+            index.add(resource, values)
 
-            try:
-                setattr(self, cache_attr, open(path, mode))
-            except IOError:
-                # NOTE(kiall): This is typically a permission denied while
-                #              attempting to write the cache file.
-                pass
+    @contextlib.contextmanager
+    def completion_cache(self, cache_type, obj_class, mode):
+        """Deprecated, the completion index is maintained by the manager.
 
-            try:
-                yield
-            finally:
-                cache = getattr(self, cache_attr, None)
-                if cache:
-                    cache.close()
-                    delattr(self, cache_attr)
+        See :class:`novaclient.cache.CompletionIndex`.
+        """
+        warnings.warn(_("Manager.completion_cache is deprecated and does "
+                        "nothing, see novaclient.cache.CompletionIndex."),
+                      DeprecationWarning)
+        yield
 
     def write_to_completion_cache(self, cache_type, val):
-        cache = getattr(self, "_%s_cache" % cache_type, None)
-        if cache:
-            cache.write("%s\n" % val)
+        """Deprecated, see :meth:`completion_cache`."""
+        warnings.warn(_("Manager.write_to_completion_cache is deprecated and "
+                        "does nothing, see novaclient.cache.CompletionIndex."),
+                      DeprecationWarning)
 
     def _get(self, url, response_key, filters=None):
         if filters:
@@ -367,12 +497,16 @@ class Manager(HookableMixin):
         if return_raw:
             return self.convert_into_with_meta(body[response_key], resp)
 
-        with self.completion_cache('human_id', self.resource_class, mode="a"):
-            with self.completion_cache('uuid', self.resource_class, mode="a"):
-                return self.resource_class(self, body[response_key], resp=resp)
+        obj = self.resource_class(self, body[response_key], resp=resp)
+        self._index_for_completion(self.resource_class, [obj])
+        return obj
 
     def _delete(self, url):
         resp, body = self.api.client.delete(url)
+        if self.completion_index is not None and self.resource_class:
+            self.completion_index.delete(
+                self.resource_class.__name__.lower(),
+                [url.rstrip('/').rsplit('/', 1)[-1]])
         return self.convert_into_with_meta(body, resp)
 
     def _update(self, url, body, response_key=None, **kwargs):
@@ -404,10 +538,21 @@ class Manager(HookableMixin):
             return DictWithMeta(item, resp)
 
 
-@six.add_metaclass(abc.ABCMeta)
 class ManagerWithFind(Manager):
     """Like a `Manager`, but with additional `find()`/`findall()` methods."""
 
+    # Attributes which ``findall`` passes in the search options of list calls
+    # which take them, mapped to ``(search option, attribute of the listed
+    # items)``.
+    list_filters = {}
+
+    # Maximum number of concurrent requests made by ``findall`` to get the
+    # details of the items matched in a summary listing.
+    detail_concurrency = 8
+
+    # Attributes of the items of summary listings.
+    _summary_attrs = frozenset(('human_id', 'name', 'display_name'))
+
     @abc.abstractmethod
     def list(self):
         pass
@@ -426,7 +571,11 @@ class ManagerWithFind(Manager):
             return matches[0]
 
     def findall(self, **kwargs):
-        """Find all items with attributes matching ``**kwargs``."""
+        """Find all items with attributes matching ``**kwargs``.
+
+        The attributes of ``list_filters`` are filtered on by the server, the
+        other ones are compared client-side.
+        """
         found = ListWithMeta([], None)
         searches = kwargs.items()
 
@@ -434,11 +583,6 @@ class ManagerWithFind(Manager):
         list_kwargs = {}
 
         list_argspec = reflection.get_callable_args(self.list)
-        if 'detailed' in list_argspec:
-            detailed = ("human_id" not in kwargs and
-                        "name" not in kwargs and
-                        "display_name" not in kwargs)
-            list_kwargs['detailed'] = detailed
 
         if 'is_public' in list_argspec and 'is_public' in kwargs:
             is_public = kwargs['is_public']
@@ -455,39 +599,74 @@ class ManagerWithFind(Manager):
             # volumes does not support regex while servers does. So when
             # doing findall on servers some client side filtering is still
             # needed.
+            search_opts = {}
             if "human_id" in kwargs:
-                list_kwargs['search_opts'] = {"name": kwargs["human_id"]}
+                search_opts["name"] = kwargs["human_id"]
             elif "name" in kwargs:
-                list_kwargs['search_opts'] = {"name": kwargs["name"]}
+                search_opts["name"] = kwargs["name"]
             elif "display_name" in kwargs:
-                list_kwargs['search_opts'] = {"name": kwargs["display_name"]}
+                search_opts["name"] = kwargs["display_name"]
             if "all_tenants" in kwargs:
-                all_tenants = kwargs['all_tenants']
-                list_kwargs['search_opts']['all_tenants'] = all_tenants
+                search_opts['all_tenants'] = kwargs['all_tenants']
                 searches = [(k, v) for k, v in searches if k != 'all_tenants']
             if "deleted" in kwargs:
-                deleted = kwargs['deleted']
-                list_kwargs['search_opts']['deleted'] = deleted
+                search_opts['deleted'] = kwargs['deleted']
                 searches = [(k, v) for k, v in searches if k != 'deleted']
 
+            # NOTE: The server filters are still checked client-side, they
+            # may be ignored, e.g. when they are restricted to admins.
+            checks = []
+            for attr, value in searches:
+                if attr in self.list_filters:
+                    opt, attr = self.list_filters[attr]
+                    search_opts[opt] = value
+                checks.append((attr, value))
+            searches = checks
+            if search_opts:
+                list_kwargs['search_opts'] = search_opts
+
+        if 'detailed' in list_argspec:
+            # The summary listing only has the names of the items, the
+            # details of the matches are got afterwards.
+            attrs = set(attr for attr, _value in searches)
+            detailed = not (attrs and attrs.issubset(self._summary_attrs))
+            list_kwargs['detailed'] = detailed
+
         listing = self.list(**list_kwargs)
         found.append_request_ids(listing.request_ids)
 
+        matches = []
         for obj in listing:
             try:
                 if all(getattr(obj, attr) == value
                         for (attr, value) in searches):
-                    if detailed:
-                        found.append(obj)
-                    else:
-                        detail = self.get(obj.id)
-                        found.append(detail)
-                        found.append_request_ids(detail.request_ids)
+                    matches.append(obj)
             except AttributeError:
                 continue
 
+        if detailed:
+            found.extend(matches)
+        else:
+            for detail in self._get_details(matches):
+                found.append(detail)
+                found.append_request_ids(detail.request_ids)
+
         return found
 
+    def _get_details(self, items):
+        """Gets the detailed version of items of a summary listing.
+
+        Up to ``detail_concurrency`` requests are made at once.
+        """
+        details = []
+        for _item, detail, error in utils.run_concurrently(
+                lambda item: self.get(item.id), items,
+                self.detail_concurrency):
+            if error is not None:
+                raise error
+            details.append(detail)
+        return details
+
 
 class BootingManagerWithFind(ManagerWithFind):
     """Like a `ManagerWithFind`, but has the ability to boot servers."""
@@ -0,0 +1,488 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Caches of API responses and of resource ids used by the client and the shell.
+"""
+
+import abc
+import bisect
+import collections
+import copy
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from oslo_serialization import jsonutils
+import requests
+from requests import structures
+import six
+from six.moves.urllib import parse
+
+from novaclient import environment
+
+# Seconds a GET response stays valid for, per resource type. Resources which
+# are not listed (servers, migrations, ...) change too often to be cached
+# unless a default TTL is given.
+DEFAULT_TTLS = {
+    'extensions': 3600,
+    'flavors': 300,
+    'images': 300,
+    'limits': 30,
+    'networks': 300,
+    'os-availability-zone': 300,
+    'versions': 3600,
+}
+
+DEFAULT_MAX_ENTRIES = 256
+
+# Seconds the microversion range of a server is trusted for.
+DEFAULT_VERSION_TTL = 3600
+
+# Seconds a name is resolved to the same resource id for.
+DEFAULT_NAME_TTL = 300
+
+# Resources whose content depends on other resources, so writes on the
+# latter have to invalidate them too.
+_DEPENDENT_RESOURCES = ('limits',)
+
+_VERSION_SEGMENT = ('v2', 'v2.0', 'v2.1')
+
+
+def user_cache_dir(username, url):
+    """Returns the cache directory of an user of an endpoint.
+
+    The directories are under env[NOVACLIENT_UUID_CACHE_DIR] or
+    ``~/.novaclient``.
+    """
+    base_dir = environment.env('NOVACLIENT_UUID_CACHE_DIR',
+                               default="~/.novaclient")
+    uniqifier = hashlib.md5((username or '').encode('utf-8') +
+                            (url or '').encode('utf-8')).hexdigest()
+    return os.path.join(base_dir, uniqifier)
+
+
+def resource_type(url):
+    """Returns the resource type of a request URL.
+
+    It is the first segment of the path relative to the endpoint, e.g.
+    ``flavors`` for ``/flavors/detail?is_public=None`` or ``images`` for
+    ``/v2/images``. Absolute URLs are only used to get version documents.
+    """
+    parsed = parse.urlparse(url)
+    if parsed.netloc:
+        return 'versions'
+    for segment in parsed.path.split('/'):
+        if segment and segment not in _VERSION_SEGMENT:
+            return segment
+    return 'versions'
+
+
+@six.add_metaclass(abc.ABCMeta)
+class ResponseCache(object):
+    """Base class of the caches of GET responses.
+
+    Entries are keyed by a string which identifies the request (URL,
+    microversion and project) and grouped by resource type, so that a write
+    on a resource drops all of its cached entries.
+
+    :param ttls: dict of the TTL in seconds for each resource type, defaults
+        to ``DEFAULT_TTLS``
+    :param default_ttl: TTL of the resource types missing from ``ttls``.
+        Responses of these types are not cached if it is None.
+    :param max_entries: Number of entries kept, the least recently used ones
+        are evicted first
+    """
+
+    def __init__(self, ttls=None, default_ttl=None,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+
+    def get_ttl(self, resource):
+        return self.ttls.get(resource, self.default_ttl)
+
+    @abc.abstractmethod
+    def get(self, resource, key):
+        """Returns the ``(resp, body)`` cached for a request or None."""
+
+    @abc.abstractmethod
+    def set(self, resource, key, resp, body):
+        """Stores the response of a request if its resource is cacheable."""
+
+    @abc.abstractmethod
+    def invalidate(self, resource):
+        """Drops all the entries of a resource type."""
+
+    def on_write(self, url):
+        resource = resource_type(url)
+        for name in (resource,) + _DEPENDENT_RESOURCES:
+            self.invalidate(name)
+
+    @staticmethod
+    def _dump(resp, body):
+        return {'status_code': resp.status_code,
+                'headers': dict(resp.headers),
+                'url': resp.url,
+                'body': copy.deepcopy(body)}
+
+    @staticmethod
+    def _load(data):
+        resp = requests.Response()
+        resp.status_code = data['status_code']
+        resp.headers = structures.CaseInsensitiveDict(data['headers'])
+        resp.url = data['url']
+        resp.encoding = 'utf-8'
+        if data['body'] is not None:
+            resp._content = jsonutils.dump_as_bytes(data['body'])
+        else:
+            resp._content = b''
+        return resp, copy.deepcopy(data['body'])
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache of responses.
+
+    It can be shared by several clients and threads.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MemoryCache, self).__init__(*args, **kwargs)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, resource, key):
+        with self._lock:
+            entry = self._entries.pop((resource, key), None)
+            if entry is None or entry[0] < time.time():
+                return None
+            self._entries[(resource, key)] = entry
+        return self._load(entry[1])
+
+    def set(self, resource, key, resp, body):
+        ttl = self.get_ttl(resource)
+        if not ttl:
+            return
+        entry = (time.time() + ttl, self._dump(resp, body))
+        with self._lock:
+            self._entries.pop((resource, key), None)
+            self._entries[(resource, key)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, resource):
+        with self._lock:
+            for entry_key in list(self._entries):
+                if entry_key[0] == resource:
+                    del self._entries[entry_key]
+
+
+def _write_atomically(path, data):
+    """Atomically replaces the content of ``path`` with ``data`` bytes."""
+    try:
+        os.makedirs(os.path.dirname(path), 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+class FileCache(ResponseCache):
+    """On-disk cache of responses, shared by consecutive processes.
+
+    Each entry is a JSON file in a sub-directory of ``directory`` named
+    after its resource type. The modification time of the files tracks
+    their last use for the LRU eviction.
+
+    :param directory: Directory of the cache, defaults to
+        env[NOVACLIENT_RESPONSE_CACHE_DIR] or ``~/.novaclient/responses``
+    """
+
+    def __init__(self, directory=None, *args, **kwargs):
+        super(FileCache, self).__init__(*args, **kwargs)
+        self.directory = os.path.expanduser(
+            directory or environment.env('NOVACLIENT_RESPONSE_CACHE_DIR',
+                                         default='~/.novaclient/responses'))
+
+    def _path(self, resource, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, resource.replace('/', '_'),
+                            name + '.json')
+
+    def get(self, resource, key):
+        path = self._path(resource, key)
+        try:
+            with open(path) as f:
+                entry = jsonutils.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('key') != key or entry.get('expires', 0) < time.time():
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return self._load(entry['response'])
+
+    def set(self, resource, key, resp, body):
+        ttl = self.get_ttl(resource)
+        if not ttl:
+            return
+        path = self._path(resource, key)
+        entry = {'key': key,
+                 'expires': time.time() + ttl,
+                 'response': self._dump(resp, body)}
+        try:
+            _write_atomically(path, jsonutils.dump_as_bytes(entry))
+        except (IOError, OSError):
+            # NOTE: The cache is an optimization only, a read-only or full
+            # disk must not break the requests.
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _mtime, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self, resource):
+        shutil.rmtree(os.path.join(self.directory, resource.replace('/', '_')),
+                      ignore_errors=True)
+
+
+class VersionCache(object):
+    """On-disk cache of the microversion ranges supported by servers.
+
+    It is used by `novaclient.api_versions.discover_version` to skip the
+    request of the version document.
+
+    :param path: JSON file of the cache, defaults to
+        env[NOVACLIENT_VERSION_CACHE] or ``~/.novaclient/versions.json``
+    :param ttl: Seconds a discovered version range is used for
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_VERSION_TTL):
+        self.path = os.path.expanduser(
+            path or environment.env('NOVACLIENT_VERSION_CACHE',
+                                    default='~/.novaclient/versions.json'))
+        self.ttl = ttl
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return jsonutils.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        """Returns the ``(min_version, max_version)`` strings or None."""
+        entry = self._load().get(key)
+        if entry is None or entry['expires'] < time.time():
+            return None
+        return entry['min_version'], entry['max_version']
+
+    def set(self, key, min_version, max_version):
+        now = time.time()
+        entries = dict((k, v) for k, v in self._load().items()
+                       if v.get('expires', 0) >= now)
+        entries[key] = {'min_version': min_version,
+                        'max_version': max_version,
+                        'expires': now + self.ttl}
+        try:
+            _write_atomically(self.path, jsonutils.dump_as_bytes(entries))
+        except (IOError, OSError):
+            pass
+
+
+class CompletionIndex(object):
+    """Index of the ids and human ids of resources for shell completion.
+
+    The values of each resource type are kept in a sorted file with one
+    value per line, ``<directory>/<resource>-cache``, which the bash and zsh
+    completion scripts read directly. Lookups by prefix are a bisection and
+    every update of a resource type is written atomically at once.
+
+    :param directory: Directory of the index
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        # the updates read and write the whole file, they are serialized so
+        # the updates of concurrent threads are not lost
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_user(cls, username, url):
+        """Returns the index of an user of an endpoint.
+
+        See `user_cache_dir` for its location.
+        """
+        return cls(user_cache_dir(username, url))
+
+    def _path(self, resource):
+        return os.path.join(self.directory, "%s-cache" % resource)
+
+    def _read(self, resource):
+        try:
+            with open(self._path(resource), 'rb') as f:
+                return [line.decode('utf-8').rstrip('\n') for line in f
+                        if line.strip()]
+        except (IOError, OSError):
+            return []
+
+    def _write(self, resource, values):
+        data = ''.join(u"%s\n" % value for value in sorted(values))
+        try:
+            _write_atomically(self._path(resource), data.encode('utf-8'))
+        except (IOError, OSError):
+            # NOTE(kiall): This is typically a permission denied while
+            #              attempting to write the cache file.
+            pass
+
+    def replace(self, resource, values):
+        """Replaces all the values recorded for a resource type."""
+        values = set(values)
+        with self._lock:
+            if values != set(self._read(resource)):
+                self._write(resource, values)
+
+    def add(self, resource, values):
+        """Adds values to the ones recorded for a resource type."""
+        with self._lock:
+            current = set(self._read(resource))
+            if not current.issuperset(values):
+                self._write(resource, current.union(values))
+
+    def delete(self, resource, values):
+        """Removes values from the ones recorded for a resource type."""
+        with self._lock:
+            current = set(self._read(resource))
+            if not current.isdisjoint(values):
+                self._write(resource, current.difference(values))
+
+    def lookup(self, resource, prefix=''):
+        """Returns the sorted values of a resource type starting by prefix."""
+        values = self._read(resource)
+        start = bisect.bisect_left(values, prefix)
+        end = start
+        while end < len(values) and values[end].startswith(prefix):
+            end += 1
+        return values[start:end]
+
+
+class NameIndex(object):
+    """TTL-bounded index of resource ids by name.
+
+    It is used by `novaclient.utils.find_resource` to resolve a name with a
+    single GET of the recorded id instead of listing the whole collection.
+    Keys are built by `make_key` from the manager, its project and the name,
+    so that the same name of different resource types or projects doesn't
+    collide.
+
+    :param path: JSON file to share the index between processes, the index
+        is only kept in memory if None
+    :param ttl: Seconds a name is resolved to the same id for
+    :param concurrent: Whether the candidate lookups of a name which isn't
+        in the index are made concurrently
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_NAME_TTL, concurrent=True):
+        self.path = os.path.expanduser(path) if path else None
+        self.ttl = ttl
+        self.concurrent = concurrent
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_user(cls, username, url, **kwargs):
+        """Returns the index of an user of an endpoint, kept in a file.
+
+        See `user_cache_dir` for its location.
+        """
+        return cls(os.path.join(user_cache_dir(username, url), 'names.json'),
+                   **kwargs)
+
+    @staticmethod
+    def make_key(manager, name, find_args=None):
+        api = getattr(manager, 'api', None)
+        project = (getattr(api, 'project_id', None) or
+                   getattr(api, 'project_name', None) or '')
+        resource_class = getattr(manager, 'resource_class', None)
+        args = ','.join('%s=%s' % item
+                        for item in sorted((find_args or {}).items()))
+        return u'%s|%s|%s|%s' % (getattr(resource_class, '__name__', ''),
+                                 project, args, name)
+
+    def _load(self):
+        if self.path is None:
+            return self._entries
+        try:
+            with open(self.path) as f:
+                return jsonutils.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _store(self, entries):
+        if self.path is None:
+            self._entries = entries
+            return
+        try:
+            _write_atomically(self.path, jsonutils.dump_as_bytes(entries))
+        except (IOError, OSError):
+            pass
+
+    def get(self, key):
+        """Returns the id recorded for a key or None."""
+        entry = self._load().get(key)
+        if entry is None or entry['expires'] < time.time():
+            return None
+        return entry['id']
+
+    def set(self, key, resource_id):
+        now = time.time()
+        with self._lock:
+            entries = dict((k, v) for k, v in self._load().items()
+                           if v.get('expires', 0) >= now)
+            entries[key] = {'id': resource_id, 'expires': now + self.ttl}
+            self._store(entries)
+
+    def delete(self, key):
+        with self._lock:
+            entries = self._load()
+            if key in entries:
+                entries = dict(entries)
+                del entries[key]
+                self._store(entries)
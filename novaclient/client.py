@@ -20,24 +20,33 @@
 OpenStack Client interface. Handles the REST calls and responses.
 """
 
+import collections
+import contextlib
 import itertools
 import pkgutil
+import threading
 import warnings
 
 from keystoneauth1 import adapter
+from keystoneauth1 import exceptions as ks_exceptions
 from keystoneauth1 import identity
 from keystoneauth1 import session as ksession
 from oslo_utils import importutils
 import pkg_resources
+from six.moves.urllib import parse
 
 osprofiler_profiler = importutils.try_import("osprofiler.profiler")
 osprofiler_web = importutils.try_import("osprofiler.web")
 
 import novaclient
 from novaclient import api_versions
+from novaclient import cache
 from novaclient import exceptions
 from novaclient import extension as ext
 from novaclient.i18n import _
+from novaclient import metrics
+from novaclient import profiling
+from novaclient import tracing
 from novaclient import utils
 
 # TODO(jichenjc): when an extension in contrib is moved to core extension,
@@ -45,6 +54,10 @@ from novaclient import utils
 # remove the whole function
 extensions_ignored_name = ["__init__"]
 
+# Timings kept by a client, the latencies of all the requests are kept in
+# the histograms of its metrics.
+MAX_TIMINGS = 1000
+
 
 class SessionClient(adapter.LegacyJsonAdapter):
 
@@ -52,13 +65,46 @@ class SessionClient(adapter.LegacyJsonAdapter):
     client_version = novaclient.__version__
 
     def __init__(self, *args, **kwargs):
-        self.times = []
+        self.times = collections.deque(maxlen=MAX_TIMINGS)
         self.timings = kwargs.pop('timings', False)
+        self.metrics = kwargs.pop('metrics', None) or metrics.Metrics()
         self.api_version = kwargs.pop('api_version', None)
         self.api_version = self.api_version or api_versions.APIVersion()
+        self.response_cache = kwargs.pop('response_cache', None)
+        self.pacer = kwargs.pop('pacer', None)
+        # whether the keystone session was created by novaclient, rather
+        # than given by the caller who may share it with other clients
+        self.own_session = kwargs.pop('own_session', False)
+        # state of the requests of each thread, the client is shared between
+        # the threads of the callers
+        self._local = threading.local()
         super(SessionClient, self).__init__(*args, **kwargs)
 
+    @contextlib.contextmanager
+    def override_service_type(self, service_type):
+        """Sends the requests of the current thread to another service.
+
+        The endpoint is selected per request, so the other threads sharing
+        the client keep using the endpoint of its ``service_type``.
+
+        :param service_type: Service type of the endpoint of the requests
+        """
+        previous = getattr(self._local, 'service_type', None)
+        self._local.service_type = service_type
+        try:
+            yield
+        finally:
+            self._local.service_type = previous
+
+    def _endpoint_filter(self):
+        service_type = getattr(self._local, 'service_type', None)
+        return {'service_type': service_type} if service_type else {}
+
     def request(self, url, method, **kwargs):
+        endpoint_filter = self._endpoint_filter()
+        if endpoint_filter:
+            endpoint_filter.update(kwargs.get('endpoint_filter') or {})
+            kwargs['endpoint_filter'] = endpoint_filter
         kwargs.setdefault('headers', kwargs.get('headers', {}))
         api_versions.update_headers(kwargs["headers"], self.api_version)
 
@@ -70,11 +116,53 @@ class SessionClient(adapter.LegacyJsonAdapter):
         # NOTE(jamielennox): The standard call raises errors from
         # keystoneauth1, where we need to raise the novaclient errors.
         raise_exc = kwargs.pop('raise_exc', True)
-        with utils.record_time(self.times, self.timings, method, url):
-            resp, body = super(SessionClient, self).request(url,
-                                                            method,
-                                                            raise_exc=False,
-                                                            **kwargs)
+
+        cache_key = None
+        if self.response_cache is not None:
+            if method.upper() == 'GET':
+                resource = cache.resource_type(url)
+                cache_key = self._get_cache_key(url)
+                cached = self.response_cache.get(resource, cache_key)
+                if cached is not None:
+                    return cached
+            else:
+                self.response_cache.on_write(url)
+
+        attempts = []
+
+        def send():
+            start = metrics._clock()
+            resp = None
+            try:
+                with utils.record_time(self.times, self.timings, method,
+                                       url):
+                    with profiling.phase('http'), tracing.request_span(
+                            method, url, self.api_version) as span:
+                        resp, body = super(SessionClient, self).request(
+                            url, method, raise_exc=False, **kwargs)
+                        if span is not None:
+                            span.set_response(resp)
+            finally:
+                # requests without response, e.g. which could not connect,
+                # are recorded too, with no status code
+                if resp is None:
+                    status_code, nbytes = None, 0
+                else:
+                    status_code = resp.status_code
+                    nbytes = metrics.response_bytes(resp)
+                self.metrics.observe(method, url, metrics._clock() - start,
+                                     status_code, nbytes,
+                                     retry=bool(attempts))
+                attempts.append(status_code)
+            return resp, body
+
+        if self.pacer is not None:
+            resp, body = self.pacer.send(method, send)
+        else:
+            resp, body = send()
+
+        if cache_key is not None and resp.status_code == 200:
+            self.response_cache.set(resource, cache_key, resp, body)
 
         # TODO(andreykurilin): uncomment this line, when we will be able to
         #   check only nova-related calls
@@ -84,11 +172,23 @@ class SessionClient(adapter.LegacyJsonAdapter):
 
         return resp, body
 
+    def _get_cache_key(self, url):
+        if not parse.urlparse(url).netloc:
+            endpoint = self.get_endpoint(**self._endpoint_filter())
+            url = "%s/%s" % (endpoint.rstrip('/'), url.lstrip('/'))
+        try:
+            project_id = self.get_project_id()
+        except ks_exceptions.MissingAuthPlugin:
+            project_id = None
+        version = ('' if self.api_version.is_null()
+                   else self.api_version.get_string())
+        return ' '.join([project_id or '', version, url])
+
     def get_timings(self):
         return self.times
 
     def reset_timings(self):
-        self.times = []
+        self.times = collections.deque(maxlen=MAX_TIMINGS)
 
     @property
     def management_url(self):
@@ -135,7 +235,8 @@ def _construct_http_client(api_version=None,
                            user_id=None,
                            username=None,
                            **kwargs):
-    if not session:
+    own_session = not session
+    if own_session:
         if not auth and auth_token:
             auth = identity.Token(auth_url=auth_url,
                                   token=auth_token,
@@ -169,6 +270,7 @@ def _construct_http_client(api_version=None,
                          service_name=service_name,
                          service_type=service_type,
                          session=session,
+                         own_session=own_session,
                          timings=timings,
                          user_agent=user_agent,
                          **kwargs)
@@ -122,6 +122,11 @@ class InstanceInDeletedState(Exception):
     pass
 
 
+class ResourceWaitTimeout(Exception):
+    """Resource did not reach the expected state in time."""
+    pass
+
+
 class ClientException(Exception):
     """
     The base exception class for all exceptions this library raises.
@@ -0,0 +1,244 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Metrics of the requests of a client: latency histograms and counters of the
+status codes, retries and bytes of each operation, in bounded memory.
+"""
+
+import bisect
+import collections
+import json
+import re
+import threading
+import time
+
+from oslo_utils import encodeutils
+from six.moves.urllib import parse
+
+EXPORT_FORMATS = ('json', 'prometheus')
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Upper bounds in seconds of the buckets of the histograms, from 1ms to
+# about 10 minutes with a relative error of at most 19%.
+BUCKETS = tuple(0.001 * 2 ** (i / 4.0) for i in range(77))
+
+# Operations recorded separately, the requests of the next ones are
+# recorded together under OTHER.
+MAX_OPERATIONS = 1000
+OTHER = ('*', '*')
+
+_ID_RE = re.compile(r'^(?:[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?'
+                    r'[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}|\d+)$')
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+def url_template(url):
+    """Returns the path of a URL with its IDs replaced by ``{id}``.
+
+    The query string is removed and the UUIDs, with or without dashes, and
+    the integers of the path are considered IDs, so the requests to the
+    same kind of resource have the same template, e.g. ``/servers/{id}``.
+    """
+    path = parse.urlparse(url).path
+    return '/'.join('{id}' if _ID_RE.match(segment) else segment
+                    for segment in path.split('/'))
+
+
+class Histogram(object):
+    """Distribution of latencies in fixed buckets.
+
+    Only the number of latencies in each bucket is kept, so the quantiles
+    are estimated within the precision of the buckets.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Returns the estimated latency under which a ratio of the requests
+        completed, None without requests.
+
+        :param q: Ratio, between 0 and 1
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                break
+        upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+        lower = BUCKETS[index - 1] if index else 0.0
+        # interpolated in the bucket, which is within the observed range
+        value = upper - (upper - lower) * (seen - rank) / count
+        return min(max(value, self.min), self.max)
+
+
+class Metrics(object):
+    """Metrics of the requests of clients, by operation.
+
+    An operation is the method and the :func:`url_template` of requests.
+    The memory used is bounded: a histogram is kept by operation, for
+    :data:`MAX_OPERATIONS` operations at most. The metrics can be shared by
+    several clients and threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latencies = collections.OrderedDict()
+            self._statuses = collections.defaultdict(int)
+            self._retries = collections.defaultdict(int)
+            self._bytes = collections.defaultdict(int)
+
+    def _operation(self, method, url):
+        operation = (method.upper(), url_template(url))
+        if (operation not in self._latencies and
+                len(self._latencies) >= MAX_OPERATIONS):
+            return OTHER
+        return operation
+
+    def observe(self, method, url, seconds, status_code=None, nbytes=0,
+                retry=False):
+        """Records a request.
+
+        :param method: HTTP method of the request
+        :param url: URL of the request
+        :param seconds: Latency of the request
+        :param status_code: Status code of the response, None if there is
+            none
+        :param nbytes: Bytes of the body of the response
+        :param retry: Whether the request is the retry of a refused one
+        """
+        with self._lock:
+            operation = self._operation(method, url)
+            histogram = self._latencies.get(operation)
+            if histogram is None:
+                histogram = self._latencies[operation] = Histogram()
+            histogram.observe(seconds)
+            self._statuses[operation + (status_code or 'error',)] += 1
+            if retry:
+                self._retries[operation] += 1
+            self._bytes[operation] += nbytes
+
+    def as_list(self):
+        """Returns the metrics of each operation.
+
+        :returns: list of dicts with the ``method``, ``path`` template,
+            ``count`` of requests, their ``retries``, the ``bytes`` received,
+            the number of requests by ``status`` code, and the ``sum``,
+            ``p50``, ``p95`` and ``p99`` of the latencies in seconds
+        """
+        with self._lock:
+            statuses = collections.defaultdict(dict)
+            for (method, path, status), count in self._statuses.items():
+                statuses[method, path][str(status)] = count
+            operations = []
+            for operation, histogram in self._latencies.items():
+                metrics = collections.OrderedDict([
+                    ('method', operation[0]), ('path', operation[1]),
+                    ('count', histogram.count),
+                    ('retries', self._retries.get(operation, 0)),
+                    ('bytes', self._bytes.get(operation, 0)),
+                    ('status', statuses[operation]),
+                    ('sum', histogram.sum)])
+                for q in QUANTILES:
+                    metrics['p%d' % (q * 100)] = histogram.quantile(q)
+                operations.append(metrics)
+        return operations
+
+    def to_json(self):
+        return json.dumps(self.as_list(), indent=4)
+
+    def to_prometheus(self):
+        """Returns the metrics in the text format of Prometheus.
+
+        The latencies are exported as a summary with their quantiles.
+        """
+        latencies = []
+        statuses = []
+        retries = []
+        nbytes = []
+        for metrics in self.as_list():
+            labels = 'method="%s",path="%s"' % (
+                metrics['method'], _escape(metrics['path']))
+            for q in QUANTILES:
+                latencies.append('novaclient_request_duration_seconds'
+                                 '{%s,quantile="%s"} %r' % (
+                                     labels, q, metrics['p%d' % (q * 100)]))
+            latencies.append('novaclient_request_duration_seconds_sum{%s} %r'
+                             % (labels, metrics['sum']))
+            latencies.append('novaclient_request_duration_seconds_count{%s} '
+                             '%d' % (labels, metrics['count']))
+            for status, count in sorted(metrics['status'].items()):
+                statuses.append('novaclient_requests_total{%s,status="%s"} '
+                                '%d' % (labels, status, count))
+            retries.append('novaclient_request_retries_total{%s} %d' % (
+                labels, metrics['retries']))
+            nbytes.append('novaclient_response_bytes_total{%s} %d' % (
+                labels, metrics['bytes']))
+
+        lines = []
+        for name, kind, description, samples in (
+                ('novaclient_request_duration_seconds', 'summary',
+                 'Latency of the API requests.', latencies),
+                ('novaclient_requests_total', 'counter',
+                 'API requests by status code.', statuses),
+                ('novaclient_request_retries_total', 'counter',
+                 'Retries of the API requests refused for going over a '
+                 'rate limit.', retries),
+                ('novaclient_response_bytes_total', 'counter',
+                 'Bytes of the bodies of the API responses.', nbytes)):
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, kind))
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def export(self, export_format):
+        """Returns the metrics in one of :data:`EXPORT_FORMATS`."""
+        if export_format == 'prometheus':
+            return self.to_prometheus()
+        return self.to_json()
+
+
+def _escape(value):
+    return encodeutils.safe_decode(value).replace(
+        '\\', '\\\\').replace('"', '\\"')
+
+
+def response_bytes(resp):
+    """Returns the bytes of the body of a response."""
+    length = resp.headers.get('content-length')
+    if length is not None and length.isdigit():
+        return int(length)
+    return len(resp.content or b'')
@@ -0,0 +1,240 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pacing of the requests of a client: rate limiting, retries of the requests
+refused for going over the rate limits and adaptive concurrency.
+"""
+
+import contextlib
+import email.utils
+import random
+import threading
+import time
+
+from novaclient.i18n import _
+
+# Idempotent methods, which are retried when refused for going over a rate
+# limit.
+RETRIED_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT'])
+
+_UNIT_SECONDS = {'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400}
+
+_clock = getattr(time, 'monotonic', time.time)
+_sleep = time.sleep
+
+
+def retry_after(resp):
+    """Returns the seconds to wait before retrying a refused request.
+
+    :returns: None if the request was not refused for going over a rate
+        limit, i.e. its status is not 429, or 413 with a ``Retry-After``
+        header (413 alone is also used for exceeded quotas), else the
+        seconds of its ``Retry-After`` header, 0 if it has none
+    """
+    value = resp.headers.get('retry-after')
+    if resp.status_code != 429 and (resp.status_code != 413 or
+                                    value is None):
+        return None
+    if value is None:
+        return 0
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        pass
+    date = email.utils.parsedate_tz(value)
+    if date is None:
+        return 0
+    return max(email.utils.mktime_tz(date) - time.time(), 0)
+
+
+class TokenBucket(object):
+    """Limits the rate of requests.
+
+    :param rate: Requests per second
+    :param burst: Requests which can be made at once after idling, the rate
+        by default
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(_("The rate must be positive."))
+        self.rate = float(rate)
+        self.burst = max(float(burst or rate), 1.0)
+        self._tokens = self.burst
+        self._updated = _clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Waits until a request can be made."""
+        with self._lock:
+            now = _clock()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is reserved right away, the callers wait in turn
+            self._tokens -= 1
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            _sleep(wait)
+
+
+class AdaptiveConcurrency(object):
+    """Limit of the concurrent requests adapted to the API (AIMD).
+
+    The limit is halved when a request is refused for going over a rate
+    limit, and increased by one once as many requests as the limit have
+    succeeded.
+
+    :param maximum: Initial and highest limit, None for no limit until a
+        request is refused
+    :param minimum: Lowest limit
+    """
+
+    def __init__(self, maximum=None, minimum=1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = maximum
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Waits for the number of requests in flight to be under the
+        limit for the duration of a request.
+        """
+        with self._cond:
+            while self.limit is not None and self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            if self.limit is None or self.limit == self.maximum:
+                return
+            self._successes += 1
+            if self._successes >= self.limit:
+                self._successes = 0
+                self.limit += 1
+                self._cond.notify_all()
+
+    def on_overlimit(self):
+        with self._cond:
+            limit = self.limit
+            if limit is None:
+                # the refused request is not in flight anymore
+                limit = self._active + 1
+            self.limit = max(self.minimum, limit // 2)
+            self._successes = 0
+
+
+class Pacer(object):
+    """Paces the requests of a :class:`novaclient.client.SessionClient`.
+
+    The requests are made at the rate of a token bucket. The idempotent
+    requests refused for going over a rate limit are retried after their
+    ``Retry-After`` delay or an exponential backoff, both with a random
+    jitter, and the number of concurrent requests is adapted to the
+    refusals. A request whose ``Retry-After`` delay is longer than
+    ``max_backoff`` is not retried, its refusal is returned instead.
+
+    :param rate: Requests per second, not limited if None
+    :param burst: Requests which can be made at once after idling
+    :param max_retries: Times a refused request is retried
+    :param backoff: Seconds the first retry is delayed by at most without
+        ``Retry-After``, doubled for each of the next ones
+    :param max_backoff: Highest backoff and ``Retry-After`` delay waited
+        for in seconds
+    :param max_concurrency: Initial and highest number of concurrent
+        requests, see :class:`AdaptiveConcurrency`
+    :param adaptive: Whether the concurrency is adapted to the refusals
+    """
+
+    def __init__(self, rate=None, burst=None, max_retries=3, backoff=0.5,
+                 max_backoff=60, max_concurrency=None, adaptive=True):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.concurrency = (AdaptiveConcurrency(max_concurrency)
+                            if adaptive else None)
+
+    @classmethod
+    def from_limits(cls, limits, **kwargs):
+        """Returns a pacer at the rate of the most restrictive rate limit.
+
+        :param limits: :class:`novaclient.v2.limits.Limits` returned by
+            ``LimitsManager.get()``
+        :param kwargs: The other arguments of the pacer
+        """
+        rates = [float(limit.value) / _UNIT_SECONDS[limit.unit.upper()]
+                 for limit in limits.rate
+                 if limit.value and limit.unit.upper() in _UNIT_SECONDS]
+        if rates:
+            kwargs.setdefault('rate', min(rates))
+        return cls(**kwargs)
+
+    def delay(self, attempt, retry_after=0):
+        """Returns the seconds to wait before a retry.
+
+        :param attempt: Number of the previous retries
+        :param retry_after: Seconds requested by the ``Retry-After`` header
+        """
+        if retry_after:
+            # jitter the retries of the clients told to wait the same time
+            return retry_after + random.uniform(0, self.backoff)
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def send(self, method, send):
+        """Makes a request with pacing.
+
+        :param method: HTTP method of the request
+        :param send: Callable making the request and returning the response
+            and its body
+        """
+        attempt = 0
+        while True:
+            if self.concurrency is not None:
+                slot = self.concurrency.slot()
+            else:
+                slot = _no_slot()
+            with slot:
+                if self.bucket is not None:
+                    self.bucket.acquire()
+                resp, body = send()
+
+            delay = retry_after(resp)
+            if delay is None:
+                if self.concurrency is not None:
+                    self.concurrency.on_success()
+                return resp, body
+            if self.concurrency is not None:
+                self.concurrency.on_overlimit()
+            if (method.upper() not in RETRIED_METHODS or
+                    attempt >= self.max_retries or delay > self.max_backoff):
+                return resp, body
+            _sleep(self.delay(attempt, delay))
+            attempt += 1
+
+
+@contextlib.contextmanager
+def _no_slot():
+    yield
@@ -0,0 +1,143 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Profile of the wall time of the phases of a command of the nova shell.
+"""
+
+import collections
+import contextlib
+import functools
+import json
+import threading
+import time
+
+clock = getattr(time, 'monotonic', time.time)
+
+# Profile of the command being run, see PhaseProfile.activate().
+_profile = None
+
+
+class PhaseProfile(object):
+    """Wall time spent in each phase of a command.
+
+    The phases can be nested: the time of a phase excludes the time of the
+    phases entered in it, so the times of the phases add up to the total.
+    Only the phases of the thread which activated the profile are recorded,
+    the time waiting for other threads is the time of the phase waiting.
+
+    :param start: Clock time the command started at, now by default
+    """
+
+    def __init__(self, start=None):
+        self.start = clock() if start is None else start
+        self.end = None
+        self.seconds = collections.OrderedDict()
+        self.calls = collections.defaultdict(int)
+        self._stack = []
+        self._since = None
+        self._thread = None
+
+    def add(self, name, seconds):
+        """Records time spent in a phase, outside of the profile."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] += 1
+
+    def _charge(self, now):
+        if self._stack:
+            name = self._stack[-1]
+            self.seconds[name] = (self.seconds.get(name, 0.0) +
+                                  now - self._since)
+        self._since = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._charge(clock())
+        self._stack.append(name)
+        self.calls[name] += 1
+        try:
+            yield
+        finally:
+            self._charge(clock())
+            self._stack.pop()
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Records the phases entered by the current thread in the profile
+        until the end of the command.
+        """
+        global _profile
+        self._thread = threading.current_thread()
+        self._since = clock()
+        _profile = self
+        try:
+            yield self
+        finally:
+            _profile = None
+            self.end = clock()
+
+    def as_dict(self):
+        """Returns the total wall time and the time of each phase.
+
+        The time of the command which is in no phase is in ``other``.
+        """
+        end = clock() if self.end is None else self.end
+        total = end - self.start
+        phases = [collections.OrderedDict([('phase', name),
+                                           ('seconds', seconds),
+                                           ('calls', self.calls[name])])
+                  for name, seconds in self.seconds.items()]
+        other = total - sum(self.seconds.values())
+        phases.append(collections.OrderedDict([('phase', 'other'),
+                                               ('seconds', max(other, 0.0)),
+                                               ('calls', 1)]))
+        return collections.OrderedDict([('total_seconds', total),
+                                        ('phases', phases)])
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=4)
+
+
+@contextlib.contextmanager
+def _no_phase():
+    yield
+
+
+def phase(name):
+    """Returns a context manager recording its time in a phase of the
+    profile of the command, if it is profiled.
+
+    :param name: Name of the phase
+    """
+    profile = _profile
+    if profile is None or profile._thread is not threading.current_thread():
+        return _no_phase()
+    return profile.phase(name)
+
+
+def phased(name):
+    """Decorator recording the time of the calls of a function in a phase
+    of the profile of the command, see :func:`phase`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def active():
+    """Returns whether the command is profiled."""
+    return _profile is not None
@@ -20,8 +20,10 @@ Command-line interface to the OpenStack Nova API.
 
 from __future__ import print_function
 import argparse
+import cProfile
 import logging
 import sys
+import time
 
 from keystoneauth1 import loading
 from oslo_utils import encodeutils
@@ -33,10 +35,14 @@ osprofiler_profiler = importutils.try_import("osprofiler.profiler")
 
 import novaclient
 from novaclient import api_versions
+from novaclient import cache
 from novaclient import client
 from novaclient import exceptions as exc
 import novaclient.extension
 from novaclient.i18n import _
+from novaclient import metrics
+from novaclient import pacing
+from novaclient import profiling
 from novaclient import utils
 
 DEFAULT_MAJOR_OS_COMPUTE_API_VERSION = "2.0"
@@ -306,12 +312,97 @@ class OpenStackComputeShell(object):
             help=_("Use the auth token cache. Defaults to False if "
                    "env[OS_CACHE] is not set."))
 
+        parser.add_argument(
+            '--os-response-cache',
+            default=strutils.bool_from_string(
+                utils.env('OS_RESPONSE_CACHE', default=False), True),
+            action='store_true',
+            help=_("Cache the responses of slowly changing resources "
+                   "(flavors, images, limits, ...) on disk for the next "
+                   "commands. Defaults to False if env[OS_RESPONSE_CACHE] "
+                   "is not set."))
+
+        parser.add_argument(
+            '--os-version-cache',
+            default=strutils.bool_from_string(
+                utils.env('OS_VERSION_CACHE', default=False), True),
+            action='store_true',
+            help=_("Reuse the API version range of the server discovered by "
+                   "the previous commands during an hour. Defaults to False "
+                   "if env[OS_VERSION_CACHE] is not set."))
+
+        parser.add_argument(
+            '--os-name-cache',
+            default=strutils.bool_from_string(
+                utils.env('OS_NAME_CACHE', default=False), True),
+            action='store_true',
+            help=_("Reuse the IDs of the resources found by name by the "
+                   "previous commands during five minutes. Defaults to False "
+                   "if env[OS_NAME_CACHE] is not set."))
+
+        parser.add_argument(
+            '--format',
+            dest='output_format',
+            metavar='<format>',
+            choices=utils.OUTPUT_FORMATS,
+            default=utils.env('OS_OUTPUT_FORMAT', default='table'),
+            help=_("Output format of the commands, one of %s. The 'jsonl', "
+                   "'csv' and 'value' rows are printed as soon as they are "
+                   "received, unsorted. Defaults to env[OS_OUTPUT_FORMAT] or "
+                   "'table'.") % ', '.join(utils.OUTPUT_FORMATS))
+
         parser.add_argument(
             '--timings',
             default=False,
             action='store_true',
             help=_("Print call timing info."))
 
+        parser.add_argument(
+            '--metrics',
+            metavar='<format>',
+            choices=metrics.EXPORT_FORMATS,
+            default=None,
+            help=_("Print the latency percentiles and the counts of status "
+                   "codes, retries and bytes of the API requests by "
+                   "operation to stderr, in one of %s.") %
+            ', '.join(metrics.EXPORT_FORMATS))
+
+        parser.add_argument(
+            '--phase-timings',
+            default=False,
+            action='store_true',
+            help=_("Print the wall time of the phases of the command to "
+                   "stderr as JSON: imports, argument parsing, "
+                   "authentication, version discovery, HTTP requests, "
+                   "parsing of the responses and rendering of the output."))
+
+        parser.add_argument(
+            '--cprofile-stats',
+            metavar='<file>',
+            default=None,
+            help=_("Profile the command with cProfile and dump the "
+                   "statistics to <file>, to be read with pstats."))
+
+        parser.add_argument(
+            '--rate-limit',
+            metavar='<requests>',
+            type=float,
+            default=utils.env('OS_RATE_LIMIT', default=None),
+            help=_("Make at most <requests> API requests per second. "
+                   "Defaults to env[OS_RATE_LIMIT]."))
+
+        parser.add_argument(
+            '--max-retries',
+            metavar='<retries>',
+            type=int,
+            default=utils.env('OS_MAX_RETRIES', default=None),
+            help=_("Retry the idempotent API requests refused for going "
+                   "over a rate limit up to <retries> times, after their "
+                   "Retry-After delay or an exponential backoff. The "
+                   "number of concurrent requests is reduced too. Defaults "
+                   "to env[OS_MAX_RETRIES] or 3, 0 disables the "
+                   "retries."))
+
         parser.add_argument(
             '--os-region-name',
             metavar='<region-name>',
@@ -494,11 +585,40 @@ class OpenStackComputeShell(object):
         self.client_logger.addHandler(ch)
 
     def main(self, argv):
+        started = profiling.clock()
         # Parse args once to find version and debug settings
         parser = self.get_base_parser(argv)
         (args, args_list) = parser.parse_known_args(argv)
-
+        if not args.phase_timings and not args.cprofile_stats:
+            return self._main(argv, args, args_list)
+
+        imports = time.time() - novaclient._import_start
+        profile = profiling.PhaseProfile(started - imports)
+        profile.add('imports', imports)
+        profile.add('argparse', profiling.clock() - started)
+        stats = cProfile.Profile() if args.cprofile_stats else None
+        with profile.activate():
+            if stats is not None:
+                stats.enable()
+            try:
+                return self._main(argv, args, args_list)
+            finally:
+                if stats is not None:
+                    stats.disable()
+                    stats.dump_stats(args.cprofile_stats)
+                if args.phase_timings:
+                    print(profile.to_json(), file=sys.stderr)
+
+    def _main(self, argv, args, args_list):
         self.setup_debugging(args.debug)
+        # NOTE: argparse only checks the choices of the options given, not
+        # of their defaults.
+        if args.output_format not in utils.OUTPUT_FORMATS:
+            raise exc.CommandError(
+                _("Invalid output format '%(format)s' in "
+                  "env[OS_OUTPUT_FORMAT], expected one of %(formats)s.") %
+                {'format': args.output_format,
+                 'formats': ', '.join(utils.OUTPUT_FORMATS)})
         self.extensions = []
         do_help = args.help or not args_list or args_list[0] == 'help'
 
@@ -546,6 +666,14 @@ class OpenStackComputeShell(object):
         cacert = args.os_cacert
         cert = args.os_cert
         timeout = args.timeout
+        response_cache = (cache.FileCache() if args.os_response_cache
+                          else None)
+        # the requests refused for going over the rate limits are retried
+        # by default, like with the default max_retries of the pacer
+        pacer_kwargs = {'rate': args.rate_limit}
+        if args.max_retries is not None:
+            pacer_kwargs['max_retries'] = args.max_retries
+        pacer = pacing.Pacer(**pacer_kwargs)
 
         keystone_session = None
         keystone_auth = None
@@ -600,10 +728,15 @@ class OpenStackComputeShell(object):
 
             with utils.record_time(self.times, args.timings,
                                    'auth_url', args.os_auth_url):
-                keystone_session = (
-                    loading.load_session_from_argparse_arguments(args))
-                keystone_auth = (
-                    loading.load_auth_from_argparse_arguments(args))
+                with profiling.phase('auth'):
+                    keystone_session = (
+                        loading.load_session_from_argparse_arguments(args))
+                    keystone_auth = (
+                        loading.load_auth_from_argparse_arguments(args))
+                    if profiling.active():
+                        # authenticate now rather than with the first
+                        # request, to profile the authentication apart
+                        keystone_session.get_token(keystone_auth)
 
         if (not skip_auth and
                 not any([os_project_name, os_project_id])):
@@ -636,6 +769,8 @@ class OpenStackComputeShell(object):
             timings=args.timings, endpoint_override=endpoint_override,
             os_cache=os_cache, http_log_debug=args.debug,
             cacert=cacert, cert=cert, timeout=timeout,
+            response_cache=response_cache,
+            pacer=pacer,
             session=keystone_session, auth=keystone_auth,
             logger=self.client_logger,
             project_domain_id=os_project_domain_id,
@@ -656,21 +791,28 @@ class OpenStackComputeShell(object):
                                 "min": novaclient.API_MIN_VERSION.get_string(),
                                 "max": novaclient.API_MAX_VERSION.get_string()}
                         )
-            api_version = api_versions.discover_version(self.cs, api_version)
+            version_cache = (cache.VersionCache() if args.os_version_cache
+                             else None)
+            with profiling.phase('version_discovery'):
+                api_version = api_versions.discover_version(
+                    self.cs, api_version, version_cache=version_cache)
 
         # build available subcommands based on version
-        self.extensions = client.discover_extensions(api_version)
-        self._run_extension_hooks('__pre_parse_args__')
+        with profiling.phase('extensions'):
+            self.extensions = client.discover_extensions(api_version)
+            self._run_extension_hooks('__pre_parse_args__')
 
-        subcommand_parser = self.get_subcommand_parser(
-            api_version, do_help=do_help, argv=argv)
+        with profiling.phase('argparse'):
+            subcommand_parser = self.get_subcommand_parser(
+                api_version, do_help=do_help, argv=argv)
         self.parser = subcommand_parser
 
         if args.help or not argv:
             subcommand_parser.print_help()
             return 0
 
-        args = subcommand_parser.parse_args(argv)
+        with profiling.phase('argparse'):
+            args = subcommand_parser.parse_args(argv)
         self._run_extension_hooks('__post_parse_args__', args)
 
         # Short-circuit and deal with help right away.
@@ -692,6 +834,13 @@ class OpenStackComputeShell(object):
             keystone_session = None
             keystone_auth = None
 
+        completion_index = cache.CompletionIndex.for_user(
+            os_username or os_user_id, os_auth_url or endpoint_override)
+        name_index = None
+        if args.os_name_cache:
+            name_index = cache.NameIndex.for_user(
+                os_username or os_user_id, os_auth_url or endpoint_override)
+
         # Recreate client object with discovered version.
         self.cs = client.Client(
             api_version,
@@ -704,23 +853,40 @@ class OpenStackComputeShell(object):
             timings=args.timings, endpoint_override=endpoint_override,
             os_cache=os_cache, http_log_debug=args.debug,
             cacert=cacert, cert=cert, timeout=timeout,
+            response_cache=response_cache,
+            pacer=pacer,
             session=keystone_session, auth=keystone_auth,
+            completion_index=completion_index,
+            name_index=name_index,
             project_domain_id=os_project_domain_id,
             project_domain_name=os_project_domain_name,
             user_domain_id=os_user_domain_id,
             user_domain_name=os_user_domain_name)
 
-        args.func(self.cs, args)
+        with profiling.phase('command'):
+            args.func(self.cs, args)
+
+        # The machine readable formats print a single document on stdout,
+        # so the extra information is written to stderr with them.
+        extra_output = sys.stdout
+        if args.output_format != 'table':
+            extra_output = sys.stderr
 
         if osprofiler_profiler and args.profile:
             trace_id = osprofiler_profiler.get().get_base_id()
             print("To display trace use the command:\n\n"
-                  "  osprofiler trace show --html %s " % trace_id)
+                  "  osprofiler trace show --html %s " % trace_id,
+                  file=extra_output)
 
         if args.timings:
-            self._dump_timings(self.times + self.cs.get_timings())
+            self._dump_timings(self.times + list(self.cs.get_timings()),
+                               extra_output)
+
+        if args.metrics:
+            print(self.cs.get_metrics().export(args.metrics),
+                  file=sys.stderr)
 
-    def _dump_timings(self, timings):
+    def _dump_timings(self, timings, output=None):
         class Tyme(object):
             def __init__(self, url, seconds):
                 self.url = url
@@ -730,7 +896,10 @@ class OpenStackComputeShell(object):
         for tyme in results:
             total += tyme.seconds
         results.append(Tyme("Total", total))
-        utils.print_list(results, ["url", "seconds"], sortby_index=None)
+        lines = utils.render_table(
+            ["url", "seconds"],
+            [[r.url, six.text_type(r.seconds)] for r in results])
+        print('\n'.join(lines), file=output or sys.stdout)
 
     def _run_extension_hooks(self, hook_type, *args, **kwargs):
         """Run hooks for all registered extensions."""
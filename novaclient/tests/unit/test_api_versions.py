@@ -13,10 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+import fixtures
 import mock
 
 import novaclient
 from novaclient import api_versions
+from novaclient import cache
 from novaclient import exceptions
 from novaclient.tests.unit import utils
 from novaclient import utils as nutils
@@ -342,6 +346,50 @@ class WrapsTestCase(utils.TestCase):
         self.assertIn(expected_name, api_versions._SUBSTITUTIONS)
         self.assertEqual(expected_name, fake_func.__id__)
 
+    def test_methods_are_resolved_once_per_version(self):
+
+        class Resolved(object):
+            @api_versions.wraps("777.1", "777.4")
+            def f(self):
+                return 1
+
+            @api_versions.wraps("777.5")
+            def f(self):
+                return 2
+
+        obj = Resolved()
+        obj.api_version = api_versions.APIVersion("777.2")
+        with mock.patch("novaclient.api_versions.get_substitutions",
+                        wraps=api_versions.get_substitutions) as mock_subs:
+            self.assertEqual(1, obj.f())
+            self.assertEqual(1, obj.f())
+            obj.api_version = api_versions.APIVersion("777.7")
+            self.assertEqual(2, obj.f())
+            self.assertEqual(2, obj.f())
+        self.assertEqual(2, mock_subs.call_count)
+
+    def test_new_substitutions_reset_resolved_methods(self):
+
+        class First(object):
+            api_version = api_versions.APIVersion("778.2")
+
+            @api_versions.wraps("778.1")
+            def f(self):
+                return 1
+
+        self.assertEqual(1, First().f())
+
+        class Second(object):
+            api_version = api_versions.APIVersion("778.2")
+
+            @api_versions.wraps("778.2")
+            def f(self):
+                return 2
+
+        self.assertEqual({}, api_versions._RESOLVED_METHODS)
+        self.assertEqual(1, First().f())
+        self.assertEqual(2, Second().f())
+
 
 class DiscoverVersionTestCase(utils.TestCase):
     def setUp(self):
@@ -439,6 +487,46 @@ class DiscoverVersionTestCase(utils.TestCase):
                 fake_client,
                 api_versions.APIVersion('2.latest')).get_string())
 
+    def test_version_cache(self):
+        fake_client = mock.MagicMock(project_id="project")
+        fake_client.client.get_endpoint.return_value = "http://nova/v2.1"
+        fake_client.versions.get_current.return_value = mock.MagicMock(
+            version="2.7", min_version="2.4")
+        novaclient.API_MAX_VERSION = api_versions.APIVersion("2.11")
+        novaclient.API_MIN_VERSION = api_versions.APIVersion("2.1")
+        version_cache = cache.VersionCache(
+            os.path.join(self.useFixture(fixtures.TempDir()).path, 'v.json'))
+
+        for _i in range(2):
+            self.assertEqual(
+                "2.7",
+                api_versions.discover_version(
+                    fake_client, api_versions.APIVersion('2.latest'),
+                    version_cache=version_cache).get_string())
+        self.assertEqual(1, fake_client.versions.get_current.call_count)
+
+        # the range is cached per project
+        fake_client.project_id = "other"
+        api_versions.discover_version(
+            fake_client, api_versions.APIVersion('2.latest'),
+            version_cache=version_cache)
+        self.assertEqual(2, fake_client.versions.get_current.call_count)
+
+    def test_version_cache_without_microversion(self):
+        fake_client = mock.MagicMock(project_id="project")
+        fake_client.client.get_endpoint.return_value = "http://nova/v2"
+        fake_client.versions.get_current.return_value = None
+        version_cache = cache.VersionCache(
+            os.path.join(self.useFixture(fixtures.TempDir()).path, 'v.json'))
+
+        for _i in range(2):
+            self.assertEqual(
+                "2.0",
+                api_versions.discover_version(
+                    fake_client, api_versions.APIVersion('2.latest'),
+                    version_cache=version_cache).get_string())
+        self.assertEqual(1, fake_client.versions.get_current.call_count)
+
 
 class DecoratedAfterTestCase(utils.TestCase):
     def test_decorated_after(self):
@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 import requests
 import six
 
@@ -19,7 +20,9 @@ from novaclient import base
 from novaclient import exceptions
 from novaclient.tests.unit import utils
 from novaclient.tests.unit.v2 import fakes
+from novaclient import utils as nutils
 from novaclient.v2 import flavors
+from novaclient.v2 import keypairs
 
 
 def create_response_obj_with_header():
@@ -88,6 +91,33 @@ class BaseTest(utils.TestCase):
                           cs.flavors.find,
                           vegetable='carrot')
 
+    def test_findall_server_filters(self):
+        cs = fakes.FakeClient(api_versions.APIVersion("2.1"))
+        found = cs.servers.findall(status='BUILD', host='computenode1')
+        self.assertEqual(['1234'], [s.id for s in found])
+        self.assertEqual(
+            '/servers/detail?host=computenode1&status=BUILD',
+            cs.client.callstack[0][1])
+
+    @mock.patch('novaclient.utils.run_concurrently',
+                side_effect=nutils.run_concurrently)
+    def test_findall_gets_details_concurrently(self, mock_run):
+        cs = fakes.FakeClient(api_versions.APIVersion("2.1"))
+        found = cs.servers.findall(name='sample-server2')
+        self.assertEqual(['5678'], [s.id for s in found])
+        self.assertEqual('/servers?name=sample-server2',
+                         cs.client.callstack[0][1])
+        self.assertEqual('/servers/5678', cs.client.callstack[-1][1])
+        self.assertEqual(cs.servers.detail_concurrency,
+                         mock_run.call_args[0][2])
+
+    def test_findall_summary_attributes(self):
+        cs = fakes.FakeClient(api_versions.APIVersion("2.1"))
+        # other attributes than names are not in summary listings
+        cs.servers.findall(name='sample-server2', hostId='x')
+        self.assertEqual('/servers/detail?name=sample-server2',
+                         cs.client.callstack[0][1])
+
     def test_resource_object_with_request_ids(self):
         resp_obj = create_response_obj_with_header()
         r = base.Resource(None, {"name": "1"}, resp=resp_obj)
@@ -99,6 +129,96 @@ class BaseTest(utils.TestCase):
         self.assertEqual(fakes.FAKE_REQUEST_ID_LIST, r.request_ids)
 
 
+class CompactResourceTest(utils.TestCase):
+
+    def setUp(self):
+        super(CompactResourceTest, self).setUp()
+        self.cs = fakes.FakeClient(api_versions.APIVersion("2.0"))
+        self.cs.compact_resources = True
+
+    def test_list(self):
+        fl = self.cs.flavors.list()
+        self.assertEqual(fakes.FAKE_REQUEST_ID_LIST, fl.request_ids)
+        for f in fl:
+            self.assertIsInstance(f, flavors.Flavor)
+            self.assertNotIn('name', f.__dict__)
+            self.assertEqual(f._info['name'], f.name)
+            # request ids are held once, by the list
+            self.assertIs(fl.request_ids, f.request_ids)
+        self.assertEqual("<Flavor: %s>" % fl[1].name, repr(fl[1]))
+        self.assertEqual(flavors.Flavor(None, {'id': fl[0].id}), fl[0])
+        self.assertEqual(fl[0], flavors.Flavor(None, {'id': fl[0].id}))
+
+    def test_lazy_getattr(self):
+        compact_class = base.get_compact_class(flavors.Flavor)
+        f = compact_class(self.cs.flavors, {'id': 1})
+        self.assertEqual('256 MB Server', f.name)
+        self.cs.assert_called('GET', '/flavors/1')
+        # the request id of the get is not added to the ones of the listing
+        shared = []
+        f = compact_class(self.cs.flavors, {'id': 1}, request_ids=shared)
+        self.assertEqual('256 MB Server', f.name)
+        self.assertEqual([], shared)
+        self.assertEqual(fakes.FAKE_REQUEST_ID_LIST, f.request_ids)
+
+        self.assertRaises(AttributeError, getattr, f, 'blahblah')
+
+    def test_repr_and_set_info(self):
+        compact_class = base.get_compact_class(base.Resource)
+        r = compact_class(None, dict(foo="bar", baz="spam"), loaded=True)
+        r.set_info('foo', 'eggs')
+        self.assertEqual("eggs", r.foo)
+        self.assertEqual("<Resource baz=spam, foo=eggs>", repr(r))
+        self.assertEqual({'foo': 'eggs', 'baz': 'spam'}, r.to_dict())
+
+    def test_reshaping_classes_are_not_compacted(self):
+        self.assertIs(keypairs.Keypair,
+                      base.get_compact_class(keypairs.Keypair))
+        self.assertIs(base.get_compact_class(flavors.Flavor),
+                      base.get_compact_class(flavors.Flavor))
+
+
+class CompletionIndexTest(utils.TestCase):
+
+    def setUp(self):
+        super(CompletionIndexTest, self).setUp()
+        self.cs = fakes.FakeClient(api_versions.APIVersion("2.0"))
+        self.cs.completion_index = mock.Mock()
+
+    def test_disabled_by_default(self):
+        cs = fakes.FakeClient(api_versions.APIVersion("2.0"))
+        self.assertIsNone(cs.flavors.completion_index)
+
+    def test_list(self):
+        sl = self.cs.servers.list()
+        expected = set()
+        for s in sl:
+            expected.update([s.id, s.human_id])
+        self.cs.completion_index.replace.assert_called_once_with(
+            'server', expected)
+
+        # filtered listings do not replace the known values
+        self.cs.servers.list(search_opts={'name': 'sample-server'})
+        self.cs.completion_index.add.assert_called_once_with(
+            'server', mock.ANY)
+
+    def test_create_and_delete(self):
+        f = self.cs.flavors.create("flavorcreate", 512, 1, 10, 1234)
+        self.cs.completion_index.add.assert_called_once_with(
+            'flavor', set([six.text_type(f.id), f.human_id]))
+
+        self.cs.flavors.delete(2)
+        self.cs.completion_index.delete.assert_called_once_with(
+            'flavor', ['2'])
+
+    def test_deprecated_completion_cache(self):
+        with mock.patch('warnings.warn') as mock_warn:
+            with self.cs.flavors.completion_cache('uuid', flavors.Flavor,
+                                                  mode='w'):
+                self.cs.flavors.write_to_completion_cache('uuid', 'id')
+        self.assertEqual(2, mock_warn.call_count)
+
+
 class ListWithMetaTest(utils.TestCase):
     def test_list_with_meta(self):
         resp = create_response_obj_with_header()
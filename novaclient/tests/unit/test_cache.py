@@ -0,0 +1,301 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import time
+
+import fixtures
+from keystoneauth1 import session
+import mock
+
+from novaclient import api_versions
+from novaclient import cache
+from novaclient import client
+from novaclient import exceptions
+from novaclient.tests.unit import utils
+from novaclient import utils as nutils
+
+
+class ResourceTypeTest(utils.TestCase):
+
+    def test_resource_type(self):
+        self.assertEqual('flavors',
+                         cache.resource_type('/flavors/detail?is_public=x'))
+        self.assertEqual('images', cache.resource_type('/v2/images?name=a'))
+        self.assertEqual('networks', cache.resource_type('/v2.0/networks'))
+        self.assertEqual('versions',
+                         cache.resource_type('http://nova/v2.1/'))
+
+
+class ResponseCacheTest(utils.TestCase):
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, cache.ResponseCache)
+
+        class IncompleteCache(cache.ResponseCache):
+            def get(self, resource, key):
+                return None
+
+        self.assertRaises(TypeError, IncompleteCache)
+
+
+class CacheTestMixin(object):
+
+    def _response(self, body, status_code=200):
+        resp = mock.Mock(status_code=status_code, url='http://nova/flavors',
+                         headers={'x-openstack-request-id': 'req-1'})
+        return resp, body
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.cache.get('flavors', 'key'))
+        self.cache.set('flavors', 'key', *self._response({'flavors': []}))
+
+        resp, body = self.cache.get('flavors', 'key')
+        self.assertEqual({'flavors': []}, body)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('req-1', resp.headers['X-OpenStack-Request-Id'])
+        self.assertEqual({'flavors': []}, resp.json())
+
+    def test_not_cacheable(self):
+        self.cache.set('servers', 'key', *self._response({'servers': []}))
+        self.assertIsNone(self.cache.get('servers', 'key'))
+
+    @mock.patch('novaclient.cache.time.time')
+    def test_expired(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.set('limits', 'key', *self._response({'limits': {}}))
+        mock_time.return_value = 1000 + cache.DEFAULT_TTLS['limits'] + 1
+        self.assertIsNone(self.cache.get('limits', 'key'))
+
+    def test_on_write(self):
+        self.cache.set('flavors', 'key1', *self._response({'flavors': []}))
+        self.cache.set('images', 'key2', *self._response({'images': []}))
+        self.cache.set('limits', 'key3', *self._response({'limits': {}}))
+        self.cache.on_write('/flavors/1/os-extra_specs')
+        self.assertIsNone(self.cache.get('flavors', 'key1'))
+        self.assertIsNone(self.cache.get('limits', 'key3'))
+        self.assertIsNotNone(self.cache.get('images', 'key2'))
+
+    def test_lru_eviction(self):
+        self.cache.max_entries = 2
+        self.cache.set('flavors', 'key1', *self._response({'flavors': [1]}))
+        self.cache.set('flavors', 'key2', *self._response({'flavors': [2]}))
+        self._touch()
+        self.cache.get('flavors', 'key1')
+        self.cache.set('flavors', 'key3', *self._response({'flavors': [3]}))
+        self.assertIsNotNone(self.cache.get('flavors', 'key1'))
+        self.assertIsNone(self.cache.get('flavors', 'key2'))
+        self.assertIsNotNone(self.cache.get('flavors', 'key3'))
+
+    def _touch(self):
+        pass
+
+
+class MemoryCacheTest(CacheTestMixin, utils.TestCase):
+
+    def setUp(self):
+        super(MemoryCacheTest, self).setUp()
+        self.cache = cache.MemoryCache()
+
+    def test_cached_body_is_copied(self):
+        resp, body = self._response({'flavors': [{'id': 1}]})
+        self.cache.set('flavors', 'key', resp, body)
+        body['flavors'].append({'id': 2})
+        self.cache.get('flavors', 'key')[1]['flavors'].append({'id': 3})
+        self.assertEqual({'flavors': [{'id': 1}]},
+                         self.cache.get('flavors', 'key')[1])
+
+
+class FileCacheTest(CacheTestMixin, utils.TestCase):
+
+    def setUp(self):
+        super(FileCacheTest, self).setUp()
+        self.directory = self.useFixture(fixtures.TempDir()).path
+        self.cache = cache.FileCache(self.directory)
+
+    def _touch(self):
+        # Make the existing entries older than the ones used from now on.
+        past = time.time() - 100
+        for name in os.listdir(os.path.join(self.directory, 'flavors')):
+            os.utime(os.path.join(self.directory, 'flavors', name),
+                     (past, past))
+
+    def test_shared_between_instances(self):
+        self.cache.set('flavors', 'key', *self._response({'flavors': []}))
+        other = cache.FileCache(self.directory)
+        self.assertEqual({'flavors': []}, other.get('flavors', 'key')[1])
+
+    def test_default_directory(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_RESPONSE_CACHE_DIR', self.directory))
+        self.assertEqual(self.directory, cache.FileCache().directory)
+
+    def test_unwritable_directory(self):
+        self.cache = cache.FileCache('/proc/novaclient-cache')
+        self.cache.set('flavors', 'key', *self._response({'flavors': []}))
+        self.assertIsNone(self.cache.get('flavors', 'key'))
+
+
+class SessionClientCacheTest(utils.TestCase):
+
+    def setUp(self):
+        super(SessionClientCacheTest, self).setUp()
+        self.cache = cache.MemoryCache()
+        self.client = client.SessionClient(
+            session=session.Session(), endpoint_override='http://nova',
+            api_version=api_versions.APIVersion('2.53'),
+            response_cache=self.cache)
+
+    def test_get_is_cached(self):
+        mock_get = self.requests_mock.get('http://nova/flavors',
+                                          json={'flavors': []})
+        for _i in range(2):
+            resp, body = self.client.get('/flavors')
+            self.assertEqual({'flavors': []}, body)
+        self.assertEqual(1, mock_get.call_count)
+
+        # the microversion is part of the key
+        self.client.api_version = api_versions.APIVersion('2.54')
+        self.client.get('/flavors')
+        self.assertEqual(2, mock_get.call_count)
+
+    def test_write_invalidates(self):
+        mock_get = self.requests_mock.get('http://nova/flavors',
+                                          json={'flavors': []})
+        self.requests_mock.post('http://nova/flavors', json={'flavor': {}})
+        self.client.get('/flavors')
+        self.client.post('/flavors', body={'flavor': {}})
+        self.client.get('/flavors')
+        self.assertEqual(2, mock_get.call_count)
+
+    def test_errors_are_not_cached(self):
+        mock_get = self.requests_mock.get('http://nova/limits',
+                                          status_code=500)
+        for _i in range(2):
+            self.assertRaises(exceptions.ClientException,
+                              self.client.get, '/limits')
+        self.assertEqual(2, mock_get.call_count)
+
+    def test_servers_are_not_cached(self):
+        mock_get = self.requests_mock.get('http://nova/servers',
+                                          json={'servers': []})
+        self.client.get('/servers')
+        self.client.get('/servers')
+        self.assertEqual(2, mock_get.call_count)
+
+
+class VersionCacheTest(utils.TestCase):
+
+    def setUp(self):
+        super(VersionCacheTest, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'versions.json')
+
+    @mock.patch('novaclient.cache.time.time')
+    def test_get_and_set(self, mock_time):
+        mock_time.return_value = 1000
+        version_cache = cache.VersionCache(self.path, ttl=10)
+        self.assertIsNone(version_cache.get('http://nova p1'))
+        version_cache.set('http://nova p1', '2.1', '2.60')
+        version_cache.set('http://nova p2', None, None)
+
+        other = cache.VersionCache(self.path)
+        self.assertEqual(('2.1', '2.60'), other.get('http://nova p1'))
+        self.assertEqual((None, None), other.get('http://nova p2'))
+
+        mock_time.return_value = 1011
+        self.assertIsNone(other.get('http://nova p1'))
+        # expired entries are dropped by the next write
+        other.set('http://nova p2', '2.1', '2.60')
+        self.assertEqual(['http://nova p2'], list(other._load()))
+
+    def test_default_path(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_VERSION_CACHE', self.path))
+        self.assertEqual(self.path, cache.VersionCache().path)
+
+
+class CompletionIndexTest(utils.TestCase):
+
+    def setUp(self):
+        super(CompletionIndexTest, self).setUp()
+        self.directory = self.useFixture(fixtures.TempDir()).path
+        self.index = cache.CompletionIndex(self.directory)
+
+    def test_updates(self):
+        self.index.replace('server', ['b-id', 'a-id', 'server-1'])
+        self.index.add('server', ['c-id', u'\u0441\u0435\u0440\u0432'])
+        self.index.delete('server', ['b-id', 'unknown'])
+        with open(os.path.join(self.directory, 'server-cache'), 'rb') as f:
+            self.assertEqual(
+                u'a-id\nc-id\nserver-1\n\u0441\u0435\u0440\u0432\n',
+                f.read().decode('utf-8'))
+
+        self.index.replace('server', ['d-id'])
+        self.assertEqual(['d-id'], self.index.lookup('server'))
+        self.assertEqual([], self.index.lookup('flavor'))
+
+    def test_lookup(self):
+        self.index.replace('flavor', ['m1.tiny', 'm1.small', 'm2.large',
+                                      'ab', 'm1'])
+        self.assertEqual(['m1', 'm1.small', 'm1.tiny'],
+                         self.index.lookup('flavor', 'm1'))
+        self.assertEqual([], self.index.lookup('flavor', 'x'))
+
+    @mock.patch('novaclient.cache._write_atomically')
+    def test_unchanged_values_are_not_written(self, mock_write):
+        self.index.replace('server', [])
+        self.index.add('server', [])
+        self.index.delete('server', ['a'])
+        self.assertFalse(mock_write.called)
+
+    def test_concurrent_updates(self):
+        list(nutils.run_concurrently(
+            lambda value: self.index.add('server', [value]),
+            ['id-%d' % i for i in range(50)], 8))
+        self.assertEqual(50, len(self.index.lookup('server')))
+
+    def test_for_user(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_UUID_CACHE_DIR', self.directory))
+        index = cache.CompletionIndex.for_user('user', 'http://keystone')
+        self.assertEqual(self.directory, os.path.dirname(index.directory))
+        self.assertNotEqual(
+            index.directory,
+            cache.CompletionIndex.for_user('other',
+                                           'http://keystone').directory)
+
+
+class NameIndexTest(utils.TestCase):
+
+    @mock.patch('novaclient.cache.time.time')
+    def test_get_and_set(self, mock_time):
+        mock_time.return_value = 1000
+        name_index = cache.NameIndex(ttl=10)
+        self.assertIsNone(name_index.get('key'))
+        name_index.set('key', 'id')
+        self.assertEqual('id', name_index.get('key'))
+        mock_time.return_value = 1011
+        self.assertIsNone(name_index.get('key'))
+
+    def test_file(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'names.json')
+        name_index = cache.NameIndex(path)
+        name_index.set('key1', 'id1')
+        name_index.set('key2', 2)
+        other = cache.NameIndex(path)
+        self.assertEqual('id1', other.get('key1'))
+        self.assertEqual(2, other.get('key2'))
+        other.delete('key1')
+        self.assertIsNone(name_index.get('key1'))
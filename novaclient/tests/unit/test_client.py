@@ -14,15 +14,19 @@
 #    under the License.
 
 import copy
+import time
 import uuid
 
+from keystoneauth1 import plugin
 from keystoneauth1 import session
 import mock
 
 import novaclient.api_versions
+import novaclient.base
 import novaclient.client
 import novaclient.extension
 from novaclient.tests.unit import utils
+from novaclient import utils as nutils
 import novaclient.v2.client
 
 
@@ -71,6 +75,16 @@ class SessionClientTest(utils.TestCase):
         cs.reset_timings()
         self.assertEqual(0, len(cs.get_timings()))
 
+    @mock.patch.object(novaclient.client, 'MAX_TIMINGS', 2)
+    def test_timings_are_bounded(self):
+        self.requests_mock.get('http://no.where')
+        client = novaclient.client.SessionClient(session=session.Session(),
+                                                 timings=True)
+        for _i in range(3):
+            client.request("http://no.where", 'GET')
+        self.assertEqual(2, len(client.get_timings()))
+        self.assertEqual(3, client.metrics.as_list()[0]['count'])
+
     def test_global_id(self):
         global_id = "req-%s" % uuid.uuid4()
         self.requests_mock.get('http://no.where')
@@ -82,6 +96,67 @@ class SessionClientTest(utils.TestCase):
         self.assertEqual(headers['X-OpenStack-Request-ID'], global_id)
 
 
+class _CatalogPlugin(plugin.BaseAuthPlugin):
+
+    endpoints = {'compute': 'http://nova', 'image': 'http://glance'}
+
+    def get_token(self, session, **kwargs):
+        return 'token'
+
+    def get_endpoint(self, session, service_type=None, **kwargs):
+        return self.endpoints[service_type]
+
+    def get_project_id(self, session, **kwargs):
+        return 'project'
+
+
+class SharedClientTest(utils.TestCase):
+
+    def test_threads_share_client(self):
+        image_id = str(uuid.uuid4())
+
+        def respond(body):
+            def callback(request, context):
+                # leave time to the other threads to make their requests
+                time.sleep(0.001)
+                return body
+            return callback
+
+        # the requests sent to the endpoint of another service fail
+        self.requests_mock.get('http://glance/v2/images/%s' % image_id,
+                               json=respond({'id': image_id}))
+        self.requests_mock.get('http://nova/flavors/1',
+                               json=respond({'flavor': {'id': '1'}}))
+        cs = novaclient.client.Client(
+            '2.1', session=session.Session(auth=_CatalogPlugin()))
+
+        def call(index):
+            if index % 2:
+                return cs.glance.find_image(image_id).id
+            return cs.flavors.get(1).id
+
+        results = list(nutils.run_concurrently(call, range(400), 32))
+        self.assertEqual([None] * 400, [error for _i, _r, error in results])
+        self.assertEqual([image_id if index % 2 else '1'
+                          for index in range(400)],
+                         [result for _i, result, _e in results])
+        self.assertEqual('compute', cs.client.service_type)
+
+    def test_hooks(self):
+        hooks = []
+
+        def add_hooks(index):
+            for _i in range(50):
+                novaclient.base.HookableMixin.add_hook(
+                    'test_threads', lambda: hooks.append(index))
+
+        self.addCleanup(novaclient.base.HookableMixin._hooks_map.pop,
+                        'test_threads', None)
+        list(nutils.run_concurrently(add_hooks, range(8), 8))
+        novaclient.base.HookableMixin.run_hooks('test_threads')
+        self.assertEqual(400, len(hooks))
+
+
 class ClientsUtilsTest(utils.TestCase):
 
     @mock.patch("novaclient.client._discover_via_entry_points")
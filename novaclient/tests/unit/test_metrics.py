@@ -0,0 +1,162 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+from keystoneauth1 import exceptions as ks_exceptions
+from keystoneauth1 import session
+import mock
+
+from novaclient import client
+from novaclient import metrics
+from novaclient import pacing
+from novaclient.tests.unit import utils
+
+
+class UrlTemplateTest(utils.TestCase):
+
+    def test_url_template(self):
+        self.assertEqual(
+            '/v2.1/servers/{id}/os-interface/{id}',
+            metrics.url_template('http://nova/v2.1/servers/'
+                                 '7a3a4e43-49b0-4ac1-ab54-95a5d7c0e3d7/'
+                                 'os-interface/'
+                                 '9d3c4e3bd0b440d5ae91c5db2d85b02c'))
+        self.assertEqual('/flavors/{id}/os-extra_specs',
+                         metrics.url_template('/flavors/42/os-extra_specs'))
+        self.assertEqual('/servers/detail',
+                         metrics.url_template('/servers/detail?name=vm1'))
+        self.assertEqual('/os-hypervisors/host1/servers',
+                         metrics.url_template('/os-hypervisors/host1/servers'))
+
+
+class HistogramTest(utils.TestCase):
+
+    def test_quantile(self):
+        histogram = metrics.Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+        for i in range(1, 101):
+            histogram.observe(i / 100.0)
+        self.assertEqual(100, histogram.count)
+        self.assertAlmostEqual(50.5, histogram.sum)
+        # within the precision of the buckets
+        for q in (0.5, 0.95, 0.99):
+            self.assertLess(abs(histogram.quantile(q) - q) / q, 0.2)
+        self.assertEqual(1.0, histogram.quantile(1))
+
+    def test_out_of_buckets(self):
+        histogram = metrics.Histogram()
+        histogram.observe(0.0001)
+        histogram.observe(3600)
+        self.assertEqual(0.0001, histogram.quantile(0))
+        self.assertEqual(3600, histogram.quantile(1))
+
+
+class MetricsTest(utils.TestCase):
+
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        self.metrics = metrics.Metrics()
+        self.metrics.observe('get', '/servers/1', 0.1, 200, 100)
+        self.metrics.observe('GET', '/servers/2', 0.3, 404, 50)
+        self.metrics.observe('GET', '/servers/2', 0.2, 200, 100, retry=True)
+        self.metrics.observe('POST', '/servers', 1.0)
+
+    def test_as_list(self):
+        get, post = self.metrics.as_list()
+        self.assertEqual(('GET', '/servers/{id}'),
+                         (get['method'], get['path']))
+        self.assertEqual(3, get['count'])
+        self.assertEqual(1, get['retries'])
+        self.assertEqual(250, get['bytes'])
+        self.assertEqual({'200': 2, '404': 1}, get['status'])
+        self.assertAlmostEqual(0.6, get['sum'])
+        self.assertTrue(0.1 <= get['p50'] <= get['p95'] <= get['p99'] <= 0.3)
+        self.assertEqual({'error': 1}, post['status'])
+
+        self.metrics.reset()
+        self.assertEqual([], self.metrics.as_list())
+
+    @mock.patch.object(metrics, 'MAX_OPERATIONS', 2)
+    def test_bounded(self):
+        self.metrics.observe('DELETE', '/servers/1', 0.1, 204)
+        self.metrics.observe('GET', '/flavors', 0.1, 200)
+        self.assertEqual([('GET', '/servers/{id}'), ('POST', '/servers'),
+                          ('*', '*')],
+                         [(m['method'], m['path'])
+                          for m in self.metrics.as_list()])
+        self.assertEqual(2, self.metrics.as_list()[-1]['count'])
+
+    def test_to_json(self):
+        self.assertEqual(self.metrics.as_list(),
+                         json.loads(self.metrics.export('json')))
+
+    def test_to_prometheus(self):
+        text = self.metrics.export('prometheus')
+        lines = text.splitlines()
+        self.assertIn('# TYPE novaclient_request_duration_seconds summary',
+                      lines)
+        self.assertIn('novaclient_request_duration_seconds_count'
+                      '{method="GET",path="/servers/{id}"} 3', lines)
+        self.assertIn('novaclient_requests_total'
+                      '{method="GET",path="/servers/{id}",status="404"} 1',
+                      lines)
+        self.assertIn('novaclient_request_retries_total'
+                      '{method="GET",path="/servers/{id}"} 1', lines)
+        self.assertIn('novaclient_response_bytes_total'
+                      '{method="GET",path="/servers/{id}"} 250', lines)
+        self.assertEqual(3, len([line for line in lines if 'quantile=' in line
+                                 and 'method="POST"' in line]))
+
+
+@mock.patch.object(pacing, '_sleep')
+class SessionClientMetricsTest(utils.TestCase):
+
+    def test_requests_are_recorded(self, mock_sleep):
+        self.requests_mock.get('http://nova/servers/1',
+                               [{'status_code': 429,
+                                 'json': {'overLimit': {}}},
+                                {'status_code': 200,
+                                 'text': '{"server": {}}'}])
+        cs = client.SessionClient(session=session.Session(),
+                                  pacer=pacing.Pacer())
+        cs.get('http://nova/servers/1')
+        [operation] = cs.metrics.as_list()
+        self.assertEqual('/servers/{id}', operation['path'])
+        self.assertEqual(2, operation['count'])
+        self.assertEqual(1, operation['retries'])
+        self.assertEqual({'200': 1, '429': 1}, operation['status'])
+        self.assertEqual(len('{"server": {}}') + len('{"overLimit": {}}'),
+                         operation['bytes'])
+        # the timings are only kept on request
+        self.assertEqual(0, len(cs.get_timings()))
+
+    def test_shared_metrics(self, mock_sleep):
+        self.requests_mock.get('http://nova/servers', json={'servers': []})
+        shared = metrics.Metrics()
+        for _i in range(2):
+            cs = client.SessionClient(session=session.Session(),
+                                      metrics=shared)
+            cs.get('http://nova/servers')
+        self.assertEqual(2, shared.as_list()[0]['count'])
+
+    def test_failed_requests_are_recorded(self, mock_sleep):
+        self.requests_mock.get('http://nova/servers',
+                               exc=ks_exceptions.ConnectFailure)
+        cs = client.SessionClient(session=session.Session())
+        self.assertRaises(ks_exceptions.ConnectFailure, cs.get,
+                          'http://nova/servers')
+        [operation] = cs.metrics.as_list()
+        self.assertEqual(1, operation['count'])
+        self.assertEqual({'error': 1}, operation['status'])
+        self.assertEqual(0, operation['bytes'])
@@ -0,0 +1,191 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from keystoneauth1 import session
+import mock
+
+from novaclient import client
+from novaclient import exceptions
+from novaclient import pacing
+from novaclient.tests.unit import utils
+from novaclient.v2 import limits
+
+
+def _response(status_code, retry_after=None):
+    headers = {}
+    if retry_after is not None:
+        headers['retry-after'] = retry_after
+    return mock.Mock(status_code=status_code, headers=headers)
+
+
+class RetryAfterTest(utils.TestCase):
+
+    def test_retry_after(self):
+        self.assertIsNone(pacing.retry_after(_response(200)))
+        self.assertIsNone(pacing.retry_after(_response(500, '10')))
+        # exceeded quotas are not retried
+        self.assertIsNone(pacing.retry_after(_response(413)))
+        self.assertEqual(10, pacing.retry_after(_response(413, '10')))
+        self.assertEqual(0, pacing.retry_after(_response(429)))
+        self.assertEqual(0, pacing.retry_after(_response(429, 'soon')))
+        # dates in the past
+        self.assertEqual(0, pacing.retry_after(
+            _response(429, 'Wed, 21 Oct 2015 07:28:00 GMT')))
+
+
+@mock.patch.object(pacing, '_sleep')
+@mock.patch.object(pacing, '_clock', return_value=100.0)
+class TokenBucketTest(utils.TestCase):
+
+    def test_acquire(self, mock_clock, mock_sleep):
+        bucket = pacing.TokenBucket(2, burst=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertFalse(mock_sleep.called)
+        bucket.acquire()
+        mock_sleep.assert_called_once_with(0.5)
+        bucket.acquire()
+        mock_sleep.assert_called_with(1.0)
+
+        # the tokens are refilled over time, up to the burst
+        mock_clock.return_value = 110.0
+        mock_sleep.reset_mock()
+        bucket.acquire()
+        bucket.acquire()
+        self.assertFalse(mock_sleep.called)
+        bucket.acquire()
+        self.assertTrue(mock_sleep.called)
+
+    def test_invalid_rate(self, mock_clock, mock_sleep):
+        self.assertRaises(ValueError, pacing.TokenBucket, 0)
+
+
+class AdaptiveConcurrencyTest(utils.TestCase):
+
+    def test_aimd(self):
+        concurrency = pacing.AdaptiveConcurrency(8)
+        concurrency.on_success()
+        self.assertEqual(8, concurrency.limit)
+        concurrency.on_overlimit()
+        self.assertEqual(4, concurrency.limit)
+        concurrency.on_overlimit()
+        concurrency.on_overlimit()
+        concurrency.on_overlimit()
+        self.assertEqual(1, concurrency.limit)
+        concurrency.on_success()
+        self.assertEqual(2, concurrency.limit)
+        concurrency.on_success()
+        self.assertEqual(2, concurrency.limit)
+        concurrency.on_success()
+        self.assertEqual(3, concurrency.limit)
+
+    def test_unlimited(self):
+        concurrency = pacing.AdaptiveConcurrency()
+        with concurrency.slot():
+            with concurrency.slot():
+                with concurrency.slot():
+                    concurrency.on_overlimit()
+        self.assertEqual(2, concurrency.limit)
+
+
+@mock.patch.object(pacing, '_sleep')
+class PacerTest(utils.TestCase):
+
+    def setUp(self):
+        super(PacerTest, self).setUp()
+        self.pacer = pacing.Pacer(max_retries=2, backoff=1)
+
+    def test_retries(self, mock_sleep):
+        send = mock.Mock(side_effect=[(_response(429, '3'), None),
+                                      (_response(429), None),
+                                      (_response(200), 'body')])
+        resp, body = self.pacer.send('GET', send)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('body', body)
+        self.assertEqual(3, send.call_count)
+        # Retry-After, then the backoff of the second retry
+        self.assertGreaterEqual(mock_sleep.call_args_list[0][0][0], 3)
+        self.assertLessEqual(mock_sleep.call_args_list[0][0][0], 4)
+        self.assertLessEqual(mock_sleep.call_args_list[1][0][0], 2)
+        # halved to 1 by the refusals, increased by the success
+        self.assertEqual(2, self.pacer.concurrency.limit)
+
+    def test_max_retries(self, mock_sleep):
+        send = mock.Mock(return_value=(_response(429), None))
+        resp, _body = self.pacer.send('DELETE', send)
+        self.assertEqual(429, resp.status_code)
+        self.assertEqual(3, send.call_count)
+
+    def test_retry_after_over_max_backoff(self, mock_sleep):
+        send = mock.Mock(return_value=(_response(429, '3600'), None))
+        resp, _body = self.pacer.send('GET', send)
+        self.assertEqual(429, resp.status_code)
+        self.assertEqual(1, send.call_count)
+        self.assertFalse(mock_sleep.called)
+
+    def test_not_idempotent(self, mock_sleep):
+        send = mock.Mock(return_value=(_response(429), None))
+        resp, _body = self.pacer.send('POST', send)
+        self.assertEqual(429, resp.status_code)
+        self.assertEqual(1, send.call_count)
+        self.assertFalse(mock_sleep.called)
+
+    def test_delay(self, mock_sleep):
+        for attempt in range(10):
+            delay = self.pacer.delay(attempt)
+            self.assertTrue(0 <= delay <= min(2 ** attempt, 60))
+        self.assertTrue(5 <= self.pacer.delay(0, 5) <= 6)
+
+    def test_from_limits(self, mock_sleep):
+        info = {'rate': [{'uri': '*', 'regex': '.*',
+                          'limit': [{'verb': 'GET', 'value': 120,
+                                     'remaining': 120, 'unit': 'MINUTE',
+                                     'next-available': None},
+                                    {'verb': 'POST', 'value': 3600,
+                                     'remaining': 3600, 'unit': 'HOUR',
+                                     'next-available': None}]}],
+                'absolute': {}}
+        pacer = pacing.Pacer.from_limits(limits.Limits(None, info))
+        self.assertEqual(1, pacer.bucket.rate)
+
+        pacer = pacing.Pacer.from_limits(
+            limits.Limits(None, {'rate': [], 'absolute': {}}))
+        self.assertIsNone(pacer.bucket)
+
+
+@mock.patch.object(pacing, '_sleep')
+class SessionClientPacingTest(utils.TestCase):
+
+    def test_request_is_retried(self, mock_sleep):
+        self.requests_mock.get('http://nova/servers',
+                               [{'status_code': 429,
+                                 'headers': {'Retry-After': '1'},
+                                 'json': {'overLimit': {}}},
+                                {'status_code': 200,
+                                 'json': {'servers': []}}])
+        cs = client.SessionClient(session=session.Session(),
+                                  pacer=pacing.Pacer())
+        resp, body = cs.get('http://nova/servers')
+        self.assertEqual({'servers': []}, body)
+        self.assertEqual(1, mock_sleep.call_count)
+
+    def test_error_once_retries_are_exhausted(self, mock_sleep):
+        self.requests_mock.get('http://nova/servers', status_code=413,
+                               headers={'Retry-After': '1'},
+                               json={'overLimit': {}})
+        cs = client.SessionClient(session=session.Session(),
+                                  pacer=pacing.Pacer(max_retries=1))
+        e = self.assertRaises(exceptions.OverLimit, cs.get,
+                              'http://nova/servers')
+        self.assertEqual(1, e.retry_after)
+        self.assertEqual(2, self.requests_mock.call_count)
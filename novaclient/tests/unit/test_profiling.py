@@ -0,0 +1,79 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import threading
+
+import mock
+
+from novaclient import profiling
+from novaclient.tests.unit import utils
+
+
+@mock.patch.object(profiling, 'clock')
+class PhaseProfileTest(utils.TestCase):
+
+    def test_phases(self, mock_clock):
+        mock_clock.return_value = 0.0
+        profile = profiling.PhaseProfile(start=-1.0)
+        profile.add('imports', 1.0)
+
+        @profiling.phased('render')
+        def render():
+            mock_clock.return_value += 1
+            with profiling.phase('http'):
+                mock_clock.return_value += 2
+            mock_clock.return_value += 1
+            return 'output'
+
+        with profile.activate():
+            self.assertTrue(profiling.active())
+            with profiling.phase('command'):
+                mock_clock.return_value += 1
+                with profiling.phase('http'):
+                    mock_clock.return_value += 2
+                self.assertEqual('output', render())
+            mock_clock.return_value += 1
+        self.assertFalse(profiling.active())
+
+        result = profile.as_dict()
+        self.assertEqual(9, result['total_seconds'])
+        self.assertEqual([{'phase': 'imports', 'seconds': 1, 'calls': 1},
+                          {'phase': 'command', 'seconds': 1, 'calls': 1},
+                          {'phase': 'http', 'seconds': 4, 'calls': 2},
+                          {'phase': 'render', 'seconds': 2, 'calls': 1},
+                          {'phase': 'other', 'seconds': 1, 'calls': 1}],
+                         result['phases'])
+        self.assertEqual(result, json.loads(profile.to_json()))
+
+    def test_inactive(self, mock_clock):
+        mock_clock.return_value = 0.0
+        profile = profiling.PhaseProfile()
+        with profiling.phase('http'):
+            mock_clock.return_value += 1
+        self.assertEqual({}, profile.seconds)
+
+    def test_other_threads(self, mock_clock):
+        mock_clock.return_value = 0.0
+        profile = profiling.PhaseProfile()
+
+        def request():
+            with profiling.phase('http'):
+                mock_clock.return_value += 1
+
+        with profile.activate():
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+        self.assertEqual({}, profile.seconds)
+        self.assertEqual(1, profile.as_dict()['total_seconds'])
@@ -13,6 +13,9 @@
 
 import argparse
 import distutils.version as dist_version
+import json
+import os
+import pstats
 import re
 import sys
 
@@ -25,6 +28,7 @@ import six
 from testtools import matchers
 
 from novaclient import api_versions
+from novaclient import cache
 import novaclient.client
 from novaclient import exceptions
 import novaclient.shell
@@ -631,6 +635,79 @@ class ShellTest(utils.TestCase):
         exc = self.assertRaises(RuntimeError, self.shell, '--timings list')
         self.assertEqual('Boom!', str(exc))
 
+    @requests_mock.Mocker()
+    def test_metrics(self, m_requests):
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        export = self.mock_client.return_value.get_metrics.return_value.export
+        export.return_value = 'novaclient_requests_total 1'
+        stdout, stderr = self.shell('--metrics prometheus list')
+        export.assert_called_once_with('prometheus')
+        self.assertEqual('novaclient_requests_total 1\n', stderr)
+        self.assertNotIn('novaclient_requests_total', stdout)
+
+    @requests_mock.Mocker()
+    def test_timings_output_format(self, m_requests):
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.mock_client.return_value.get_timings.return_value = [
+            ('GET /servers/detail', 1.0, 1.5)]
+        stdout, stderr = self.shell('--timings --format json list')
+        self.assertNotIn('Total', stdout)
+        self.assertIn('GET /servers/detail', stderr)
+        self.assertIn('Total', stderr)
+
+        stdout, stderr = self.shell('--timings list')
+        self.assertIn('Total', stdout)
+
+    def test_invalid_output_format_env(self):
+        self.make_env(fake_env=dict(FAKE_ENV, OS_OUTPUT_FORMAT='xml'))
+        self.assertRaises(exceptions.CommandError, self.shell, 'list')
+
+    def _pacer(self, m_requests, argstr):
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        self.shell(argstr)
+        return self.mock_client.call_args[1]['pacer']
+
+    @requests_mock.Mocker()
+    def test_pacer(self, m_requests):
+        pacer = self._pacer(m_requests, 'list')
+        self.assertIsNone(pacer.bucket)
+        self.assertEqual(3, pacer.max_retries)
+
+    @requests_mock.Mocker()
+    def test_pacer_rate_limit(self, m_requests):
+        pacer = self._pacer(m_requests, '--rate-limit 5 list')
+        self.assertEqual(5, pacer.bucket.rate)
+        self.assertEqual(3, pacer.max_retries)
+
+    @requests_mock.Mocker()
+    def test_pacer_max_retries(self, m_requests):
+        pacer = self._pacer(m_requests, '--max-retries 0 list')
+        self.assertEqual(0, pacer.max_retries)
+
+    @mock.patch('keystoneauth1.session.Session.get_token')
+    @requests_mock.Mocker()
+    def test_phase_timings(self, mock_get_token, m_requests):
+        self.make_env()
+        self.register_keystone_discovery_fixture(m_requests)
+        stats_file = self.useFixture(fixtures.TempDir()).join('stats')
+        _stdout, stderr = self.shell('--phase-timings --cprofile-stats %s '
+                                     'list' % stats_file)
+        self.assertTrue(mock_get_token.called)
+        profile = json.loads(stderr)
+        phases = [phase['phase'] for phase in profile['phases']]
+        self.assertEqual(['imports', 'argparse', 'auth', 'version_discovery',
+                          'extensions', 'command', 'render', 'other'], phases)
+        # the global and the subcommand arguments
+        self.assertEqual(3, profile['phases'][1]['calls'])
+        self.assertAlmostEqual(
+            profile['total_seconds'],
+            sum(phase['seconds'] for phase in profile['phases']))
+        self.assertIn('main', ''.join(
+            func[2] for func in pstats.Stats(stats_file).stats))
+
     @requests_mock.Mocker()
     def test_osprofiler(self, m_requests):
         self.make_env()
@@ -660,6 +737,42 @@ class ShellTest(utils.TestCase):
         client_args = self.mock_client.call_args_list[1][0]
         self.assertEqual(api_versions.APIVersion("2.3"), client_args[0])
 
+    def test_microversion_with_version_cache(self):
+        self.make_env(fake_env=FAKE_ENV5)
+        self.mock_server_version_range.return_value = (
+            api_versions.APIVersion("2.1"), api_versions.APIVersion("2.3"))
+        self.shell('list')
+        self.assertIsNone(self.mock_server_version_range.call_args[0][1])
+        self.shell('--os-version-cache list')
+        self.assertIsInstance(self.mock_server_version_range.call_args[0][1],
+                              cache.VersionCache)
+
+    def test_completion_index(self):
+        self.make_env()
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_UUID_CACHE_DIR', '/tmp/novaclient'))
+        self.shell('list')
+        # the client used for the version discovery does not record anything
+        self.assertNotIn('completion_index',
+                         self.mock_client.call_args_list[0][1])
+        index = self.mock_client.call_args_list[1][1]['completion_index']
+        self.assertIsInstance(index, cache.CompletionIndex)
+        self.assertEqual('/tmp/novaclient',
+                         os.path.dirname(index.directory))
+
+    def test_name_index(self):
+        self.make_env()
+        self.shell('list')
+        self.assertIsNone(self.mock_client.call_args_list[1][1]['name_index'])
+
+        self.mock_client.reset_mock()
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_UUID_CACHE_DIR', '/tmp/novaclient'))
+        self.shell('--os-name-cache list')
+        name_index = self.mock_client.call_args_list[1][1]['name_index']
+        self.assertIsInstance(name_index, cache.NameIndex)
+        self.assertTrue(name_index.path.startswith('/tmp/novaclient/'))
+
     def test_microversion_with_default_behaviour_with_legacy_server(self):
         self.make_env(fake_env=FAKE_ENV5)
         self.mock_server_version_range.return_value = (
@@ -0,0 +1,170 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import fixtures
+from oslo_utils import reflection
+
+from novaclient import exceptions
+from novaclient.tests.unit.fixture_data import client
+from novaclient.tests.unit.fixture_data import keypairs as data
+from novaclient.tests.unit import utils
+from novaclient.tests.unit.v2 import fakes
+from novaclient import tracing
+from novaclient.v2 import servers
+
+
+class TracingTest(utils.FixturedTestCase):
+
+    client_fixture_class = client.V1
+    data_fixture_class = data.V1
+
+    def setUp(self):
+        super(TracingTest, self).setUp()
+        self.events = []
+        for hook_type in tracing.HOOK_TYPES:
+            self.add_hook(hook_type)
+
+    def add_hook(self, hook_type):
+        def hook(span):
+            self.events.append((hook_type, span.name, span))
+        tracing.add_hook(hook_type, hook)
+        self.addCleanup(tracing.remove_hook, hook_type, hook)
+
+    def test_operation(self):
+        self.cs.keypairs.get('test')
+        self.assertEqual(
+            [('before_operation', 'keypairs.get'),
+             ('before_request', 'GET /os-keypairs/test'),
+             ('after_request', 'GET /os-keypairs/test'),
+             ('after_operation', 'keypairs.get')],
+            [event[:2] for event in self.events])
+
+        request = self.events[2][2]
+        self.assertEqual(200, request.status_code)
+        self.assertEqual([fakes.FAKE_REQUEST_ID], request.request_ids)
+
+        operation = self.events[3][2]
+        self.assertIs(operation, request.parent)
+        self.assertEqual(operation.trace_id, request.trace_id)
+        self.assertEqual(self.cs.api_version.get_string(),
+                         operation.microversion)
+        self.assertEqual(1, operation.pages)
+        self.assertEqual([fakes.FAKE_REQUEST_ID], operation.request_ids)
+        self.assertGreaterEqual(operation.latency, request.latency)
+        self.assertIsNone(operation.error)
+
+    def test_nested_operations(self):
+        self.cs.keypairs.find(name='test')
+        operations = [event[2] for event in self.events
+                      if event[0] == 'after_operation']
+        self.assertEqual(['keypairs.list', 'keypairs.findall',
+                          'keypairs.find'],
+                         [span.name for span in operations])
+        find = operations[-1]
+        self.assertIsNone(find.parent)
+        self.assertIs(find, operations[1].parent)
+        self.assertEqual(1, find.pages)
+        self.assertEqual(1, len(set(span.trace_id for span in operations)))
+
+    def test_error(self):
+        self.requests_mock.get(self.data_fixture.url('missing'),
+                               status_code=404)
+        self.assertRaises(exceptions.NotFound,
+                          self.cs.keypairs.get, 'missing')
+        request, operation = [event[2] for event in self.events
+                              if event[0].startswith('after_')]
+        self.assertEqual(404, request.status_code)
+        self.assertIsNone(request.error)
+        self.assertEqual('NotFound', operation.error)
+
+    def test_generator(self):
+        url = self.data_fixture.compute_url + '/servers/detail'
+        self.requests_mock.get(url, [
+            {'json': {'servers': [{'id': 'server-1'}]},
+             'headers': {'x-openstack-request-id': 'req-1'}},
+            {'json': {'servers': []},
+             'headers': {'x-openstack-request-id': 'req-2'}}])
+        self.assertEqual(['server-1'],
+                         [server.id for server in self.cs.servers.iter()])
+
+        operations = [event[2] for event in self.events
+                      if event[0] == 'after_operation']
+        self.assertEqual(['servers.iter'], [span.name for span in operations])
+        operation = operations[0]
+        # the second page is prefetched by another thread
+        self.assertEqual(2, operation.pages)
+        self.assertEqual(['req-1', 'req-2'], sorted(operation.request_ids))
+        for event in self.events:
+            if event[0] == 'after_request':
+                self.assertIs(operation, event[2].parent)
+
+    def test_closed_generator(self):
+        url = self.data_fixture.compute_url + '/servers/detail'
+        self.requests_mock.get(url, json={'servers': [{'id': 'server-1'}]})
+        servers_iter = self.cs.servers.iter(limit=1)
+        next(servers_iter)
+        servers_iter.close()
+        self.assertEqual('after_operation', self.events[-1][0])
+        self.assertEqual(1, self.events[-1][2].pages)
+
+    def test_context_manager_not_traced(self):
+        with self.cs.servers.coalesce_gets():
+            pass
+        self.assertEqual([], self.events)
+        self.assertFalse(getattr(servers.ServerManager.coalesce_gets,
+                                 'traced', False))
+
+    def test_signature(self):
+        self.assertIn('search_opts',
+                      reflection.get_callable_args(self.cs.servers.list))
+
+    def test_invalid_hook_type(self):
+        self.assertRaises(ValueError, tracing.add_hook, 'before_everything',
+                          lambda span: None)
+
+
+class FileSpanExporterTest(utils.FixturedTestCase):
+
+    client_fixture_class = client.V1
+    data_fixture_class = data.V1
+
+    def test_export(self):
+        path = self.useFixture(fixtures.TempDir()).join('spans.jsonl')
+        exporter = tracing.FileSpanExporter(path).install()
+        self.addCleanup(exporter.shutdown)
+        self.cs.keypairs.get('test')
+        exporter.shutdown()
+        # not traced anymore
+        self.cs.keypairs.get('test')
+
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(2, len(lines))
+        request, operation = [
+            line['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+            for line in lines]
+        self.assertEqual('keypairs.get', operation['name'])
+        self.assertNotIn('parentSpanId', operation)
+        self.assertEqual(operation['spanId'], request['parentSpanId'])
+        self.assertEqual(operation['traceId'], request['traceId'])
+        self.assertEqual(3, request['kind'])
+        self.assertIn({'key': 'novaclient.pages',
+                       'value': {'intValue': '1'}},
+                      operation['attributes'])
+        self.assertIn({'key': 'novaclient.request_ids',
+                       'value': {'stringValue': fakes.FAKE_REQUEST_ID}},
+                      operation['attributes'])
+        self.assertLessEqual(int(operation['startTimeUnixNano']),
+                             int(operation['endTimeUnixNano']))
@@ -11,14 +11,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
 import sys
+import threading
+import time
 
 import mock
 from oslo_utils import encodeutils
+import prettytable
 import six
 from six.moves.urllib import parse
 
 from novaclient import base
+from novaclient import cache
 from novaclient import exceptions
 from novaclient.tests.unit import fakes
 from novaclient.tests.unit import utils as test_utils
@@ -169,6 +174,80 @@ class FindResourceTestCase(test_utils.TestCase):
                           alphanum_manager, res.name, wrap_exception=False)
 
 
+class NameIndexFindResourceTestCase(test_utils.TestCase):
+
+    def setUp(self):
+        super(NameIndexFindResourceTestCase, self).setUp()
+        self.manager = FakeManager(True)
+        self.name_index = cache.NameIndex()
+        self.manager.api = mock.Mock(name_index=self.name_index,
+                                     project_id='project')
+
+    def test_name_is_resolved_once(self):
+        output = utils.find_resource(self.manager, 'UPPER')
+        self.assertEqual('12345', output.id)
+        key = self.name_index.make_key(self.manager, 'UPPER', {})
+        self.assertEqual('12345', self.name_index.get(key))
+
+        with mock.patch.object(self.manager, 'find') as mock_find:
+            output = utils.find_resource(self.manager, 'UPPER')
+        self.assertEqual('12345', output.id)
+        self.assertFalse(mock_find.called)
+
+    def test_ids_are_not_recorded(self):
+        utils.find_resource(self.manager, UUID)
+        utils.find_resource(self.manager, '1234')
+        self.assertEqual({}, self.name_index._entries)
+
+    def test_stale_entry(self):
+        key = self.name_index.make_key(self.manager, 'UPPER', {})
+        self.name_index.set(key, '123456')
+        output = utils.find_resource(self.manager, 'UPPER')
+        self.assertEqual('12345', output.id)
+        self.assertEqual('12345', self.name_index.get(key))
+
+        self.name_index.set(key, 'deleted')
+        output = utils.find_resource(self.manager, 'UPPER')
+        self.assertEqual('12345', output.id)
+
+    def test_keys(self):
+        key = self.name_index.make_key(self.manager, 'name', {'a': 1})
+        self.assertNotEqual(
+            key, self.name_index.make_key(self.manager, 'name', {}))
+        self.assertNotEqual(
+            key, self.name_index.make_key(FakeDisplayManager(), 'name',
+                                          {'a': 1}))
+        self.manager.api.project_id = 'other'
+        self.assertNotEqual(
+            key, self.name_index.make_key(self.manager, 'name', {'a': 1}))
+
+    @mock.patch.object(utils, 'run_concurrently',
+                       side_effect=utils.run_concurrently)
+    def test_concurrent_lookups(self, mock_run):
+        output = utils.find_resource(self.manager, 'entity_three')
+        self.assertEqual('01234', output.id)
+        self.assertTrue(mock_run.called)
+
+        # UUIDs are not ambiguous
+        mock_run.reset_mock()
+        utils.find_resource(self.manager, UUID)
+        self.assertFalse(mock_run.called)
+
+        self.name_index.concurrent = False
+        utils.find_resource(self.manager, 'lower')
+        self.assertFalse(mock_run.called)
+
+    def test_errors(self):
+        self.assertRaises(exceptions.CommandError, utils.find_resource,
+                          self.manager, 'not_exist')
+        self.assertRaises(exceptions.NotFound, utils.find_resource,
+                          self.manager, 'not_exist', wrap_exception=False)
+        with mock.patch.object(self.manager, 'resources',
+                               self.manager.resources * 2):
+            self.assertRaises(exceptions.NoUniqueMatch, utils.find_resource,
+                              self.manager, 'lower', wrap_exception=False)
+
+
 class _FakeResult(object):
     def __init__(self, name, value):
         self.name = name
@@ -250,6 +329,72 @@ class PrintResultTestCase(test_utils.TestCase):
                          '+------+-------+\n' % s,
                          sys.stdout.getvalue())
 
+    @mock.patch('sys.stdout', six.StringIO())
+    def test_print_list_json(self):
+        objs = [_FakeResult("k3", 2), _FakeResult("k1", None)]
+        utils.print_list(objs, ["Name", "Value"], sortby_index=0,
+                         output_format='json')
+        self.assertEqual([{'Name': 'k1', 'Value': None},
+                          {'Name': 'k3', 'Value': 2}],
+                         json.loads(sys.stdout.getvalue()))
+
+    @mock.patch('sys.stdout', six.StringIO())
+    def test_print_list_streaming(self):
+        objs = [_FakeResult("k3", {'a': 1}), _FakeResult("k1", None)]
+
+        def stream():
+            for obj in objs:
+                yield obj
+                # the previous rows are already printed
+                self.assertTrue(sys.stdout.getvalue())
+
+        utils.print_list(stream(), ["Name", "Value"], sortby_index=0,
+                         output_format='jsonl')
+        self.assertEqual('{"Name": "k3", "Value": {"a": 1}}\n'
+                         '{"Name": "k1", "Value": null}\n',
+                         sys.stdout.getvalue())
+
+        sys.stdout.truncate(0)
+        sys.stdout.seek(0)
+        utils.print_list(objs, ["Name", "Value"], output_format='csv')
+        self.assertEqual('Name,Value\n'
+                         'k3,"{""a"": 1}"\n'
+                         'k1,\n',
+                         sys.stdout.getvalue())
+
+        sys.stdout.truncate(0)
+        sys.stdout.seek(0)
+        utils.print_list(objs, ["Name", "Value"], output_format='value')
+        self.assertEqual('k3 {"a": 1}\n'
+                         'k1 \n',
+                         sys.stdout.getvalue())
+
+    @mock.patch('sys.stdout', six.StringIO())
+    def test_print_dict_formats(self):
+        utils.print_dict({'key': 'value', 'list': [1]}, output_format='json')
+        self.assertEqual({'key': 'value', 'list': [1]},
+                         json.loads(sys.stdout.getvalue()))
+
+        sys.stdout.truncate(0)
+        sys.stdout.seek(0)
+        utils.print_dict({'key': 'value', 'list': [1]}, output_format='csv')
+        self.assertEqual('Property,Value\n'
+                         'key,value\n'
+                         'list,[1]\n',
+                         sys.stdout.getvalue())
+
+        sys.stdout.truncate(0)
+        sys.stdout.seek(0)
+        utils.print_dict({'key': 'value', 'list': [1]},
+                         output_format='value')
+        self.assertEqual('value\n[1]\n', sys.stdout.getvalue())
+
+    def test_unknown_output_format(self):
+        self.assertRaises(ValueError, utils.print_list, [], ['Name'],
+                          output_format='xml')
+        self.assertRaises(ValueError, utils.print_dict, {},
+                          output_format='xml')
+
     # without sorting
     @mock.patch('sys.stdout', six.StringIO())
     def test_print_list_sort_by_none(self):
@@ -331,6 +476,61 @@ class PrintResultTestCase(test_utils.TestCase):
                          sys.stdout.getvalue())
 
 
+class RenderTableTestCase(test_utils.TestCase):
+
+    def _assert_like_prettytable(self, fields, rows, sortby_index=None):
+        pt = prettytable.PrettyTable(fields, caching=False)
+        pt.align = 'l'
+        for row in rows:
+            pt.add_row(row)
+        sortby = None if sortby_index is None else fields[sortby_index]
+        lines = utils.render_table(fields, rows, sortby_index)
+        self.assertEqual(pt.get_string(sortby=sortby), '\n'.join(lines))
+
+    def test_render_table(self):
+        self._assert_like_prettytable(['ID', 'Name'],
+                                      [[1, 'a'], [None, ''], [3, 'long name']])
+
+    def test_render_empty_table(self):
+        self._assert_like_prettytable(['ID', 'Name'], [])
+
+    def test_render_multiline_cells(self):
+        self._assert_like_prettytable(['ID', 'Networks'],
+                                      [['1', 'net1\nnet2\n'], ['2', 'a']])
+
+    def test_render_wide_characters(self):
+        self._assert_like_prettytable(
+            [u'\u540d\u524d', 'Name'],
+            [[u'\u4e2d\u6587', u'\u0441\u0435\u0440\u0432'],
+             [u'e\u0301', '\033[31mred\033[0m']])
+
+    def test_render_tabs(self):
+        self._assert_like_prettytable(['ID', 'Name'],
+                                      [[1, 'a\tb'], [2, 'long name']])
+
+    def test_text_width(self):
+        self.assertEqual(4, utils._text_width(u'\u4e2d\u6587'))
+        self.assertEqual(3, utils._text_width(u'a\tb'))
+        self.assertEqual(1, utils._text_width(u'e\u0301'))
+        self.assertEqual(3, utils._text_width(u'\033[31mred\033[0m'))
+        self.assertEqual(4, utils._text_width(u'caf\xe9'))
+
+    def test_render_sorted(self):
+        # the ties are broken by the other columns
+        self._assert_like_prettytable(['Name', 'ID'],
+                                      [['b', '1'], ['a', '3'], ['a', '2']],
+                                      sortby_index=0)
+
+    @mock.patch.object(utils, '_OUTPUT_CHUNK_LINES', 2)
+    @mock.patch('sys.stdout', new_callable=six.StringIO)
+    def test_print_list_chunks(self, mock_stdout):
+        objs = [_FakeResult('k%d' % i, i) for i in range(5)]
+        utils.print_list(objs, ['Name', 'Value'])
+        self.assertEqual('\n'.join(utils.render_table(
+            ['Name', 'Value'], [[o.name, o.value] for o in objs])) + '\n',
+            mock_stdout.getvalue())
+
+
 class FlattenTestCase(test_utils.TestCase):
     def test_flattening(self):
         squashed = utils.flatten_dict(
@@ -402,6 +602,76 @@ class DoActionOnManyTestCase(test_utils.TestCase):
     def test_do_action_on_many_last_fails(self):
         self._test_do_action_on_many([None, Exception()], fail=True)
 
+    @mock.patch('sys.stdout', new_callable=six.StringIO)
+    def test_do_action_on_many_concurrently(self, mock_stdout):
+        def action(item):
+            if item == 2:
+                raise Exception('failed %s' % item)
+
+        self.assertRaises(exceptions.CommandError,
+                          utils.do_action_on_many,
+                          action, [1, 2, 3], 'success with %s', 'error',
+                          concurrency=3)
+        self.assertEqual('success with 1\n'
+                         '%s\n'
+                         'success with 3\n' % encodeutils.safe_encode(
+                             'failed 2'),
+                         mock_stdout.getvalue())
+
+
+class CallInBackgroundTestCase(test_utils.TestCase):
+
+    def test_result(self):
+        wait = utils.call_in_background(lambda x, y=0: x + y, 1, y=2)
+        self.assertEqual(3, wait())
+
+    def test_error(self):
+        def func():
+            raise ValueError()
+
+        wait = utils.call_in_background(func)
+        self.assertRaises(ValueError, wait)
+
+
+class RunConcurrentlyTestCase(test_utils.TestCase):
+
+    def test_results_keep_order(self):
+        results = list(utils.run_concurrently(lambda x: x * 2,
+                                              range(20), concurrency=5))
+        self.assertEqual([(x, x * 2, None) for x in range(20)], results)
+
+    def test_errors_are_returned(self):
+        error = ValueError()
+
+        def func(x):
+            if x == 1:
+                raise error
+            return x
+
+        results = list(utils.run_concurrently(func, [0, 1, 2],
+                                              concurrency=2))
+        self.assertEqual([(0, 0, None), (1, None, error), (2, 2, None)],
+                         results)
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def func(x):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+
+        list(utils.run_concurrently(func, range(12), concurrency=3))
+        self.assertTrue(1 < state['max'] <= 3)
+
+    def test_no_items(self):
+        self.assertEqual([], list(utils.run_concurrently(mock.Mock(), [],
+                                                         concurrency=4)))
+
 
 class RecordTimeTestCase(test_utils.TestCase):
 
@@ -17,6 +17,7 @@
 import copy
 import datetime
 import re
+import threading
 
 import mock
 from oslo_utils import strutils
@@ -75,6 +76,7 @@ class FakeSessionClient(base_client.SessionClient):
 
         self.callstack = []
         self.visited = []
+        self._local = threading.local()
         self.auth = mock.Mock()
         self.session = mock.Mock()
         self.service_type = 'service_type'
@@ -1711,6 +1713,32 @@ class FakeSessionClient(base_client.SessionClient):
                 {'id': 1234, 'hypervisor_hostname': 'hyper1'},
                 {'id': 5678, 'hypervisor_hostname': 'hyper2'}]})
 
+    def get_os_hypervisors_detail(self, **kw):
+        return (200, {}, {
+            "hypervisors": [
+                {'id': 1234,
+                 'hypervisor_hostname': 'hyper1',
+                 'service': {'id': 1, 'host': 'compute1'},
+                 'state': 'up',
+                 'status': 'enabled',
+                 'vcpus': 8,
+                 'vcpus_used': 2,
+                 'memory_mb': 16 * 1024,
+                 'memory_mb_used': 4 * 1024,
+                 'local_gb': 250,
+                 'local_gb_used': 50},
+                {'id': 5678,
+                 'hypervisor_hostname': 'hyper2',
+                 'service': {'id': 2, 'host': 'compute2'},
+                 'state': 'up',
+                 'status': 'enabled',
+                 'vcpus': 4,
+                 'vcpus_used': 4,
+                 'memory_mb': 8 * 1024,
+                 'memory_mb_used': 2 * 1024,
+                 'local_gb': 250,
+                 'local_gb_used': 0}]})
+
     def get_os_hypervisors_statistics(self, **kw):
         return (200, {}, {
             "hypervisor_statistics": {
@@ -0,0 +1,97 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import types
+
+from keystoneauth1 import session as ksession
+import six
+import testtools
+
+from novaclient import api_versions
+from novaclient import exceptions
+from novaclient.tests.unit.fixture_data import client
+from novaclient.tests.unit.fixture_data import servers as data
+from novaclient.tests.unit import utils
+from novaclient.v2 import async_client
+from novaclient.v2 import servers
+
+
+@testtools.skipIf(six.PY2, "asyncio is not available on Python 2")
+class AsyncClientTest(utils.FixturedTestCase):
+
+    client_fixture_class = client.V1
+    data_fixture_class = data.V1
+
+    def setUp(self):
+        super(AsyncClientTest, self).setUp()
+        self.loop = async_client.asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.async_cs = async_client.AsyncClient(self.cs, max_workers=4,
+                                                 loop=self.loop)
+        self.addCleanup(self.async_cs.close)
+
+    def _run(self, *awaitables):
+        return self.loop.run_until_complete(
+            async_client.asyncio.gather(*awaitables))
+
+    def test_managers_are_wrapped(self):
+        self.assertIsInstance(self.async_cs.servers,
+                              async_client.AsyncManager)
+        self.assertIsInstance(self.async_cs.flavors,
+                              async_client.AsyncManager)
+        self.assertIs(servers.Server, self.async_cs.servers.resource_class)
+        self.assertEqual(self.cs.api_version, self.async_cs.api_version)
+
+    def test_concurrent_calls(self):
+        sl, s = self._run(self.async_cs.servers.list(),
+                          self.async_cs.servers.get(1234))
+        self.assertEqual(3, len(sl))
+        for server in sl:
+            self.assertIsInstance(server, servers.Server)
+        self.assertIsInstance(s, servers.Server)
+        self.assertEqual(1234, s.id)
+
+    def test_microversion_dispatch(self):
+        self.cs.api_version = api_versions.APIVersion("2.25")
+        self.assertRaises(exceptions.VersionNotFoundForAPIMethod,
+                          self._run, self.async_cs.servers.tag_list(1234))
+
+    def test_errors_are_propagated(self):
+        self.requests_mock.get(self.data_fixture.url(4321), status_code=404)
+        self.assertRaises(exceptions.NotFound,
+                          self._run, self.async_cs.servers.get(4321))
+
+    def test_generators_are_not_wrapped(self):
+        self.assertIsInstance(self.async_cs.servers.iter(),
+                              types.GeneratorType)
+        with self.async_cs.servers.coalesce_gets():
+            pass
+
+    def test_own_session_pool(self):
+        adapter = self.cs.client.session.session.get_adapter('https://')
+        self.assertIsInstance(adapter, ksession.TCPKeepAliveAdapter)
+        self.assertEqual(4, adapter._pool_maxsize)
+
+
+@testtools.skipIf(six.PY2, "asyncio is not available on Python 2")
+class AsyncClientSessionTest(utils.FixturedTestCase):
+
+    client_fixture_class = client.SessionV1
+    data_fixture_class = data.V1
+
+    def test_caller_session_is_unchanged(self):
+        adapter = self.client_fixture.session.session.get_adapter('https://')
+        async_cs = async_client.AsyncClient(self.cs, max_workers=4)
+        self.addCleanup(async_cs.close)
+        self.assertIs(adapter, self.client_fixture.session.session.get_adapter(
+            'https://'))
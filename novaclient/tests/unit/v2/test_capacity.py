@@ -0,0 +1,124 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from novaclient import api_versions
+from novaclient.tests.unit import utils
+from novaclient.tests.unit.v2 import fakes
+from novaclient.v2 import aggregates
+from novaclient.v2 import capacity
+from novaclient.v2 import flavors
+from novaclient.v2 import hypervisors
+
+
+def _hypervisor(host, vcpus, vcpus_used, memory_mb, memory_mb_used,
+                local_gb, local_gb_used, **kwargs):
+    info = {'hypervisor_hostname': host + '.node',
+            'service': {'host': host},
+            'vcpus': vcpus, 'vcpus_used': vcpus_used,
+            'memory_mb': memory_mb, 'memory_mb_used': memory_mb_used,
+            'local_gb': local_gb, 'local_gb_used': local_gb_used}
+    info.update(kwargs)
+    return hypervisors.Hypervisor(None, info, loaded=True)
+
+
+def _flavor(name, vcpus, ram, disk, ephemeral=0, swap='', flavor_id=None):
+    return flavors.Flavor(None, {'id': flavor_id or name, 'name': name,
+                                 'vcpus': vcpus, 'ram': ram,
+                                 'disk': disk,
+                                 'OS-FLV-EXT-DATA:ephemeral': ephemeral,
+                                 'swap': swap}, loaded=True)
+
+
+class CapacityTest(utils.TestCase):
+
+    def setUp(self):
+        super(CapacityTest, self).setUp()
+        self.capacity = capacity.Capacity(
+            [_hypervisor('host1', 8, 2, 8192, 2048, 100, 20),
+             _hypervisor('host2', 4, 4, 4096, 0, 100, 0),
+             _hypervisor('host3', 16, 0, 16384, 0, 200, 0),
+             # overcommitted
+             _hypervisor('host4', 4, 6, 4096, 5000, 100, 150),
+             _hypervisor('host5', 32, 0, 32768, 0, 500, 0, state='down')],
+            [aggregates.Aggregate(None, {'name': 'agg1', 'hosts': ['host1'],
+                                         'availability_zone': 'az1'}),
+             aggregates.Aggregate(None, {'name': 'agg2',
+                                         'hosts': ['host1', 'host2'],
+                                         'metadata': {}})])
+
+    def test_free(self):
+        self.assertEqual(['host1', 'host2', 'host3', 'host4'],
+                         self.capacity.hosts)
+        self.assertEqual(['az1', 'nova', 'nova', 'nova'], self.capacity.zones)
+        self.assertEqual([6, 0, 16, 0], self.capacity.free_vcpus)
+        self.assertEqual([6144, 4096, 16384, 0], self.capacity.free_ram_mb)
+        self.assertEqual([80, 100, 200, 0], self.capacity.free_disk_gb)
+
+    def test_allocation_ratios(self):
+        overcommitted = capacity.Capacity(
+            [_hypervisor('host1', 8, 2, 8192, 2048, 100, 20)],
+            cpu_allocation_ratio=16.0, ram_allocation_ratio=1.5)
+        self.assertEqual([126], overcommitted.free_vcpus)
+        self.assertEqual([10240], overcommitted.free_ram_mb)
+        self.assertEqual([80], overcommitted.free_disk_gb)
+
+    def test_fits(self):
+        self.assertEqual([3, 0, 8, 0],
+                         self.capacity.fits(_flavor('m1', 2, 2048, 20)))
+        # the ephemeral and swap disks are on the nodes too
+        self.assertEqual([2, 0, 6, 0],
+                         self.capacity.fits(_flavor('m1', 2, 2048, 20,
+                                                    ephemeral=10, swap=512)))
+        # without disk, the servers boot from volumes
+        self.assertEqual([6, 0, 16, 0],
+                         self.capacity.fits(_flavor('m1', 1, 1024, 0)))
+
+    def test_summary(self):
+        flavor = _flavor('m1.small', 1, 2048, 20)
+        self.assertEqual(
+            [{'group': 'az1', 'nodes': 1, 'free_vcpus': 6,
+              'free_ram_mb': 6144, 'free_disk_gb': 80,
+              'fits': {'m1.small': 3}},
+             {'group': 'nova', 'nodes': 3, 'free_vcpus': 16,
+              'free_ram_mb': 20480, 'free_disk_gb': 300,
+              'fits': {'m1.small': 8}}],
+            self.capacity.summary([flavor]))
+
+    def test_summary_flavor_ids(self):
+        small = _flavor('m1.small', 1, 2048, 20, flavor_id='1')
+        # another flavor with the same name
+        large = _flavor('m1.small', 4, 8192, 40, flavor_id='2')
+        summary = self.capacity.summary([small, large, small])
+        self.assertEqual([{'1': 3, '2': 0}, {'1': 8, '2': 2}],
+                         [group['fits'] for group in summary])
+
+    def test_summary_by_aggregate(self):
+        summary = self.capacity.summary(group_by='aggregate')
+        self.assertEqual(['agg1', 'agg2', None],
+                         [group['group'] for group in summary])
+        self.assertEqual([1, 2, 2], [group['nodes'] for group in summary])
+        self.assertEqual([6, 6, 16],
+                         [group['free_vcpus'] for group in summary])
+
+    def test_summary_invalid_group(self):
+        self.assertRaises(ValueError, self.capacity.summary, group_by='rack')
+
+
+class CapacityForClientTest(utils.TestCase):
+
+    def test_for_client(self):
+        cs = fakes.FakeClient(api_versions.APIVersion('2.1'))
+        result = capacity.Capacity.for_client(cs, cpu_allocation_ratio=2.0)
+        cs.assert_called_anytime('GET', '/os-hypervisors/detail')
+        self.assertEqual(['compute1', 'compute2'], result.hosts)
+        self.assertEqual([14, 4], result.free_vcpus)
@@ -14,6 +14,7 @@
 #    under the License.
 
 from novaclient import api_versions
+from novaclient import exceptions
 from novaclient.tests.unit.fixture_data import client
 from novaclient.tests.unit.fixture_data import hypervisors as data
 from novaclient.tests.unit import utils
@@ -89,6 +90,80 @@ class HypervisorsTest(utils.FixturedTestCase):
         for idx, hyper in enumerate(result):
             self.compare_to_expected(expected[idx], hyper)
 
+    def test_hypervisor_list_all(self):
+        self.requests_mock.get(
+            self.data_fixture.url('detail',
+                                  marker=self.data_fixture.hyper_id_2),
+            json={'hypervisors': []}, headers=self.data_fixture.headers)
+
+        result = self.cs.hypervisors.list_all()
+        self.assertEqual(['hyper1', 'hyper2'],
+                         [hyper.hypervisor_hostname for hyper in result])
+        if self.cs.api_version >= api_versions.APIVersion('2.33'):
+            self.assert_called(
+                'GET',
+                '/os-hypervisors/detail?marker=%s' %
+                self.data_fixture.hyper_id_2)
+        else:
+            self.assert_called('GET', '/os-hypervisors/detail')
+
+    def test_hypervisor_server_index(self):
+        servers = {'hyper1': [{'name': 'inst1', 'uuid': 'uuid1'},
+                              {'name': 'inst2', 'uuid': 'uuid2'}],
+                   'hyper2': [{'name': 'inst3', 'uuid': 'uuid3'}]}
+        hypers = [{'id': self.data_fixture.hyper_id_1,
+                   'hypervisor_hostname': 'hyper1',
+                   'servers': servers['hyper1']},
+                  {'id': self.data_fixture.hyper_id_2,
+                   'hypervisor_hostname': 'hyper2',
+                   'servers': servers['hyper2']}]
+        if self.cs.api_version >= api_versions.APIVersion('2.53'):
+            self.requests_mock.get(self.data_fixture.url(with_servers=True),
+                                   json={'hypervisors': hypers},
+                                   headers=self.data_fixture.headers)
+            self.requests_mock.get(
+                self.data_fixture.url(marker=self.data_fixture.hyper_id_2,
+                                      with_servers=True),
+                json={'hypervisors': []}, headers=self.data_fixture.headers)
+        else:
+            for hyper in hypers:
+                self.requests_mock.get(
+                    self.data_fixture.url(hyper['hypervisor_hostname'],
+                                          'servers'),
+                    json={'hypervisors': [hyper]},
+                    headers=self.data_fixture.headers)
+
+        index = self.cs.hypervisors.server_index()
+        self.assertEqual(servers['hyper1'], index.servers('hyper1'))
+        self.assertEqual(servers['hyper2'], index.servers('hyper2'))
+        self.assertEqual([], index.servers('hyper3'))
+        self.assertEqual('hyper2',
+                         index.hypervisor('uuid3').hypervisor_hostname)
+        self.assertIsNone(index.hypervisor('uuid5'))
+        self.assertEqual(['hyper1', 'hyper2'],
+                         [hyper.hypervisor_hostname
+                          for hyper in index.search('hyper')])
+        self.assertEqual(['hyper1'],
+                         [hyper.hypervisor_hostname
+                          for hyper in index.search('hyper1', strict=True)])
+        self.assertEqual([], index.search('hyper', strict=True))
+
+    def test_hypervisor_list_all_with_servers(self):
+        if self.cs.api_version >= api_versions.APIVersion('2.53'):
+            self.requests_mock.get(
+                self.data_fixture.url(marker=self.data_fixture.hyper_id_2,
+                                      with_servers=True),
+                json={'hypervisors': []}, headers=self.data_fixture.headers)
+            self.cs.hypervisors.list_all(detailed=False, with_servers=True)
+            self.assert_called(
+                'GET',
+                '/os-hypervisors?marker=%s&with_servers=True' %
+                self.data_fixture.hyper_id_2)
+        else:
+            self.assertRaises(exceptions.UnsupportedAttribute,
+                              self.cs.hypervisors.list_all,
+                              with_servers=True)
+
     def test_hypervisor_search(self):
         expected = [
             dict(id=self.data_fixture.hyper_id_1,
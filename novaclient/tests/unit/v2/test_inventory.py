@@ -0,0 +1,139 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+
+from novaclient import api_versions
+from novaclient import exceptions
+from novaclient.tests.unit.fixture_data import client
+from novaclient.tests.unit.fixture_data import servers as data
+from novaclient.tests.unit import utils
+from novaclient.v2 import inventory
+from novaclient.v2 import servers
+
+
+class ServerInventoryTest(utils.FixturedTestCase):
+
+    client_fixture_class = client.V1
+    data_fixture_class = data.V1
+
+    def setUp(self):
+        super(ServerInventoryTest, self).setUp()
+        self.servers = {}
+        for name, status in (('a', 'ACTIVE'), ('b', 'ERROR')):
+            self._set_server(name, status)
+        self.listing = self.requests_mock.get(self.data_fixture.url('detail'),
+                                              json=self._detail)
+
+    def _set_server(self, name, status, host='host1'):
+        server = dict(self.data_fixture.server_1234, id=name, name=name,
+                      status=status)
+        server['OS-EXT-SRV-ATTR:host'] = host
+        self.servers[name] = server
+
+    def _detail(self, request, context):
+        if 'marker' in request.qs:
+            return {'servers': []}
+        servers = list(self.servers.values())
+        if 'changes-since' not in request.qs:
+            servers = [server for server in servers
+                       if server['status'] != 'DELETED']
+        return {'servers': servers}
+
+    def test_deltas(self):
+        server_inventory = inventory.ServerInventory(self.cs.servers)
+        self.assertEqual(['a', 'b'],
+                         sorted(s.name for s in server_inventory.list()))
+        self.assertNotIn('changes-since', self.listing.last_request.qs)
+
+        self._set_server('a', 'DELETED')
+        self._set_server('c', 'ACTIVE')
+        self._set_server('b', 'ACTIVE', host='host2')
+        sl = server_inventory.list()
+        self.assertIn('changes-since', self.listing.last_request.qs)
+        self.assertEqual(['b', 'c'], sorted(s.name for s in sl))
+        self.assertIsInstance(sl[0], servers.Server)
+        self.assertEqual('host2',
+                         getattr(server_inventory.get('b'),
+                                 'OS-EXT-SRV-ATTR:host'))
+        self.assertRaises(exceptions.NotFound, server_inventory.get, 'a')
+
+    def test_queries(self):
+        server_inventory = inventory.ServerInventory(self.cs.servers,
+                                                     max_age=60)
+        self.assertEqual(
+            ['b'], [s.name for s in server_inventory.list(
+                {'status': 'error', 'host': 'host1', 'name': '^b'})])
+        self.assertEqual('a', server_inventory.find(status='ACTIVE').name)
+        self.assertRaises(exceptions.NoUniqueMatch, server_inventory.find,
+                          hostId=self.data_fixture.server_1234['hostId'])
+        self.assertRaises(ValueError, server_inventory.list,
+                          {'deleted': True})
+        self.assertRaises(ValueError, server_inventory.list,
+                          {'all_tenants': True})
+        # all the queries were answered by the first listing
+        self.assertEqual(2, self.listing.call_count)
+
+    def test_flavor(self):
+        self._set_server('c', 'ACTIVE')
+        self.servers['c']['flavor'] = {'id': 2, 'name': 'other'}
+        server_inventory = inventory.ServerInventory(self.cs.servers)
+        self.assertEqual(['c'], [s.name for s in server_inventory.list(
+            {'flavor': '2'})])
+
+    def test_flavor_original_name(self):
+        self.cs.api_version = api_versions.APIVersion('2.47')
+        for name in ('a', 'b'):
+            self.servers[name]['flavor'] = {'original_name': 'm1.small'}
+        self._set_server('c', 'ACTIVE')
+        self.servers['c']['flavor'] = {'original_name': 'm1.large'}
+        self.requests_mock.get(
+            self.data_fixture.compute_url + '/flavors/3',
+            json={'flavor': {'id': '3', 'name': 'm1.large'}})
+        self.requests_mock.get(
+            self.data_fixture.compute_url + '/flavors/4', status_code=404)
+        server_inventory = inventory.ServerInventory(self.cs.servers)
+        self.assertEqual(['c'], [s.name for s in server_inventory.list(
+            {'flavor': '3'})])
+        self.assertEqual([], server_inventory.list({'flavor': '4'}))
+
+    def test_full_sync(self):
+        server_inventory = inventory.ServerInventory(self.cs.servers,
+                                                     full_sync_interval=-1)
+        server_inventory.refresh()
+        server_inventory.refresh()
+        self.assertNotIn('changes-since', self.listing.last_request.qs)
+
+    def test_on_disk(self):
+        directory = self.useFixture(fixtures.TempDir()).path
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_INVENTORY_DIR', directory))
+        server_inventory = inventory.ServerInventory.for_client(
+            self.cs, {'all_tenants': True})
+        self.assertEqual(directory, os.path.dirname(server_inventory.path))
+        server_inventory.refresh()
+
+        other = inventory.ServerInventory.for_client(
+            self.cs, {'all_tenants': True})
+        self.assertEqual(server_inventory.path, other.path)
+        other.refresh()
+        self.assertIn('changes-since', self.listing.last_request.qs)
+        self.assertNotEqual(
+            other.path,
+            inventory.ServerInventory.for_client(self.cs).path)
+
+    def test_untracked_options(self):
+        self.assertRaises(ValueError, inventory.ServerInventory,
+                          self.cs.servers, {'status': 'ACTIVE'})
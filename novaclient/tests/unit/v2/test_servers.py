@@ -13,8 +13,10 @@
 #    under the License.
 
 import base64
+import datetime
 import os
 import tempfile
+import threading
 
 import mock
 import six
@@ -26,6 +28,7 @@ from novaclient.tests.unit.fixture_data import floatingips
 from novaclient.tests.unit.fixture_data import servers as data
 from novaclient.tests.unit import utils
 from novaclient.tests.unit.v2 import fakes
+from novaclient import utils as nutils
 from novaclient.v2 import servers
 
 
@@ -106,6 +109,27 @@ class ServersTest(utils.FixturedTestCase):
             self.assertIsInstance(s, servers.Server)
         self.assertEqual(3, len(sl))
 
+    def test_iter_servers(self):
+        it = self.cs.servers.iter()
+        first = next(it)
+        self.assertIsInstance(first, servers.Server)
+        rest = list(it)
+        self.assertEqual(3, len(rest) + 1)
+        self.assert_called('GET', '/servers/detail', pos=-2)
+        self.assert_called('GET', '/servers/detail?marker=9012')
+
+    def test_iter_servers_without_prefetch(self):
+        sl = list(self.cs.servers.iter(prefetch=False))
+        self.assertEqual(3, len(sl))
+        self.assert_called('GET', '/servers/detail', pos=-2)
+        self.assert_called('GET', '/servers/detail?marker=9012')
+
+    def test_iter_servers_with_limit_above_max_limit(self):
+        sl = list(self.cs.servers.iter(limit=3))
+        self.assert_called('GET', '/servers/detail?limit=3', pos=-2)
+        self.assert_called('GET', '/servers/detail?limit=1&marker=5678')
+        self.assertEqual(3, len(sl))
+
     def test_list_servers_sort_single(self):
         sl = self.cs.servers.list(sort_keys=['display_name'],
                                   sort_dirs=['asc'])
@@ -666,6 +690,251 @@ class ServersTest(utils.FixturedTestCase):
         self.assert_request_id(ret, fakes.FAKE_REQUEST_ID_LIST)
         self.assert_called('POST', '/servers/1234/action')
 
+    def test_bulk_action(self):
+        s = self.cs.servers.get(1234)
+        results = self.cs.servers.bulk_action('lock', [s, '1234'],
+                                              concurrency=2)
+        self.assertEqual([s, '1234'], [r[0] for r in results])
+        for _server, ret, error in results:
+            self.assertIsNone(error)
+            self.assert_request_id(ret, fakes.FAKE_REQUEST_ID_LIST)
+        self.assert_called('POST', '/servers/1234/action')
+
+    def test_bulk_action_reports_errors(self):
+        self.requests_mock.delete(self.data_fixture.url(4321),
+                                  status_code=404)
+        results = self.cs.servers.bulk_action('delete', [1234, 4321])
+        self.assertIsNone(results[0][2])
+        self.assertIsInstance(results[1][2], exceptions.NotFound)
+
+    def test_bulk_action_invalid_action(self):
+        self.assertRaises(ValueError, self.cs.servers.bulk_action,
+                          '_action', [1234])
+        self.assertRaises(ValueError, self.cs.servers.bulk_action,
+                          'resource_class_missing', [1234])
+
+    @mock.patch('time.sleep')
+    def test_wait_for_status_with_since(self, mock_sleep):
+        since = datetime.datetime(2016, 1, 2, 3, 4, 5)
+        results = self.cs.servers.wait_for_status([5678, '9012'], ['ACTIVE'],
+                                                  since=since)
+        self.assertEqual([5678, '9012'], [r[0] for r in results])
+        for _id, server, error in results:
+            self.assertIsInstance(server, servers.Server)
+            self.assertIsNone(error)
+        self.assert_called(
+            'GET', '/servers/detail?changes-since=2016-01-02T03%3A03%3A05Z',
+            pos=-2)
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch('time.sleep')
+    def test_wait_for_status_errors(self, mock_sleep):
+        self.requests_mock.get(self.data_fixture.url(4321), status_code=404)
+        results = self.cs.servers.wait_for_status([5678, 1235, 4321],
+                                                  ['active'])
+        self.assertIsNone(results[0][2])
+        self.assertIsInstance(results[1][2],
+                              exceptions.ResourceInErrorState)
+        self.assertIsInstance(results[2][2],
+                              exceptions.InstanceInDeletedState)
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch('time.sleep')
+    def test_wait_for_status_timeout(self, mock_sleep):
+        results = self.cs.servers.wait_for_status([1234], ['active'],
+                                                  timeout=0)
+        self.assertEqual(1234, results[0][1].id)
+        self.assertIsInstance(results[0][2], exceptions.ResourceWaitTimeout)
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch('time.sleep')
+    def test_wait_for_status_backoff(self, mock_sleep):
+        statuses = ['BUILD', 'BUILD', 'BUILD', 'ACTIVE']
+        seen = []
+
+        def detail(request, context):
+            if 'marker' in request.qs:
+                return {'servers': []}
+            server = dict(self.data_fixture.server_1234)
+            server['status'] = statuses.pop(0)
+            return {'servers': [server]}
+
+        self.requests_mock.get(self.data_fixture.url('detail'), json=detail)
+        results = self.cs.servers.wait_for_status(
+            [1234], ['active'], poll_period=1, since=datetime.datetime.now(),
+            callback=seen.append)
+        self.assertIsNone(results[0][2])
+        self.assertEqual([mock.call(1), mock.call(2), mock.call(4)],
+                         mock_sleep.call_args_list)
+        self.assertEqual(['BUILD', 'ACTIVE'], [s.status for s in seen])
+
+    def _mock_sharded_listing(self):
+        def detail(request, context):
+            if 'marker' in request.qs:
+                return {'servers': []}
+            servers = []
+            for i, name in enumerate(['a', 'b', 'c', 'd']):
+                server = dict(self.data_fixture.server_1234, id=name,
+                              name=name, tenant_id='t%s' % (i % 2),
+                              status='ACTIVE', created='2017-01-0%sT00:00:00Z'
+                              % (i + 1))
+                server['OS-EXT-SRV-ATTR:host'] = 'h%s' % (i % 2)
+                servers.append(server)
+            servers[3]['status'] = 'ERROR'
+            servers[3]['OS-EXT-SRV-ATTR:host'] = None
+            for key in ('tenant_id', 'status'):
+                if key in request.qs:
+                    servers = [server for server in servers
+                               if server[key].lower() == request.qs[key][0]]
+            if 'host' in request.qs:
+                servers = [server for server in servers
+                           if server['OS-EXT-SRV-ATTR:host'] ==
+                           request.qs['host'][0]]
+            return {'servers': servers}
+
+        return self.requests_mock.get(self.data_fixture.url('detail'),
+                                      json=detail)
+
+    def test_list_sharded(self):
+        listing = self._mock_sharded_listing()
+        sl = self.cs.servers.list(shard_by='tenant_id', shards=['t0', 't1'],
+                                  sort_keys=['display_name'],
+                                  sort_dirs=['asc'], shard_concurrency=2)
+        self.assertEqual(['a', 'b', 'c', 'd'], [s.name for s in sl])
+        self.assertEqual(4, listing.call_count)
+
+        # the default order is the one of the API
+        sl = self.cs.servers.list(shard_by='tenant_id', shards=['t0', 't1'],
+                                  limit=3)
+        self.assertEqual(['d', 'c', 'b'], [s.name for s in sl])
+
+    def test_list_sharded_by_host(self):
+        listing = self._mock_sharded_listing()
+        with mock.patch.object(self.cs.services, 'list',
+                               return_value=[mock.Mock(host='h0'),
+                                             mock.Mock(host='h1')]):
+            sl = self.cs.servers.list(shard_by='host')
+        self.assertEqual(['d', 'c', 'b', 'a'], [s.name for s in sl])
+        self.assertEqual(
+            set(['h0', 'h1']),
+            set(r.qs['host'][0] for r in listing.request_history
+                if 'host' in r.qs))
+        self.assertEqual(
+            set(['build', 'error', 'shelved_offloaded']),
+            set(r.qs['status'][0] for r in listing.request_history
+                if 'status' in r.qs))
+
+    def test_list_sharded_with_marker(self):
+        self.assertRaises(ValueError, self.cs.servers.list, marker='a',
+                          shard_by='tenant_id', shards=['t0'])
+
+    def _mock_uuid_listing(self, *uuids):
+        def detail(request, context):
+            return {'servers': [dict(self.data_fixture.server_1234, id=i)
+                                for i in request.qs.get('uuid', [])
+                                if i in uuids]}
+
+        return self.requests_mock.get(self.data_fixture.url('detail'),
+                                      json=detail)
+
+    def test_get_many(self):
+        uuid1 = '11111111-1111-1111-1111-111111111111'
+        uuid2 = '22222222-2222-2222-2222-222222222222'
+        listing = self._mock_uuid_listing(uuid1, uuid2)
+        found = self.cs.servers.get_many([uuid2, 1234, uuid1])
+        self.assertEqual([uuid2, 1234, uuid1], [s.id for s in found])
+        self.assertEqual(1, listing.call_count)
+        self.assertEqual(
+            '/servers/detail?limit=2&uuid=%s&uuid=%s' % (uuid1, uuid2),
+            listing.last_request.path_url)
+        self.assert_called('GET', '/servers/1234')
+
+    def test_get_many_not_found(self):
+        uuid1 = '11111111-1111-1111-1111-111111111111'
+        self._mock_uuid_listing()
+        self.requests_mock.get(self.data_fixture.url(uuid1), status_code=404)
+        self.assertRaises(exceptions.NotFound,
+                          self.cs.servers.get_many, [uuid1])
+
+    def test_coalesce_gets(self):
+        uuids = ['%s1111111-1111-1111-1111-111111111111' % i
+                 for i in range(4)]
+        listing = self._mock_uuid_listing(*uuids)
+        with self.cs.servers.coalesce_gets(max_batch=4, window=1) as c:
+            results = list(nutils.run_concurrently(
+                c.bind(self.cs.servers.get), uuids, 4))
+        self.assertEqual(uuids, [server.id for _i, server, _e in results])
+        self.assertEqual(1, listing.call_count)
+        self.assertFalse([r for r in self.requests_mock.request_history
+                          if r.path_url in ['/servers/' + i for i in uuids]])
+
+        # gets are not batched out of the block
+        self.cs.servers.get(1234)
+        self.assert_called('GET', '/servers/1234')
+
+    def test_coalesce_gets_overlapping_blocks(self):
+        uuids = ['%s1111111-1111-1111-1111-111111111111' % i
+                 for i in range(4)]
+        listing = self._mock_uuid_listing(*uuids)
+        with self.cs.servers.coalesce_gets(max_batch=4, window=1) as outer:
+            with self.cs.servers.coalesce_gets(max_batch=2,
+                                               window=1) as inner:
+                list(nutils.run_concurrently(
+                    inner.bind(self.cs.servers.get), uuids[:2], 2))
+            self.assertEqual(1, listing.call_count)
+
+            # a block opened and closed by another thread does not end this
+            # one
+            def other_block():
+                with self.cs.servers.coalesce_gets():
+                    pass
+
+            other = threading.Thread(target=other_block)
+            other.start()
+            other.join()
+
+            # the gets of unrelated threads are not batched
+            unrelated = threading.Thread(
+                target=lambda: self.cs.servers.get(1234))
+            unrelated.start()
+            unrelated.join()
+            self.assert_called('GET', '/servers/1234')
+
+            results = list(nutils.run_concurrently(
+                outer.bind(self.cs.servers.get), uuids, 4))
+        self.assertEqual(uuids, [server.id for _i, server, _e in results])
+        self.assertEqual(2, listing.call_count)
+        self.assertFalse([r for r in self.requests_mock.request_history
+                          if r.path_url in ['/servers/' + i for i in uuids]])
+
+    def test_get_many_uuid_filter_ignored(self):
+        uuids = ['%s1111111-1111-1111-1111-111111111111' % i
+                 for i in range(4)]
+        listing = self.requests_mock.get(
+            self.data_fixture.url('detail'),
+            json={'servers': [self.data_fixture.server_1234]})
+        for uuid in uuids:
+            self.requests_mock.get(
+                self.data_fixture.url(uuid),
+                json={'server': dict(self.data_fixture.server_1234,
+                                     id=uuid)})
+
+        def server_requests():
+            return [r for r in self.requests_mock.request_history
+                    if r.path_url.startswith('/servers')]
+
+        with mock.patch.object(servers, 'GET_MANY_BATCH_SIZE', 2):
+            found = self.cs.servers.get_many(uuids)
+            self.assertEqual(uuids, [s.id for s in found])
+            # a single listing, the second batch is not listed
+            self.assertEqual(1, listing.call_count)
+            self.assertEqual(5, len(server_requests()))
+
+            # no more listings once the filter is known to be ignored
+            self.cs.servers.get_many(uuids)
+            self.assertEqual(1, listing.call_count)
+            self.assertEqual(9, len(server_requests()))
+
     def test_lock(self):
         s = self.cs.servers.get(1234)
         ret = s.lock()
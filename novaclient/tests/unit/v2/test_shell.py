@@ -20,6 +20,7 @@ import argparse
 import base64
 import collections
 import datetime
+import json
 import os
 
 import fixtures
@@ -37,6 +38,8 @@ from novaclient import exceptions
 import novaclient.shell
 from novaclient.tests.unit import utils
 from novaclient.tests.unit.v2 import fakes
+import novaclient.utils
+from novaclient.v2 import flavors
 from novaclient.v2 import servers
 import novaclient.v2.shell
 
@@ -1434,7 +1437,8 @@ class ShellTest(utils.TestCase):
             with mock.patch('novaclient.utils.print_list') as mock_print_list:
                 self.run_command(cmd)
                 mock_print_list.assert_called_once_with(
-                    mock.ANY, mock.ANY, mock.ANY, sortby_index=None)
+                    mock.ANY, mock.ANY, mock.ANY, sortby_index=None,
+                    output_format='table')
 
     def test_list_sortby_index_without_sort(self):
         # sortby_index is 1 without sort information
@@ -1442,7 +1446,8 @@ class ShellTest(utils.TestCase):
             with mock.patch('novaclient.utils.print_list') as mock_print_list:
                 self.run_command(cmd)
                 mock_print_list.assert_called_once_with(
-                    mock.ANY, mock.ANY, mock.ANY, sortby_index=1)
+                    mock.ANY, mock.ANY, mock.ANY, sortby_index=1,
+                    output_format='table')
 
     def test_list_fields(self):
         output, _err = self.run_command(
@@ -1494,6 +1499,43 @@ class ShellTest(utils.TestCase):
         self.assert_called('GET', '/servers/detail?marker=some-uuid', pos=0)
         self.assert_called('GET', '/servers/detail?marker=9014')
 
+    def test_list_sharded(self):
+        self.run_command('list --all-tenants --shard-by host '
+                         '--concurrency 1')
+        self.assert_called('GET', '/os-services?binary=nova-compute', pos=0)
+        self.assert_called('GET', '/servers/detail?all_tenants=1&host=host1',
+                           pos=1)
+
+    def test_list_sharded_with_marker(self):
+        self.assertRaises(exceptions.CommandError, self.run_command,
+                          'list --shard-by host --marker some-uuid')
+
+    def test_list_inventory(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'NOVACLIENT_INVENTORY_DIR',
+            self.useFixture(fixtures.TempDir()).path))
+        self.run_command('list --inventory')
+        self.assert_called('GET', '/servers/detail', pos=0)
+        self.run_command('list --inventory --status active')
+        self.assertIn('changes-since', self.shell.cs.client.callstack[-2][1])
+        self.assertRaises(exceptions.CommandError, self.run_command,
+                          'list --inventory --limit 3')
+
+    def test_list_jsonl(self):
+        with mock.patch.object(servers.ServerManager, 'iter',
+                               side_effect=servers.ServerManager.iter,
+                               autospec=True) as mock_iter:
+            stdout, _stderr = self.run_command('--format jsonl list')
+        self.assertTrue(mock_iter.called)
+        rows = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(['1234', '5678', '9012', '9013', '9014'],
+                         [six.text_type(row['ID']) for row in rows])
+        self.assertEqual('sample-server', rows[0]['Name'])
+
+    def test_show_json(self):
+        stdout, _stderr = self.run_command('--format json show 1234')
+        self.assertEqual('sample-server', json.loads(stdout)['name'])
+
     def test_list_with_limit(self):
         self.run_command('list --limit 3')
         self.assert_called('GET', '/servers/detail?limit=3')
@@ -1541,6 +1583,31 @@ class ShellTest(utils.TestCase):
         self.assert_called('POST', '/servers/5678/action',
                            {'reboot': {'type': 'SOFT'}}, pos=-1)
 
+    def test_reboot_with_poll(self):
+        output, _err = self.run_command('reboot 5678 --poll')
+        self.assertEqual(
+            'GET', self.shell.cs.client.callstack[-2][0])
+        self.assertIn('/servers/detail?changes-since=',
+                      self.shell.cs.client.callstack[-2][1])
+        self.assertIn('Server 5678 rebooting... Finished', output)
+
+    @mock.patch('novaclient.v2.servers.ServerManager.wait_for_status')
+    def test_reboot_many_with_poll_failed(self, mock_wait):
+        mock_wait.return_value = [
+            ('1234', None, None),
+            ('5678', None, exceptions.ResourceWaitTimeout('timed out'))]
+        self.assertRaises(exceptions.CommandError, self.run_command,
+                          'reboot 1234 5678 --poll')
+        self.assertEqual(['1234', '5678'],
+                         [s.id for s in mock_wait.call_args[0][0]])
+
+    def test_reboot_many_with_concurrency(self):
+        self.run_command('reboot 1234 5678 --concurrency 2')
+        body = {'reboot': {'type': 'SOFT'}}
+        calls = self.shell.cs.client.callstack
+        self.assertIn(('POST', '/servers/1234/action', body), calls)
+        self.assertIn(('POST', '/servers/5678/action', body), calls)
+
     def test_rebuild(self):
         output, _err = self.run_command('rebuild sample-server %s'
                                         % FAKE_UUID_1)
@@ -1926,6 +1993,12 @@ class ShellTest(utils.TestCase):
         self.assert_called('GET', '/servers/5678', pos=-2)
         self.assert_called('DELETE', '/servers/5678', pos=-1)
 
+    def test_delete_two_with_concurrency(self):
+        self.run_command('delete 1234 5678 --concurrency 2')
+        calls = [c[0:2] for c in self.shell.cs.client.callstack]
+        self.assertIn(('DELETE', '/servers/1234'), calls)
+        self.assertIn(('DELETE', '/servers/5678'), calls)
+
     def test_delete_two_with_two_existent_all_tenants(self):
         self.run_command('delete sample-server sample-server2 --all-tenants')
         self.assert_called('GET',
@@ -2075,6 +2148,25 @@ class ShellTest(utils.TestCase):
         # Servers, RAM MB-Hours, CPU Hours, Disk GB-Hours
         self.assertIn('2       | 50903.53     | 99.42     | 0.00', stdout)
 
+    def test_usage_list_window(self):
+        cmd = ('usage-list --start 2000-01-20 --end 2000-01-26 --window 2 '
+               '--concurrency 2')
+        stdout, _stderr = self.run_command(cmd)
+        self.assertEqual(
+            ['/os-simple-tenant-usage?start=2000-%sT00:00:00&'
+             'end=2000-%sT00:00:00&detailed=1' % window
+             for window in [('01-20', '01-22'), ('01-22', '01-24'),
+                            ('01-24', '01-26')]],
+            sorted(url for _method, url, _body
+                   in self.shell.cs.client.callstack))
+        # the fake API answers the windows with the pages of a listing
+        # Servers, RAM MB-Hours, CPU Hours, Disk GB-Hours
+        self.assertIn('2       | 50903.53     | 99.42     | 0.00', stdout)
+
+    def test_usage_list_invalid_window(self):
+        self.assertRaises(exceptions.CommandError, self.run_command,
+                          'usage-list --window 0')
+
     def test_usage_list_no_args(self):
         timeutils.set_time_override(datetime.datetime(2005, 2, 1, 0, 0))
         self.addCleanup(timeutils.clear_time_override)
@@ -2095,6 +2187,14 @@ class ShellTest(utils.TestCase):
         # Servers, RAM MB-Hours, CPU Hours, Disk GB-Hours
         self.assertIn('1       | 25451.76     | 49.71     | 0.00', stdout)
 
+    def test_usage_json(self):
+        cmd = ('--format json usage --start 2000-01-20 --end 2005-02-01 '
+               '--tenant test')
+        stdout, _stderr = self.run_command(cmd)
+        usages = json.loads(stdout)
+        self.assertEqual(1, len(usages))
+        self.assertEqual('25451.76', usages[0]['RAM MB-Hours'])
+
     def test_usage_stitch_together_next_results(self):
         cmd = 'usage --start 2000-01-20 --end 2005-02-01'
         stdout, _stderr = self.run_command(cmd, api_version='2.40')
@@ -2295,6 +2395,10 @@ class ShellTest(utils.TestCase):
         self.assertIn('UUID', out)
         self.assertIn('80785864-087b-45a5-a433-b20eac9b58aa', out)
 
+    def test_aggregate_add_host_json(self):
+        out, err = self.run_command('--format json aggregate-add-host 1 host1')
+        self.assertEqual(['1'], [a['Id'] for a in json.loads(out)])
+
     def test_aggregate_add_host_by_name(self):
         self.run_command('aggregate-add-host test host1')
         body = {"add_host": {"host": "host1"}}
@@ -2849,6 +2953,132 @@ class ShellTest(utils.TestCase):
         cmd = 'host-servers-migrate hyper --strict'
         self.assertRaises(exceptions.NotFound, self.run_command, cmd)
 
+    def _mock_migrations(self, statuses, previous=()):
+        """Fake the migration records of the drained servers.
+
+        ``statuses`` maps a server uuid to the list of statuses returned by
+        the successive polls, the last one being repeated, None for no
+        record. The first call for a server, made before its migration is
+        started, returns the ``previous`` records.
+        """
+        polls = collections.defaultdict(int)
+
+        def list_migrations(instance_uuid=None):
+            poll = polls[instance_uuid]
+            polls[instance_uuid] += 1
+            if not poll:
+                return list(previous)
+            states = statuses[instance_uuid]
+            status = states[min(poll - 1, len(states) - 1)]
+            if status is None:
+                return list(previous)
+            return list(previous) + [
+                mock.Mock(id=10, status=status, dest_compute='dest')]
+
+        return mock.patch('novaclient.v2.migrations.MigrationManager.list',
+                          side_effect=list_migrations)
+
+    def _action_posts(self):
+        return [url for method, url, body in self.shell.cs.client.callstack
+                if method == 'POST']
+
+    @mock.patch('novaclient.v2.shell.time.sleep')
+    def test_host_servers_migrate_max_in_flight(self, mock_sleep):
+        statuses = {'uuid1': ['migrating', 'finished'],
+                    'uuid2': ['finished'],
+                    'uuid3': ['finished'],
+                    'uuid4': ['error']}
+        with self._mock_migrations(statuses) as mock_list:
+            out, _ = self.run_command(
+                'host-servers-migrate hyper --max-in-flight 2')
+        self.assertEqual(['/servers/uuid%d/action' % i for i in range(1, 5)],
+                         self._action_posts())
+        # the migrations of a server are listed before it is migrated and
+        # uuid3 only starts once uuid2 is finished
+        self.assertEqual(
+            [mock.call(instance_uuid=uuid) for uuid in
+             ('uuid1', 'uuid2', 'uuid1', 'uuid2', 'uuid3', 'uuid1', 'uuid3',
+              'uuid4', 'uuid4')],
+            mock_list.call_args_list)
+        self.assertEqual(3, mock_sleep.call_count)
+        self.assertIn('4/4 migrations finished, 0 in progress', out)
+        self.assertIn('Migration Status', out)
+        self.assertIn('error', out)
+
+    @mock.patch('novaclient.v2.shell.time.sleep')
+    def test_host_evacuate_live_max_per_destination(self, mock_sleep):
+        statuses = {'uuid1': ['running', 'running', 'completed'],
+                    'uuid2': ['completed'],
+                    'uuid3': ['completed'],
+                    'uuid4': ['completed']}
+        with self._mock_migrations(statuses) as mock_list:
+            self.run_command('host-evacuate-live hyper --max-in-flight 3 '
+                             '--max-per-destination 1')
+        # The destination is saturated by uuid1 until it is completed.
+        self.assertEqual(
+            [mock.call(instance_uuid=uuid) for uuid in
+             ('uuid1', 'uuid2', 'uuid3', 'uuid1', 'uuid2', 'uuid3', 'uuid1',
+              'uuid1', 'uuid4', 'uuid4')],
+            mock_list.call_args_list)
+        self.assertEqual(4, len(self._action_posts()))
+
+    @mock.patch('novaclient.v2.shell.time.sleep')
+    def test_host_evacuate_max_in_flight(self, mock_sleep):
+        statuses = dict(('uuid%d' % i, ['done']) for i in range(1, 5))
+        with self._mock_migrations(statuses):
+            out, _ = self.run_command(
+                'host-evacuate hyper --max-in-flight 4')
+        self.assertEqual(1, mock_sleep.call_count)
+        self.assertIn('Migration Status', out)
+
+    @mock.patch('novaclient.v2.shell.time.sleep')
+    def test_host_servers_migrate_previous_migrations(self, mock_sleep):
+        # the completed migration of a previous move is not the new one
+        previous = [mock.Mock(id=3, status='completed', dest_compute='old')]
+        statuses = {'uuid1': [None, 'migrating', 'finished'],
+                    'uuid2': ['finished'],
+                    'uuid3': ['finished'],
+                    'uuid4': ['finished']}
+        with self._mock_migrations(statuses, previous):
+            out, _ = self.run_command(
+                'host-servers-migrate hyper --max-in-flight 4')
+        self.assertEqual(3, mock_sleep.call_count)
+        self.assertIn('4/4 migrations finished', out)
+
+    @mock.patch('novaclient.v2.shell.time.sleep')
+    def test_host_servers_migrate_no_migration(self, mock_sleep):
+        statuses = {'uuid1': [None],
+                    'uuid2': ['finished'],
+                    'uuid3': ['finished'],
+                    'uuid4': ['finished']}
+        with self._mock_migrations(statuses):
+            out, _ = self.run_command(
+                'host-servers-migrate hyper --max-in-flight 4')
+        self.assertEqual(novaclient.v2.shell._MAX_POLLS_WITHOUT_MIGRATION,
+                         mock_sleep.call_count)
+        self.assertIn('4/4 migrations finished', out)
+        self.assertIn('no migration', out)
+
+    @mock.patch('novaclient.v2.shell.time')
+    def test_host_servers_migrate_drain_timeout(self, mock_time):
+        mock_time.time.return_value = 1000.0
+
+        def sleep(seconds):
+            mock_time.time.return_value += seconds
+        mock_sleep = mock_time.sleep
+        mock_sleep.side_effect = sleep
+
+        statuses = dict(('uuid%d' % i, ['migrating']) for i in range(1, 5))
+        with self._mock_migrations(statuses):
+            out, _ = self.run_command(
+                'host-servers-migrate hyper --max-in-flight 2 '
+                '--drain-timeout 30')
+        self.assertEqual(6, mock_sleep.call_count)
+        self.assertEqual(2, len(self._action_posts()))
+        self.assertIn('Timed out with 2 migrations in progress and 2 not '
+                      'started.', out)
+        self.assertIn('timed out', out)
+
     def test_hypervisor_list(self):
         self.run_command('hypervisor-list')
         self.assert_called('GET', '/os-hypervisors')
@@ -2894,6 +3124,54 @@ class ShellTest(utils.TestCase):
         self.run_command('hypervisor-stats')
         self.assert_called('GET', '/os-hypervisors/statistics')
 
+    def _capacity_flavor(self):
+        return flavors.Flavor(None, {'id': 1, 'name': 'm1.small',
+                                     'vcpus': 2, 'ram': 2048, 'disk': 20},
+                              loaded=True)
+
+    def test_capacity(self):
+        with mock.patch.object(flavors.FlavorManager, 'list',
+                               return_value=[self._capacity_flavor()]):
+            stdout, _stderr = self.run_command(
+                'capacity --cpu-allocation-ratio 2.0')
+        self.assert_called_anytime('GET', '/os-hypervisors/detail')
+        # Availability Zone, Nodes, Free VCPUs, Free RAM MB, Free Disk GB,
+        # m1.small
+        self.assertIn('| nova              | 2     | 18         | 18432       '
+                      '| 450          | 8             |', stdout)
+
+    @mock.patch.object(novaclient.v2.shell, '_find_flavor')
+    def test_capacity_by_host(self, mock_find_flavor):
+        mock_find_flavor.return_value = self._capacity_flavor()
+        stdout, _stderr = self.run_command(
+            'capacity --group-by host --flavor m1.small')
+        self.assertEqual('m1.small', mock_find_flavor.call_args[0][1])
+        # Host, Nodes, Free VCPUs, Free RAM MB, Free Disk GB, m1.small
+        self.assertIn('| compute1 | 1     | 6          | 12288       '
+                      '| 200          | 3             |', stdout)
+        self.assertIn('| compute2 | 1     | 0          | 6144        '
+                      '| 250          | 0             |', stdout)
+
+    @mock.patch.object(novaclient.v2.shell, '_find_flavor')
+    def test_capacity_flavor_columns(self, mock_find_flavor):
+        small = self._capacity_flavor()
+        other = flavors.Flavor(None, {'id': 2, 'name': 'm1.small',
+                                      'vcpus': 1, 'ram': 1024, 'disk': 10},
+                               loaded=True)
+        nodes = flavors.Flavor(None, {'id': 3, 'name': 'Nodes',
+                                      'vcpus': 8, 'ram': 8192, 'disk': 80},
+                               loaded=True)
+        mock_find_flavor.side_effect = [small, other, small, nodes]
+        stdout, _stderr = self.run_command(
+            'capacity --group-by host --flavor m1.small --flavor 2 '
+            '--flavor 1 --flavor Nodes')
+        # Host, Nodes, Free VCPUs, Free RAM MB, Free Disk GB, the flavors
+        self.assertIn('| Fits m1.small (1) | Fits m1.small (2) | Fits Nodes |',
+                      stdout)
+        self.assertIn('| compute1 | 1     | 6          | 12288       '
+                      '| 200          | 3                 | 6                 '
+                      '| 0          |', stdout)
+
     def test_quota_show(self):
         self.run_command(
             'quota-show --tenant '
@@ -3083,6 +3361,14 @@ class ShellTest(utils.TestCase):
         self.assertIn('Verb', stdout)
         self.assertIn('Name', stdout)
 
+    def test_limits_json(self):
+        stdout, _err = self.run_command('--format json limits')
+        limits = json.loads(stdout)
+        self.assertEqual(['absolute', 'rate'], sorted(limits))
+        self.assertIn('Personality',
+                      [limit['Name'] for limit in limits['absolute']])
+        self.assertIn('Verb', limits['rate'][0])
+
     def test_print_absolute_limits(self):
         # Note: This test is to validate that no exception is
         #       thrown if in case we pass multiple custom fields
@@ -3325,6 +3611,11 @@ class ShellTest(utils.TestCase):
         self.run_command('cell-capacities')
         self.assert_called('GET', '/os-cells/capacities')
 
+    def test_cell_capacities_json(self):
+        stdout, _err = self.run_command('--format json cell-capacities')
+        capacities = json.loads(stdout)
+        self.assertEqual(['disk_free', 'ram_free'], sorted(capacities))
+
     def test_migration_list(self):
         self.run_command('migration-list')
         self.assert_called('GET', '/os-migrations')
@@ -3533,6 +3824,21 @@ class ShellTest(utils.TestCase):
         self.run_command('keypair-show test')
         self.assert_called('GET', '/os-keypairs/test')
 
+    def test_keypair_show_json(self):
+        stdout, _err = self.run_command('--format json keypair-show test')
+        keypair = json.loads(stdout)
+        self.assertIn('public_key', keypair)
+        self.assertNotIn('Public key:', stdout)
+
+    def test_keypair_show_table(self):
+        stdout, _err = self.run_command('keypair-show test')
+        self.assertIn('Public key:', stdout)
+
+    def test_version_list_json(self):
+        stdout, _err = self.run_command('--format json version-list')
+        self.assertEqual(['v2.0', 'v2.1'],
+                         sorted(v['Id'] for v in json.loads(stdout)))
+
     def test_keypair_delete(self):
         self.run_command('keypair-delete test')
         self.assert_called('DELETE', '/os-keypairs/test')
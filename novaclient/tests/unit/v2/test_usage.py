@@ -13,6 +13,7 @@
 
 import datetime
 
+import mock
 import six
 
 from novaclient import api_versions
@@ -75,6 +76,50 @@ class UsageTest(utils.TestCase):
             (start, stop))
 
 
+class UsageCollectTest(utils.TestCase):
+    def setUp(self):
+        super(UsageCollectTest, self).setUp()
+        self.cs = fakes.FakeClient(api_versions.APIVersion("2.0"))
+
+    def test_usage_collect(self):
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 3, 12)
+        info = {'tenant_id': 'tenant1',
+                'total_hours': 24.0,
+                'total_memory_mb_usage': 512.0,
+                'total_vcpus_usage': 1.0,
+                'total_local_gb_usage': 0.0,
+                'server_usages': [{'instance_id': 'server1'}]}
+        with mock.patch.object(
+                self.cs.usage, 'list',
+                return_value=[usage.Usage(self.cs.usage, info)]) as mock_list:
+            usages = self.cs.usage.collect(start, end, concurrency=2)
+
+        self.assertEqual(
+            [mock.call(datetime.datetime(2012, 1, 1),
+                       datetime.datetime(2012, 1, 2), detailed=True),
+             mock.call(datetime.datetime(2012, 1, 2),
+                       datetime.datetime(2012, 1, 3), detailed=True),
+             mock.call(datetime.datetime(2012, 1, 3), end, detailed=True)],
+            sorted(mock_list.call_args_list, key=lambda c: c[0][0]))
+        self.assertEqual(1, len(usages))
+        u = usages[0]
+        self.assertIsInstance(u, usage.Usage)
+        self.assertEqual('tenant1', u.tenant_id)
+        self.assertEqual(72.0, u.total_hours)
+        self.assertEqual(1536.0, u.total_memory_mb_usage)
+        self.assertEqual(3.0, u.total_vcpus_usage)
+        # the server is counted once across the windows
+        self.assertEqual(1, u.server_count)
+        self.assertEqual(start.isoformat(), u.start)
+        self.assertEqual(end.isoformat(), u.stop)
+
+    def test_usage_collect_invalid_window(self):
+        now = datetime.datetime.now()
+        self.assertRaises(ValueError, self.cs.usage.collect, now, now,
+                          window=datetime.timedelta(0))
+
+
 class UsageV40Test(UsageTest):
     def setUp(self):
         super(UsageV40Test, self).setUp()
@@ -109,6 +154,21 @@ class UsageV40Test(UsageTest):
         for u in usages:
             self.assertIsInstance(u, usage.Usage)
 
+    def test_usage_collect_with_paging(self):
+        start = datetime.datetime(2012, 1, 1)
+        end = datetime.datetime(2012, 1, 2)
+        usages = self.cs.usage.collect(start, end)
+
+        self.cs.assert_called(
+            'GET',
+            '/os-simple-tenant-usage?start=2012-01-01T00:00:00&'
+            'end=2012-01-02T00:00:00&'
+            'marker=f079e394-2222-457b-b350-bb5ecc685cdd&detailed=1')
+        self.assertEqual(1, len(usages))
+        self.assertEqual(2, usages[0].server_count)
+        self.assertAlmostEqual(2 * 49.71047423333333,
+                               usages[0].total_hours)
+
     def test_usage_get_with_paging(self):
         now = datetime.datetime.now()
         u = self.cs.usage.get(
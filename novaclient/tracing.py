@@ -0,0 +1,377 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Tracing of the manager operations and of the requests of the clients.
+
+Callbacks registered with :func:`add_hook` are called before and after each
+public method of the managers, e.g. ``servers.list``, and each HTTP request
+of a :class:`novaclient.client.SessionClient`, with the :class:`Span` of
+the operation or the request. Nothing is traced while no hook is
+registered.
+"""
+
+import binascii
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+import six
+
+from novaclient.i18n import _
+from novaclient import metrics
+
+HOOK_TYPES = ('before_operation', 'after_operation',
+              'before_request', 'after_request')
+
+REQUEST_ID_HEADERS = ('x-openstack-request-id', 'x-compute-request-id')
+
+_clock = getattr(time, 'monotonic', time.time)
+
+_hooks = {}
+_hooks_lock = threading.Lock()
+
+# Spans being traced by each thread, innermost last.
+_local = threading.local()
+
+
+def add_hook(hook_type, hook_func):
+    """Registers a callback called with the spans of a type.
+
+    :param hook_type: One of ``HOOK_TYPES``
+    :param hook_func: Callable taking a :class:`Span`
+    """
+    if hook_type not in HOOK_TYPES:
+        raise ValueError(_("Unknown tracing hook type %s.") % hook_type)
+    # NOTE: the lists are replaced rather than mutated, so the spans being
+    # traced can iterate the hooks without the lock.
+    with _hooks_lock:
+        _hooks[hook_type] = _hooks.get(hook_type, []) + [hook_func]
+
+
+def remove_hook(hook_type, hook_func):
+    """Unregisters a callback registered with :func:`add_hook`."""
+    with _hooks_lock:
+        hooks = [hook for hook in _hooks.get(hook_type, [])
+                 if hook != hook_func]
+        if hooks:
+            _hooks[hook_type] = hooks
+        else:
+            _hooks.pop(hook_type, None)
+
+
+def _run_hooks(hook_type, span):
+    for hook in _hooks.get(hook_type, ()):
+        hook(span)
+
+
+def _new_id(nbytes):
+    return binascii.hexlify(os.urandom(nbytes)).decode('ascii')
+
+
+class Span(object):
+    """Manager operation or request being traced.
+
+    :ivar kind: ``operation`` or ``request``
+    :ivar name: Name of the operation, e.g. ``servers.list``, or method and
+        URL template of the request, e.g. ``GET /servers/{id}``
+    :ivar url: URL of a request
+    :ivar microversion: Compute API microversion of the client
+    :ivar parent: Span the span was started in, None for a root span
+    :ivar trace_id: Identifier of the trace of the root span, 32 hex digits
+    :ivar span_id: Identifier of the span, 16 hex digits
+    :ivar start_time: Time the span started at, in seconds since the epoch
+    :ivar latency: Seconds the span lasted, None until it has ended
+    :ivar request_ids: IDs of the requests, returned by the API
+    :ivar pages: Number of requests made by an operation, e.g. the pages of
+        a listing
+    :ivar status_code: Status code of the response of a request
+    :ivar error: Name of the exception the span ended with, if any
+    """
+
+    def __init__(self, kind, name, microversion=None, parent=None,
+                 url=None):
+        self.kind = kind
+        self.name = name
+        self.url = url
+        self.microversion = microversion
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else _new_id(16)
+        self.span_id = _new_id(8)
+        self.start_time = time.time()
+        self._start = _clock()
+        self.latency = None
+        self.request_ids = []
+        self.pages = 0
+        self.status_code = None
+        self.error = None
+
+    def end(self):
+        self.latency = _clock() - self._start
+        if self.parent is not None:
+            self.parent.pages += (self.pages if self.kind == 'operation'
+                                  else 1)
+            self.parent.request_ids.extend(self.request_ids)
+
+    def set_response(self, resp):
+        self.status_code = resp.status_code
+        for header in REQUEST_ID_HEADERS:
+            request_id = resp.headers.get(header)
+            if request_id:
+                self.request_ids.append(request_id)
+                break
+
+    def to_otlp(self):
+        """Returns the span in the OTLP JSON format of OpenTelemetry."""
+        attributes = [('novaclient.kind', self.kind)]
+        if self.microversion:
+            attributes.append(('novaclient.microversion', self.microversion))
+        if self.request_ids:
+            attributes.append(('novaclient.request_ids',
+                               ','.join(self.request_ids)))
+        if self.kind == 'operation':
+            attributes.append(('novaclient.pages', self.pages))
+        if self.url is not None:
+            attributes.append(('http.url', self.url))
+        if self.status_code is not None:
+            attributes.append(('http.status_code', self.status_code))
+        if self.error:
+            attributes.append(('error.type', self.error))
+
+        start = int(self.start_time * 1e9)
+        span = {'traceId': self.trace_id,
+                'spanId': self.span_id,
+                'name': self.name,
+                # SPAN_KIND_INTERNAL or SPAN_KIND_CLIENT
+                'kind': 1 if self.kind == 'operation' else 3,
+                'startTimeUnixNano': str(start),
+                'endTimeUnixNano': str(start + int((self.latency or 0) * 1e9)),
+                'attributes': [_otlp_attribute(key, value)
+                               for key, value in attributes],
+                # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+                'status': {'code': 2 if self.error else 0}}
+        if self.parent is not None:
+            span['parentSpanId'] = self.parent.span_id
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, six.integer_types):
+        # 64 bits integers are strings in OTLP JSON
+        return {'key': key, 'value': {'intValue': str(value)}}
+    return {'key': key, 'value': {'stringValue': value}}
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextlib.contextmanager
+def _span(kind, name, microversion, url=None):
+    stack = _stack()
+    span = Span(kind, name, microversion, stack[-1] if stack else None, url)
+    _run_hooks('before_' + kind, span)
+    stack.append(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = e.__class__.__name__
+        raise
+    finally:
+        stack.pop()
+        span.end()
+        _run_hooks('after_' + kind, span)
+
+
+@contextlib.contextmanager
+def _no_span():
+    yield None
+
+
+def request_span(method, url, api_version):
+    """Returns a context manager tracing a request.
+
+    It yields the :class:`Span` of the request, to set its response, or
+    None if no hook is registered.
+
+    :param method: HTTP method of the request
+    :param url: URL of the request
+    :param api_version: `novaclient.api_versions.APIVersion` of the client
+    """
+    if not _hooks:
+        return _no_span()
+    return _span('request',
+                 '%s %s' % (method.upper(), metrics.url_template(url)),
+                 _microversion(api_version), url)
+
+
+def _microversion(api_version):
+    if api_version is None or api_version.is_null():
+        return None
+    return api_version.get_string()
+
+
+def in_current_span(func):
+    """Returns a callable running ``func`` in the span of the current thread.
+
+    The spans are tracked per thread, so the requests made by ``func`` in
+    another thread, e.g. the prefetch of the next page of a listing, are
+    parented to the operation which started the thread.
+
+    :param func: Callable to run in another thread
+    """
+    stack = _stack()
+    if not stack:
+        return func
+    parent = stack[-1]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        thread_stack = _stack()
+        thread_stack.append(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            thread_stack.pop()
+    return wrapper
+
+
+# Code of the functions returned by contextlib.contextmanager, shared by all
+# of them; functools.wraps sets no __wrapped__ to detect them on Python 2.
+_CONTEXT_MANAGER_CODE = contextlib.contextmanager(lambda: (yield)).__code__
+
+
+def _operation_name(manager, name):
+    return '%s.%s' % (manager.__class__.__module__.rpartition('.')[2], name)
+
+
+def _operation_microversion(manager):
+    return _microversion(getattr(manager.api, 'api_version', None))
+
+
+def _traced_generator(name, func):
+    # The operation lasts until the generator is exhausted or closed, but
+    # its span is only the current one while the generator runs, so the
+    # code of the caller between two items is not parented to it.
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        gen = func(self, *args, **kwargs)
+        if not _hooks:
+            for item in gen:
+                yield item
+            return
+        stack = _stack()
+        span = Span('operation', _operation_name(self, name),
+                    _operation_microversion(self),
+                    stack[-1] if stack else None)
+        _run_hooks('before_operation', span)
+        try:
+            while True:
+                stack.append(span)
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    stack.pop()
+                yield item
+        except Exception as e:
+            span.error = e.__class__.__name__
+            raise
+        finally:
+            gen.close()
+            span.end()
+            _run_hooks('after_operation', span)
+    return wrapper
+
+
+def traced(name, func):
+    """Returns a manager method traced as an operation.
+
+    The operation of a generator method lasts until the generator is
+    exhausted. Context manager methods, which only set up the block they
+    are used for, are returned untraced.
+
+    :param name: Name of the method, the operation is named after the
+        module of the manager and the method, e.g. ``servers.list``
+    :param func: Method of a :class:`novaclient.base.Manager`
+    """
+    if getattr(func, '__code__', None) is _CONTEXT_MANAGER_CODE:
+        return func
+    if inspect.isgeneratorfunction(func):
+        wrapper = _traced_generator(name, func)
+    else:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not _hooks:
+                return func(self, *args, **kwargs)
+            with _span('operation', _operation_name(self, name),
+                       _operation_microversion(self)):
+                return func(self, *args, **kwargs)
+    # NOTE: functools.wraps only sets it on Python 3, the signature of the
+    # method is inspected, e.g. by ManagerWithFind.findall.
+    wrapper.__wrapped__ = func
+    wrapper.traced = True
+    return wrapper
+
+
+class FileSpanExporter(object):
+    """Writes the spans to a file, one JSON line per span.
+
+    Each line is an OTLP JSON ``ExportTraceServiceRequest``, which can be
+    read by the OpenTelemetry collector with its ``otlpjsonfile`` receiver.
+
+    :param path: Path of the file, the spans are appended to it
+    :param service_name: ``service.name`` resource attribute of the spans
+    """
+
+    def __init__(self, path, service_name='python-novaclient'):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span):
+        """Writes a span, suitable as an ``after_*`` hook."""
+        line = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [
+                _otlp_attribute('service.name', self.service_name)]},
+            'scopeSpans': [{'scope': {'name': 'novaclient'},
+                            'spans': [span.to_otlp()]}]}]})
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def install(self):
+        """Registers the exporter for the operations and the requests."""
+        add_hook('after_operation', self.export)
+        add_hook('after_request', self.export)
+        return self
+
+    def shutdown(self):
+        """Unregisters the exporter and closes its file."""
+        remove_hook('after_operation', self.export)
+        remove_hook('after_request', self.export)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
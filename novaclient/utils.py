@@ -12,36 +12,36 @@
 #    under the License.
 
 import contextlib
+import csv
+import functools
 import json
-import os
 import re
+import sys
 import textwrap
+import threading
 import time
+import unicodedata
 import uuid
 
 from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
 import prettytable
 import six
+from six.moves import queue
 from six.moves.urllib import parse
 
+from novaclient import cache
+from novaclient import environment
 from novaclient import exceptions
 from novaclient.i18n import _
+from novaclient import profiling
+from novaclient import tracing
 
 
 VALID_KEY_REGEX = re.compile(r"[\w\.\- :]+$", re.UNICODE)
 
 
-def env(*args, **kwargs):
-    """Returns the first environment variable set.
-
-    If all are empty, defaults to '' or keyword arg `default`.
-    """
-    for arg in args:
-        value = os.environ.get(arg)
-        if value:
-            return value
-    return kwargs.get('default', '')
+env = environment.env
 
 
 def get_service_type(f):
@@ -127,42 +127,225 @@ def pretty_choice_dict(d):
     return pretty_choice_list(['%s=%s' % (k, d[k]) for k in sorted(d.keys())])
 
 
-def print_list(objs, fields, formatters={}, sortby_index=None):
-    if sortby_index is None:
-        sortby = None
-    else:
-        sortby = fields[sortby_index]
+# Formats of the output of print_list and print_dict. 'jsonl', 'csv' and
+# 'value' rows are printed as soon as they are produced, without sorting.
+OUTPUT_FORMATS = ('table', 'json', 'jsonl', 'csv', 'value')
+STREAMING_OUTPUT_FORMATS = ('jsonl', 'csv', 'value')
+
+
+def _check_output_format(output_format):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(_("Unknown output format: %s") % output_format)
+
+
+def _get_table_text(field_name, o):
+    data = getattr(o, field_name, '')
+    if data is None:
+        data = '-'
+    # '\r' would break the table, so remove it.
+    return six.text_type(data).replace("\r", "")
+
+
+def _get_accessors(fields, formatters, table=False):
+    """Returns the functions getting the value of each field of an object.
+
+    :param table: Whether the values of the attributes are shown in a table,
+        they are converted to text then.
+    """
     mixed_case_fields = ['serverId']
-    pt = prettytable.PrettyTable([f for f in fields], caching=False)
-    pt.align = 'l'
+    accessors = []
+    for field in fields:
+        if field in formatters:
+            accessors.append(formatters[field])
+            continue
+        if field in mixed_case_fields:
+            field_name = field.replace(' ', '_')
+        else:
+            field_name = field.lower().replace(' ', '_')
+        if table:
+            accessors.append(functools.partial(_get_table_text, field_name))
+        else:
+            accessors.append(functools.partial(
+                lambda name, o: getattr(o, name, ''), field_name))
+    return accessors
 
-    for o in objs:
-        row = []
-        for field in fields:
-            if field in formatters:
-                row.append(formatters[field](o))
-            else:
-                if field in mixed_case_fields:
-                    field_name = field.replace(' ', '_')
-                else:
-                    field_name = field.lower().replace(' ', '_')
-                data = getattr(o, field_name, '')
-                if data is None:
-                    data = '-'
-                # '\r' would break the table, so remove it.
-                data = six.text_type(data).replace("\r", "")
-                row.append(data)
-        pt.add_row(row)
-
-    if sortby is not None:
-        result = encodeutils.safe_encode(pt.get_string(sortby=sortby))
-    else:
-        result = encodeutils.safe_encode(pt.get_string())
+
+def _get_row(o, accessors):
+    return [accessor(o) for accessor in accessors]
+
+
+# Cells of plain ASCII text, which are as wide as their length.
+_PLAIN_TEXT_RE = re.compile(r'^[\x20-\x7e]*$')
+
+# Terminal color escape sequences, which take no room.
+_ANSI_ESCAPE_RE = re.compile(r'\033\[[0-9;]*m|\033\(B')
+
+# Number of lines of the tables written at once.
+_OUTPUT_CHUNK_LINES = 1024
+
+
+def _char_width(char):
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 2
+    # a tab is a control character, but prettytable counts it as one column
+    if char == '\t':
+        return 1
+    # combining and control characters take no room
+    if unicodedata.combining(char) or unicodedata.category(char) in (
+            'Cc', 'Cf', 'Me', 'Mn'):
+        return 0
+    return 1
+
+
+def _text_width(text):
+    """Returns the number of terminal columns a line of text takes."""
+    if _PLAIN_TEXT_RE.match(text):
+        return len(text)
+    return sum(_char_width(char) for char in _ANSI_ESCAPE_RE.sub('', text))
+
+
+def _to_text(value):
+    if isinstance(value, six.binary_type):
+        return encodeutils.safe_decode(value)
+    return six.text_type(value)
+
+
+def render_table(fields, rows, sortby_index=None):
+    """Renders rows like a left aligned prettytable.PrettyTable.
+
+    The widths of the columns are measured in a single pass over the cells,
+    which are only converted to text once.
+
+    :param fields: list of the names of the columns
+    :param rows: iterable of lists of values
+    :param sortby_index: index of the column to sort the rows by
+    :returns: list of the lines of the table
+    """
+    if sortby_index is not None:
+        # NOTE: The other columns break the ties like in prettytable.
+        rows = sorted(rows, key=lambda row: [row[sortby_index]] + list(row))
+
+    widths = [_text_width(field) for field in fields]
+    cells = []
+    for row in rows:
+        cell_row = []
+        for index, value in enumerate(row):
+            lines = []
+            for line in _to_text(value).split('\n'):
+                width = _text_width(line)
+                if width > widths[index]:
+                    widths[index] = width
+                lines.append((line, width))
+            cell_row.append(lines)
+        cells.append(cell_row)
+
+    hrule = '+%s+' % '+'.join('-' * (width + 2) for width in widths)
+
+    def render_line(texts):
+        return '| %s |' % ' | '.join(
+            text + ' ' * (width - text_width)
+            for (text, text_width), width in zip(texts, widths))
+
+    lines = [hrule,
+             render_line([(field, _text_width(field)) for field in fields]),
+             hrule]
+    blank = ('', 0)
+    for cell_row in cells:
+        height = max(len(cell) for cell in cell_row) if cell_row else 1
+        if height == 1:
+            lines.append(render_line([cell[0] for cell in cell_row]))
+            continue
+        for y in range(height):
+            lines.append(render_line([cell[y] if y < len(cell) else blank
+                                      for cell in cell_row]))
+    lines.append(hrule)
+    return lines
+
+
+def _write_lines(lines):
+    for start in range(0, len(lines), _OUTPUT_CHUNK_LINES):
+        chunk = encodeutils.safe_encode(
+            '\n'.join(lines[start:start + _OUTPUT_CHUNK_LINES]) + '\n')
+
+        if six.PY3:
+            chunk = chunk.decode()
+
+        sys.stdout.write(chunk)
+
+
+def _format_value(value):
+    """Returns the text of a value for the csv and value formats."""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return jsonutils.dumps(value, ensure_ascii=False)
+    return six.text_type(value)
+
+
+def _print_line(line):
+    line = encodeutils.safe_encode(line)
 
     if six.PY3:
-        result = result.decode()
+        line = line.decode()
 
-    print(result)
+    print(line)
+    sys.stdout.flush()
+
+
+def _print_rows(header, rows, output_format, sortby_index=None):
+    """Prints rows in a machine readable output format.
+
+    :param header: list of the names of the columns
+    :param rows: iterable of lists of values
+    :param output_format: One of ``OUTPUT_FORMATS`` but ``table``
+    :param sortby_index: index of the column to sort the rows by, ignored by
+        the streaming formats
+    """
+    if output_format == 'json':
+        rows = list(rows)
+        if sortby_index is not None:
+            try:
+                rows.sort(key=lambda row: row[sortby_index])
+            except TypeError:
+                rows.sort(key=lambda row: _format_value(row[sortby_index]))
+        _print_line(jsonutils.dumps([dict(zip(header, row)) for row in rows],
+                                    indent=2, sort_keys=True,
+                                    ensure_ascii=False))
+    elif output_format == 'jsonl':
+        for row in rows:
+            _print_line(jsonutils.dumps(dict(zip(header, row)),
+                                        sort_keys=True, ensure_ascii=False))
+    elif output_format == 'csv':
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+
+        def write(values):
+            values = [_format_value(value) for value in values]
+            if six.PY2:
+                values = [encodeutils.safe_encode(value) for value in values]
+            writer.writerow(values)
+            sys.stdout.flush()
+
+        write(header)
+        for row in rows:
+            write(row)
+    else:
+        for row in rows:
+            _print_line(' '.join(_format_value(value) for value in row))
+
+
+@profiling.phased('render')
+def print_list(objs, fields, formatters={}, sortby_index=None,
+               output_format='table'):
+    _check_output_format(output_format)
+    if output_format != 'table':
+        accessors = _get_accessors(fields, formatters)
+        _print_rows(fields, (_get_row(o, accessors) for o in objs),
+                    output_format, sortby_index)
+        return
+
+    accessors = _get_accessors(fields, formatters, table=True)
+    _write_lines(render_table(fields, [_get_row(o, accessors) for o in objs],
+                              sortby_index))
 
 
 def _flatten(data, prefix=None):
@@ -206,7 +389,26 @@ def flatten_dict(data):
     return dict(_flatten(data))
 
 
-def print_dict(d, dict_property="Property", dict_value="Value", wrap=0):
+@profiling.phased('render')
+def print_dict(d, dict_property="Property", dict_value="Value", wrap=0,
+               output_format='table'):
+    _check_output_format(output_format)
+    if output_format == 'json':
+        _print_line(jsonutils.dumps(d, indent=2, sort_keys=True,
+                                    ensure_ascii=False))
+        return
+    if output_format == 'jsonl':
+        _print_line(jsonutils.dumps(d, sort_keys=True, ensure_ascii=False))
+        return
+    if output_format == 'csv':
+        _print_rows([dict_property, dict_value], sorted(d.items()),
+                    output_format)
+        return
+    if output_format == 'value':
+        _print_rows([dict_value], [[v] for _k, v in sorted(d.items())],
+                    output_format)
+        return
+
     pt = prettytable.PrettyTable([dict_property, dict_value], caching=False)
     pt.align = 'l'
     for k, v in sorted(d.items()):
@@ -239,17 +441,7 @@ def print_dict(d, dict_property="Property", dict_value="Value", wrap=0):
     print(result)
 
 
-def find_resource(manager, name_or_id, wrap_exception=True, **find_args):
-    """Helper for the _find_* methods."""
-    # for str id which is not uuid (for Flavor, Keypair and hypervsior in cells
-    # environments search currently)
-    if getattr(manager, 'is_alphanum_id_allowed', False):
-        try:
-            return manager.get(name_or_id)
-        except exceptions.NotFound:
-            pass
-
-    # first try to get entity as uuid
+def _as_uuid(name_or_id):
     try:
         tmp_id = encodeutils.safe_encode(name_or_id)
 
@@ -257,45 +449,125 @@ def find_resource(manager, name_or_id, wrap_exception=True, **find_args):
             tmp_id = tmp_id.decode()
 
         uuid.UUID(tmp_id)
-        return manager.get(tmp_id)
-    except (TypeError, ValueError, exceptions.NotFound):
-        pass
-
+        return tmp_id
+    except (TypeError, ValueError):
+        return None
+
+
+def _find_resource(manager, name_or_id, wrap_exception=True,
+                   concurrent=False, **find_args):
+    # Each lookup is a (callable, ignored exceptions) tuple, tried in order
+    # until one returns a resource.
+    resource = getattr(manager, 'resource_class', None)
+    name_attr = resource.NAME_ATTR if resource else 'name'
+    name_kwargs = {name_attr: name_or_id}
+    name_kwargs.update(find_args)
+    missing = (TypeError, ValueError, exceptions.NotFound)
+
+    lookups = []
+    # for str id which is not uuid (for Flavor, Keypair and hypervsior in cells
+    # environments search currently)
+    if getattr(manager, 'is_alphanum_id_allowed', False):
+        lookups.append((lambda: manager.get(name_or_id),
+                        (exceptions.NotFound,)))
+    # first try to get entity as uuid
+    uuid_id = _as_uuid(name_or_id)
+    if uuid_id is not None:
+        lookups.append((lambda: manager.get(uuid_id), missing))
     # then try to get entity as name
-    try:
-        try:
-            resource = getattr(manager, 'resource_class', None)
-            name_attr = resource.NAME_ATTR if resource else 'name'
-            kwargs = {name_attr: name_or_id}
-            kwargs.update(find_args)
-            return manager.find(**kwargs)
-        except exceptions.NotFound:
-            pass
-
-        # then try to find entity by human_id
-        try:
-            return manager.find(human_id=name_or_id, **find_args)
-        except exceptions.NotFound:
-            pass
-    except exceptions.NoUniqueMatch:
-        msg = (_("Multiple %(class)s matches found for '%(name)s', use an ID "
-                 "to be more specific.") %
-               {'class': manager.resource_class.__name__.lower(),
-                'name': name_or_id})
-        if wrap_exception:
-            raise exceptions.CommandError(msg)
-        raise exceptions.NoUniqueMatch(msg)
-
+    lookups.append((lambda: manager.find(**name_kwargs),
+                    (exceptions.NotFound,)))
+    # then try to find entity by human_id
+    human_id_lookup = (
+        lambda: manager.find(human_id=name_or_id, **find_args),
+        (exceptions.NotFound,))
+    lookups.append(human_id_lookup)
     # finally try to get entity as integer id
+    lookups.append((lambda: manager.get(int(name_or_id)), missing))
+
+    # NOTE: When the input isn't an UUID, it is ambiguous and the lookups but
+    # the human_id one, which lists the collection again and is rarely
+    # needed, are made at once. Their outcomes are still checked in the order
+    # above.
+    outcomes = {}
+    prefetched = [lookup for lookup in lookups
+                  if lookup is not human_id_lookup]
+    if concurrent and uuid_id is None and len(prefetched) > 1:
+        for lookup, result, error in run_concurrently(
+                lambda lookup: lookup[0](), prefetched, len(prefetched)):
+            outcomes[id(lookup)] = (result, error)
+
+    for lookup in lookups:
+        func, ignored = lookup
+        if id(lookup) in outcomes:
+            result, error = outcomes[id(lookup)]
+        else:
+            try:
+                result, error = func(), None
+            except Exception as e:
+                result, error = None, e
+        if error is None:
+            return result
+        if isinstance(error, exceptions.NoUniqueMatch):
+            msg = (_("Multiple %(class)s matches found for '%(name)s', use "
+                     "an ID to be more specific.") %
+                   {'class': manager.resource_class.__name__.lower(),
+                    'name': name_or_id})
+            if wrap_exception:
+                raise exceptions.CommandError(msg)
+            raise exceptions.NoUniqueMatch(msg)
+        if not isinstance(error, ignored):
+            raise error
+
+    msg = (_("No %(class)s with a name or ID of '%(name)s' exists.") %
+           {'class': manager.resource_class.__name__.lower(),
+            'name': name_or_id})
+    if wrap_exception:
+        raise exceptions.CommandError(msg)
+    raise exceptions.NotFound(404, msg)
+
+
+def _get_named(manager, resource_id, name_or_id):
+    """Returns the resource of an id if it is still named ``name_or_id``."""
     try:
-        return manager.get(int(name_or_id))
-    except (TypeError, ValueError, exceptions.NotFound):
-        msg = (_("No %(class)s with a name or ID of '%(name)s' exists.") %
-               {'class': manager.resource_class.__name__.lower(),
-                'name': name_or_id})
-        if wrap_exception:
-            raise exceptions.CommandError(msg)
-        raise exceptions.NotFound(404, msg)
+        found = manager.get(resource_id)
+    except exceptions.NotFound:
+        return None
+    resource = getattr(manager, 'resource_class', None)
+    name_attr = resource.NAME_ATTR if resource else 'name'
+    if name_or_id in (getattr(found, name_attr, None),
+                      getattr(found, 'human_id', None)):
+        return found
+    return None
+
+
+def find_resource(manager, name_or_id, wrap_exception=True, **find_args):
+    """Helper for the _find_* methods.
+
+    If the client of the manager has a `novaclient.cache.NameIndex` as
+    ``name_index``, names already resolved are got directly by id.
+    """
+    name_index = getattr(getattr(manager, 'api', None), 'name_index', None)
+    if not isinstance(name_index, cache.NameIndex):
+        return _find_resource(manager, name_or_id, wrap_exception,
+                              **find_args)
+
+    key = name_index.make_key(manager, name_or_id, find_args)
+    resource_id = name_index.get(key)
+    if resource_id is not None:
+        found = _get_named(manager, resource_id, name_or_id)
+        if found is not None:
+            return found
+        # renamed or deleted since it was recorded
+        name_index.delete(key)
+
+    found = _find_resource(manager, name_or_id, wrap_exception,
+                           concurrent=name_index.concurrent, **find_args)
+    found_id = getattr(found, 'id', None)
+    if (found_id is not None and
+            six.text_type(found_id) != six.text_type(name_or_id)):
+        name_index.set(key, found_id)
+    return found
 
 
 def format_servers_list_networks(server):
@@ -362,17 +634,106 @@ def safe_issubclass(*args):
     return False
 
 
-def do_action_on_many(action, resources, success_msg, error_msg):
-    """Helper to run an action on many resources."""
-    failure_flag = False
+def run_concurrently(func, items, concurrency=1):
+    """Call ``func`` for every item with at most ``concurrency`` in flight.
+
+    This is a generator which yields ``(item, result, error)`` tuples in the
+    order of ``items``, each one as soon as it and all the preceding items
+    are done. ``error`` is the exception raised by ``func`` (``result`` is
+    None in that case) or None on success.
+
+    :param func: callable taking a single item
+    :param items: iterable of items to process
+    :param concurrency: maximum number of concurrent calls of ``func``
+    """
+    items = list(items)
+    concurrency = min(max(concurrency or 1, 1), len(items))
+
+    if concurrency <= 1:
+        for item in items:
+            try:
+                yield item, func(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    pending = queue.Queue()
+    for index_and_item in enumerate(items):
+        pending.put(index_and_item)
+    done = {}
+    done_cond = threading.Condition()
+
+    def worker():
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                outcome = (item, func(item), None)
+            except Exception as e:
+                outcome = (item, None, e)
+            with done_cond:
+                done[index] = outcome
+                done_cond.notify()
+
+    for _i in range(concurrency):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    for index in range(len(items)):
+        with done_cond:
+            while index not in done:
+                done_cond.wait()
+            outcome = done.pop(index)
+        yield outcome
+
+
+def call_in_background(func, *args, **kwargs):
+    """Start ``func(*args, **kwargs)`` in a background thread.
+
+    :returns: a callable which waits for the call to finish and returns its
+        result, or re-raises the exception it raised.
+    """
+    outcome = {}
+    func = tracing.in_current_span(func)
 
-    for resource in resources:
+    def run():
         try:
-            action(resource)
-            print(success_msg % resource)
+            outcome['result'] = func(*args, **kwargs)
         except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    def wait():
+        thread.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    return wait
+
+
+def do_action_on_many(action, resources, success_msg, error_msg,
+                      concurrency=1):
+    """Helper to run an action on many resources.
+
+    :param concurrency: how many actions may run at the same time. Messages
+        are printed in the order of ``resources`` regardless of this value.
+    """
+    failure_flag = False
+
+    for resource, _result, error in run_concurrently(action, resources,
+                                                     concurrency):
+        if error is None:
+            print(success_msg % resource)
+        else:
             failure_flag = True
-            print(encodeutils.safe_encode(six.text_type(e)))
+            print(encodeutils.safe_encode(six.text_type(error)))
 
     if failure_flag:
         raise exceptions.CommandError(error_msg)
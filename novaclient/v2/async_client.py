@@ -0,0 +1,170 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Asyncio interface to the OpenStack Compute API.
+"""
+
+import functools
+import inspect
+
+from keystoneauth1 import session as ksession
+from oslo_utils import importutils
+
+from novaclient import base
+from novaclient import exceptions
+from novaclient.i18n import _
+
+asyncio = importutils.try_import("asyncio")
+futures = importutils.try_import("concurrent.futures")
+
+DEFAULT_MAX_WORKERS = 64
+
+# Manager helpers and context managers which never do any I/O, so they are
+# exposed unchanged.
+_SYNC_METHODS = frozenset(['add_hook',
+                           'alternate_service_type',
+                           'completion_cache',
+                           'convert_into_with_meta',
+                           'run_hooks',
+                           'write_to_completion_cache'])
+
+
+def _is_generator(method):
+    # Generators, e.g. ``servers.iter``, and context managers, e.g.
+    # ``servers.coalesce_gets``, do their work when they are iterated or
+    # entered, not when they are called, so they can't be run in the workers.
+    return inspect.isgeneratorfunction(inspect.unwrap(method))
+
+
+class AsyncManager(object):
+    """Awaitable view of a :class:`novaclient.base.Manager`.
+
+    Every public method of the wrapped manager is exposed with the same
+    signature, but returns an awaitable instead of the result, except the
+    generators and the context managers, which are exposed unchanged. The
+    calls are dispatched to the original manager, so microversion
+    substitutions and the returned :class:`novaclient.base.Resource` objects
+    are exactly the same as with the synchronous client.
+    """
+
+    def __init__(self, async_client, manager):
+        self._async_client = async_client
+        self._manager = manager
+
+    def __getattr__(self, name):
+        attr = getattr(self._manager, name)
+        if (name.startswith('_') or name in _SYNC_METHODS or
+                inspect.isclass(attr) or not callable(attr) or
+                _is_generator(attr)):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._async_client.run(attr, *args, **kwargs)
+
+        return call
+
+    def __repr__(self):
+        return "<AsyncManager %r>" % self._manager
+
+
+class AsyncClient(object):
+    """Top-level object to access the OpenStack Compute API from asyncio.
+
+    Wraps a synchronous client created via `novaclient.client.Client` and
+    exposes the same managers with awaitable methods::
+
+        >>> from novaclient import client
+        >>> from novaclient.v2 import async_client
+        >>> nova = async_client.AsyncClient(client.Client(VERSION, ...))
+        >>> servers, flavors = await asyncio.gather(nova.servers.list(),
+        ...                                         nova.flavors.list())
+
+    Requests are run by a bounded pool of workers which share the keystone
+    session of the wrapped client, so concurrent calls reuse one pooled set
+    of connections instead of blocking the event loop. The connection pool
+    of a session created by novaclient is sized for the workers; the callers
+    giving their own session should size its pool themselves, e.g. by
+    mounting a ``keystoneauth1.session.TCPKeepAliveAdapter`` with a
+    ``pool_maxsize`` of ``max_workers``.
+
+    .. note:: Only manager methods are awaitable. Methods of the returned
+      resources (e.g. ``server.delete()``) are synchronous; use the manager
+      counterpart (``await nova.servers.delete(server)``) instead.
+    """
+
+    def __init__(self, client, max_workers=DEFAULT_MAX_WORKERS,
+                 executor=None, loop=None):
+        """Initialization of AsyncClient object.
+
+        :param client: `novaclient.v2.client.Client` instance to wrap
+        :param int max_workers: Maximum number of requests run concurrently
+            and size of the HTTP connection pool of a session created by
+            novaclient
+        :param executor: `concurrent.futures.Executor` to run requests in
+            (optional). If it is not set, a thread pool of ``max_workers``
+            workers is created and owned by this object.
+        :param loop: asyncio event loop to use (optional). Defaults to the
+            loop which is running at the time of a call.
+        """
+        if asyncio is None or futures is None:
+            raise exceptions.UnsupportedVersion(
+                _("The asyncio interface of novaclient requires Python 3."))
+
+        self.client = client
+        self.max_workers = max_workers
+        self._loop = loop
+        self._own_executor = executor is None
+        self._executor = executor or futures.ThreadPoolExecutor(max_workers)
+        self._resize_connection_pool(max_workers)
+
+        for name, manager in list(vars(client).items()):
+            if isinstance(manager, base.Manager):
+                setattr(self, name, AsyncManager(self, manager))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _resize_connection_pool(self, size):
+        # requests keeps at most 10 connections per host by default, which
+        # would serialize the workers on the pool. The sessions of the
+        # callers may be shared with other clients, they are left alone.
+        if not getattr(self.client.client, 'own_session', False):
+            return
+        session = getattr(self.client.client.session, 'session', None)
+        if session is None or not hasattr(session, 'mount'):
+            return
+        for prefix in ('https://', 'http://'):
+            session.mount(prefix, ksession.TCPKeepAliveAdapter(
+                pool_connections=size, pool_maxsize=size))
+
+    def run(self, func, *args, **kwargs):
+        """Run a blocking ``func`` in the workers of this client.
+
+        :returns: an awaitable with the result of ``func(*args, **kwargs)``
+        """
+        loop = self._loop or asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor,
+                                    functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        """Release the workers owned by this client."""
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        self.close()
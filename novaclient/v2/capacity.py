@@ -0,0 +1,162 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Free capacity of the compute nodes, by node, availability zone or aggregate.
+"""
+
+import collections
+import math
+
+from novaclient.i18n import _
+
+GROUP_BY = ('zone', 'aggregate', 'host')
+
+# Availability zone of the hosts which are in no aggregate with one.
+DEFAULT_ZONE = 'nova'
+
+
+def flavor_resources(flavor):
+    """Returns the VCPUs, RAM MB and disk GB requested by a flavor."""
+    ephemeral = flavor._info.get('OS-FLV-EXT-DATA:ephemeral') or 0
+    # swap is '' for flavors without swap
+    swap = flavor._info.get('swap') or 0
+    disk = (flavor.disk or 0) + ephemeral + int(math.ceil(swap / 1024.0))
+    return flavor.vcpus, flavor.ram, disk
+
+
+class Capacity(object):
+    """Free capacity of the compute nodes of a cloud.
+
+    The resources of the nodes are kept by column, so the capacity of the
+    whole cloud is computed by a pass over each column instead of per node
+    objects. Only the nodes which are up and enabled are counted.
+
+    :param hypervisors: detailed :class:`Hypervisor` of the nodes
+    :param aggregates: :class:`Aggregate` of the hosts of the nodes
+    :param cpu_allocation_ratio: Virtual CPUs per physical CPU
+    :param ram_allocation_ratio: Virtual RAM per physical RAM
+    :param disk_allocation_ratio: Virtual disk per physical disk
+    :param default_zone: Availability zone of the hosts which are in no
+        aggregate with one
+    """
+
+    def __init__(self, hypervisors, aggregates=(), cpu_allocation_ratio=1.0,
+                 ram_allocation_ratio=1.0, disk_allocation_ratio=1.0,
+                 default_zone=DEFAULT_ZONE):
+        host_zones = {}
+        host_aggregates = collections.defaultdict(list)
+        for aggregate in aggregates:
+            info = aggregate._info
+            zone = (info.get('availability_zone') or
+                    (info.get('metadata') or {}).get('availability_zone'))
+            for host in info.get('hosts') or ():
+                host_aggregates[host].append(info['name'])
+                if zone:
+                    host_zones.setdefault(host, zone)
+
+        infos = [hypervisor._info for hypervisor in hypervisors
+                 if hypervisor._info.get('state', 'up') == 'up' and
+                 hypervisor._info.get('status', 'enabled') == 'enabled']
+        self.nodes = [info.get('hypervisor_hostname') for info in infos]
+        self.hosts = [(info.get('service') or {}).get('host')
+                      for info in infos]
+        self.zones = [host_zones.get(host, default_zone)
+                      for host in self.hosts]
+        self.aggregates = [host_aggregates.get(host, [])
+                           for host in self.hosts]
+        self.free_vcpus = self._free(infos, 'vcpus', cpu_allocation_ratio)
+        self.free_ram_mb = self._free(infos, 'memory_mb',
+                                      ram_allocation_ratio)
+        self.free_disk_gb = self._free(infos, 'local_gb',
+                                       disk_allocation_ratio)
+
+    @staticmethod
+    def _free(infos, resource, ratio):
+        used = resource + '_used'
+        return [max(int((info.get(resource) or 0) * ratio -
+                        (info.get(used) or 0)), 0)
+                for info in infos]
+
+    @classmethod
+    def for_client(cls, client, **kwargs):
+        """Returns the capacity of the nodes of a cloud.
+
+        The hypervisors and the aggregates are each listed once.
+        """
+        return cls(client.hypervisors.list_all(detailed=True),
+                   client.aggregates.list(), **kwargs)
+
+    def fits(self, flavor):
+        """Returns the number of servers of a flavor fitting on each node.
+
+        :param flavor: :class:`Flavor`
+        """
+        vcpus, ram, disk = flavor_resources(flavor)
+        if disk:
+            return [min(free_vcpus // vcpus, free_ram // ram,
+                        free_disk // disk)
+                    for free_vcpus, free_ram, free_disk in zip(
+                        self.free_vcpus, self.free_ram_mb,
+                        self.free_disk_gb)]
+        # servers booted from volumes don't use the disk of the nodes
+        return [min(free_vcpus // vcpus, free_ram // ram)
+                for free_vcpus, free_ram in zip(self.free_vcpus,
+                                                self.free_ram_mb)]
+
+    def _groups(self, group_by):
+        if group_by == 'zone':
+            return [[zone] for zone in self.zones]
+        if group_by == 'aggregate':
+            # a host is counted in each of its aggregates
+            return [aggregates or [None] for aggregates in self.aggregates]
+        if group_by == 'host':
+            return [[host] for host in self.hosts]
+        raise ValueError(_("Capacity can't be grouped by %s.") % group_by)
+
+    def summary(self, flavors=(), group_by='zone'):
+        """Returns the free capacity of groups of nodes.
+
+        :param flavors: :class:`Flavor` to count the servers fitting in the
+            groups of
+        :param group_by: One of ``GROUP_BY``
+        :returns: list of dicts with the ``group``, the number of ``nodes``,
+            their ``free_vcpus``, ``free_ram_mb`` and ``free_disk_gb`` and
+            the number of servers of each flavor fitting on them, by flavor
+            ID in ``fits``, sorted by group. A flavor given more than once
+            is counted once.
+        """
+        fits = collections.OrderedDict()
+        for flavor in flavors:
+            if flavor.id not in fits:
+                fits[flavor.id] = self.fits(flavor)
+        fits = list(fits.items())
+        groups = collections.OrderedDict()
+        for index, names in enumerate(self._groups(group_by)):
+            for name in names:
+                group = groups.get(name)
+                if group is None:
+                    group = groups[name] = {
+                        'group': name, 'nodes': 0, 'free_vcpus': 0,
+                        'free_ram_mb': 0, 'free_disk_gb': 0,
+                        'fits': collections.OrderedDict(
+                            (flavor, 0) for flavor, _counts in fits)}
+                group['nodes'] += 1
+                group['free_vcpus'] += self.free_vcpus[index]
+                group['free_ram_mb'] += self.free_ram_mb[index]
+                group['free_disk_gb'] += self.free_disk_gb[index]
+                for flavor, counts in fits:
+                    group['fits'][flavor] += counts[index]
+        return sorted(groups.values(),
+                      key=lambda group: (group['group'] is None,
+                                         group['group']))
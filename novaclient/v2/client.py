@@ -61,6 +61,8 @@ class Client(object):
                  auth_url=None,
                  cacert=None,
                  cert=None,
+                 compact_resources=False,
+                 completion_index=None,
                  direct_use=True,
                  endpoint_override=None,
                  endpoint_type='publicURL',
@@ -68,6 +70,7 @@ class Client(object):
                  http_log_debug=False,
                  insecure=False,
                  logger=None,
+                 name_index=None,
                  os_cache=False,
                  password=None,
                  project_domain_id=None,
@@ -94,6 +97,12 @@ class Client(object):
         :param str auth_url: Auth URL
         :param str cacert: ca-certificate
         :param str cert: certificate
+        :param bool compact_resources: Build the resources returned by list
+            calls in a memory efficient way, see
+            `novaclient.base.get_compact_class`
+        :param completion_index: `novaclient.cache.CompletionIndex` to record
+            the ids and names of the listed and created resources in for
+            shell completion (optional)
         :param bool direct_use: Inner variable of novaclient. Do not use it
             outside novaclient. It's restricted.
         :param str endpoint_override: Bypass URL
@@ -103,6 +112,9 @@ class Client(object):
         :param bool insecure: Allow insecure
         :param logging.Logger logger: Logger instance to be used for all
             logging stuff
+        :param name_index: `novaclient.cache.NameIndex` of the ids of the
+            resources found by name with `novaclient.utils.find_resource`
+            (optional)
         :param str password: User password
         :param bool os_cache: OS cache
         :param str project_domain_id: ID of project domain
@@ -157,6 +169,9 @@ class Client(object):
         self.hypervisor_stats = hypervisors.HypervisorStatsManager(self)
         self.services = services.ServiceManager(self)
         self.os_cache = os_cache
+        self.compact_resources = compact_resources
+        self.completion_index = completion_index
+        self.name_index = name_index
         self.availability_zones = \
             availability_zones.AvailabilityZoneManager(self)
         self.server_groups = server_groups.ServerGroupsManager(self)
@@ -269,6 +284,10 @@ class Client(object):
     def reset_timings(self):
         self.client.reset_timings()
 
+    def get_metrics(self):
+        """Returns the `novaclient.metrics.Metrics` of the requests."""
+        return self.client.metrics
+
     def authenticate(self):
         """Authenticate against the server.
 
@@ -17,10 +17,13 @@
 Hypervisors interface
 """
 
+import collections
+
 from six.moves.urllib import parse
 
 from novaclient import api_versions
 from novaclient import base
+from novaclient import exceptions
 from novaclient import utils
 
 
@@ -31,11 +34,60 @@ class Hypervisor(base.Resource):
         return "<Hypervisor: %s>" % self.id
 
 
+class HypervisorServerIndex(object):
+    """Index of the servers of hypervisors, built from one listing.
+
+    :param hypervisors: :class:`Hypervisor` listed with their servers
+    """
+
+    def __init__(self, hypervisors):
+        self.hypervisors = list(hypervisors)
+        # hypervisor hostname -> list of {'uuid': ..., 'name': ...}
+        self.servers_by_hypervisor = {}
+        # server UUID -> Hypervisor
+        self.hypervisor_by_server = {}
+        for hyper in self.hypervisors:
+            # _info is used, the servers attribute is missing for empty
+            # hypervisors and the resources would be lazy loaded.
+            servers = hyper._info.get('servers') or []
+            self.servers_by_hypervisor.setdefault(
+                hyper.hypervisor_hostname, []).extend(servers)
+            for server in servers:
+                self.hypervisor_by_server[server['uuid']] = hyper
+
+    def servers(self, hypervisor_hostname):
+        """Returns the servers of a hypervisor, as dicts with their uuid and
+        name.
+        """
+        return list(self.servers_by_hypervisor.get(hypervisor_hostname, []))
+
+    def hypervisor(self, server):
+        """Returns the :class:`Hypervisor` of a server, or None.
+
+        :param server: The :class:`Server` (or its ID)
+        """
+        return self.hypervisor_by_server.get(base.getid(server))
+
+    def search(self, hypervisor_match, strict=False):
+        """Returns the hypervisors matching a hostname, like
+        :meth:`HypervisorManager.search`.
+
+        :param hypervisor_match: The hypervisor host name or a portion of it.
+        :param strict: Only return the hypervisor with this host name.
+        """
+        if strict:
+            return [hyper for hyper in self.hypervisors
+                    if hyper.hypervisor_hostname == hypervisor_match]
+        return [hyper for hyper in self.hypervisors
+                if hypervisor_match in hyper.hypervisor_hostname]
+
+
 class HypervisorManager(base.ManagerWithFind):
     resource_class = Hypervisor
     is_alphanum_id_allowed = True
 
-    def _list_base(self, detailed=True, marker=None, limit=None):
+    def _list_base(self, detailed=True, marker=None, limit=None,
+                   with_servers=False):
         path = '/os-hypervisors'
         if detailed:
             path += '/detail'
@@ -44,6 +96,8 @@ class HypervisorManager(base.ManagerWithFind):
             params['limit'] = int(limit)
         if marker is not None:
             params['marker'] = str(marker)
+        if with_servers:
+            params['with_servers'] = True
         path += utils.prepare_query_string(params)
         return self._list(path, 'hypervisors')
 
@@ -71,6 +125,62 @@ class HypervisorManager(base.ManagerWithFind):
         """
         return self._list_base(detailed=detailed, marker=marker, limit=limit)
 
+    def list_all(self, detailed=True, with_servers=False):
+        """
+        Get all the hypervisors, following the pages of the listing.
+
+        Starting with microversion 2.33 the listings are paginated, the
+        pages are then fetched until an empty one is returned.
+
+        :param detailed: Include a detailed response.
+        :param with_servers: Include the servers of the hypervisors, only
+                             supported starting with microversion 2.53.
+        """
+        if (with_servers and
+                self.api_version < api_versions.APIVersion('2.53')):
+            raise exceptions.UnsupportedAttribute('with_servers', '2.53')
+        hypervisors = self._list_base(detailed=detailed,
+                                      with_servers=with_servers)
+        if self.api_version < api_versions.APIVersion('2.33'):
+            return hypervisors
+        page = hypervisors
+        while page:
+            page = self._list_base(detailed=detailed, marker=page[-1].id,
+                                   with_servers=with_servers)
+            hypervisors.extend(page)
+            hypervisors.append_request_ids(page.request_ids)
+        return hypervisors
+
+    def server_index(self, concurrency=8):
+        """
+        Get an index of the servers of all the hypervisors.
+
+        Starting with microversion 2.53 the index is built from a single
+        listing of the hypervisors with their servers. Before, the servers
+        of each hypervisor are searched for concurrently.
+
+        :param concurrency: Maximum number of concurrent searches before
+                            microversion 2.53.
+        :rtype: :class:`HypervisorServerIndex`
+        """
+        if self.api_version >= api_versions.APIVersion('2.53'):
+            return HypervisorServerIndex(
+                self.list_all(detailed=False, with_servers=True))
+
+        hypervisors = collections.OrderedDict()
+        hostnames = [hyper.hypervisor_hostname
+                     for hyper in self.list(detailed=False)]
+        for _hostname, found, error in utils.run_concurrently(
+                lambda hostname: self.search(hostname, servers=True),
+                hostnames, concurrency):
+            if error is not None:
+                raise error
+            # the hostnames are matched as patterns, the hypervisors whose
+            # hostnames contain another one are found twice
+            for hyper in found:
+                hypervisors.setdefault(hyper.id, hyper)
+        return HypervisorServerIndex(hypervisors.values())
+
     def search(self, hypervisor_match, servers=False):
         """
         Get a list of matching hypervisors.
@@ -0,0 +1,290 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local inventory of servers kept up to date with ``changes-since`` listings.
+"""
+
+import datetime
+import hashlib
+import os
+import re
+import threading
+import time
+
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+import six
+
+from novaclient import api_versions
+from novaclient import base
+from novaclient import cache
+from novaclient import exceptions
+from novaclient.i18n import _
+from novaclient.v2 import servers
+
+# Search options of the listings an inventory tracks. Servers can't leave or
+# join their results by changing, unlike for status or host filters, which
+# are applied to the snapshot instead.
+TRACKED_OPTS = ('all_tenants', 'tenant_id', 'user_id')
+
+# Seconds after which the snapshot is rebuilt from a full listing, in case
+# deleted servers were purged from the database before a poll saw them.
+DEFAULT_FULL_SYNC_INTERVAL = 3600
+
+_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def _addresses(info):
+    for addresses in (info.get('addresses') or {}).values():
+        for address in addresses:
+            yield address.get('addr') or ''
+
+
+def _match_flavor(info, value):
+    flavor = info.get('flavor') or {}
+    if 'original_name' in flavor:
+        # starting with microversion 2.47, the flavor of the servers is
+        # embedded without its ID, the option value is then its name
+        return flavor['original_name'] == value
+    return six.text_type(flavor.get('id')) == six.text_type(value)
+
+
+# Search options of the server listings applied to the snapshot, as
+# functions of the server info and the option value.
+_FILTERS = {
+    'flavor': _match_flavor,
+    'host': lambda info, value: info.get('OS-EXT-SRV-ATTR:host') == value,
+    'image': lambda info, value: (
+        (info.get('image') or {}).get('id') == value),
+    'instance_name': lambda info, value: (
+        info.get('OS-EXT-SRV-ATTR:instance_name') == value),
+    'ip': lambda info, value: any(re.search(value, address)
+                                  for address in _addresses(info)),
+    'ip6': lambda info, value: any(re.search(value, address)
+                                   for address in _addresses(info)
+                                   if ':' in address),
+    'name': lambda info, value: bool(re.search(value,
+                                               info.get('name') or '')),
+    'reservation_id': lambda info, value: (
+        info.get('OS-EXT-SRV-ATTR:reservation_id') == value),
+    'status': lambda info, value: (
+        (info.get('status') or '').lower() == value.lower()),
+    'tenant_id': lambda info, value: info.get('tenant_id') == value,
+    'user_id': lambda info, value: info.get('user_id') == value,
+}
+
+
+class ServerInventory(object):
+    """Snapshot of the servers of a listing, updated by deltas.
+
+    The first refresh lists all the servers, the next ones only list the
+    servers changed since the previous one with the ``changes-since``
+    filter, deleted ones included, and apply them to the snapshot. Queries
+    are then answered from the snapshot.
+
+    :param manager: :class:`novaclient.v2.servers.ServerManager` used for
+        the listings and the servers returned
+    :param search_opts: Search options of the tracked listing, only the
+        ``TRACKED_OPTS`` are allowed, e.g. ``{'all_tenants': True}``
+    :param path: JSON file to keep the snapshot in between processes, it is
+        only kept in memory if None
+    :param max_age: Seconds a snapshot is used for by the queries before
+        being refreshed
+    :param full_sync_interval: Seconds after which the snapshot is rebuilt
+        by a full listing
+    """
+
+    def __init__(self, manager, search_opts=None, path=None, max_age=0,
+                 full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL):
+        search_opts = dict((k, v) for k, v in (search_opts or {}).items()
+                           if v)
+        unsupported = set(search_opts) - set(TRACKED_OPTS)
+        if unsupported:
+            raise ValueError(_("Inventories can't be filtered by %s.") %
+                             ', '.join(sorted(unsupported)))
+        self.manager = manager
+        self.search_opts = search_opts
+        self.path = os.path.expanduser(path) if path else None
+        self.max_age = max_age
+        self.full_sync_interval = full_sync_interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client, search_opts=None, **kwargs):
+        """Returns the inventory of a client kept on disk.
+
+        The snapshots are stored per endpoint, project and search options
+        under env[NOVACLIENT_INVENTORY_DIR] or ``~/.novaclient/inventory``.
+        """
+        search_opts = dict((k, v) for k, v in (search_opts or {}).items()
+                           if v)
+        key = "%s %s %s" % (client.client.get_endpoint(),
+                            client.project_id or client.project_name or "",
+                            sorted(search_opts.items()))
+        directory = (os.environ.get('NOVACLIENT_INVENTORY_DIR') or
+                     '~/.novaclient/inventory')
+        path = os.path.join(directory, hashlib.sha1(
+            key.encode('utf-8')).hexdigest() + '.json')
+        return cls(client.servers, search_opts, path=path, **kwargs)
+
+    def _api_version(self):
+        return self.manager.api_version.get_string()
+
+    def _load(self):
+        if self._snapshot is not None or self.path is None:
+            return self._snapshot
+        try:
+            with open(self.path) as f:
+                snapshot = jsonutils.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        # a snapshot of another microversion has other attributes
+        if (snapshot.get('api_version') != self._api_version() or
+                snapshot.get('search_opts') != self.search_opts):
+            return None
+        return snapshot
+
+    def _save(self, snapshot):
+        self._snapshot = snapshot
+        if self.path is None:
+            return
+        try:
+            cache._write_atomically(self.path,
+                                    jsonutils.dump_as_bytes(snapshot))
+        except (IOError, OSError):
+            pass
+
+    def refresh(self, full=False):
+        """Updates the snapshot.
+
+        :param full: Rebuild the snapshot from a full listing
+        """
+        with self._lock:
+            snapshot = None if full else self._load()
+            now = time.time()
+            started = timeutils.utcnow()
+            if (snapshot is None or
+                    snapshot['synced_at'] + self.full_sync_interval < now):
+                listing = self.manager.list(search_opts=self.search_opts)
+                snapshot = {'api_version': self._api_version(),
+                            'search_opts': self.search_opts,
+                            'synced_at': now,
+                            'servers': {}}
+                for server in listing:
+                    snapshot['servers'][six.text_type(server.id)] = (
+                        server._info)
+            else:
+                since = (datetime.datetime.strptime(snapshot['since'],
+                                                    _TIME_FORMAT) -
+                         datetime.timedelta(
+                             seconds=servers.CHANGES_SINCE_MARGIN))
+                search_opts = dict(self.search_opts)
+                search_opts['changes-since'] = since.strftime(_TIME_FORMAT)
+                for server in self.manager.list(search_opts=search_opts):
+                    server_id = six.text_type(server.id)
+                    if (getattr(server, 'status', '') or '').upper() == (
+                            'DELETED'):
+                        snapshot['servers'].pop(server_id, None)
+                    else:
+                        snapshot['servers'][server_id] = server._info
+            snapshot['since'] = started.strftime(_TIME_FORMAT)
+            snapshot['refreshed_at'] = now
+            self._save(snapshot)
+            return snapshot
+
+    def _get_snapshot(self):
+        snapshot = self._load()
+        if (snapshot is None or
+                snapshot['refreshed_at'] + self.max_age <= time.time()):
+            snapshot = self.refresh()
+        return snapshot
+
+    def _server(self, info):
+        return servers.Server(self.manager, info, loaded=True)
+
+    def get(self, server_id):
+        """Returns a :class:`Server` of the snapshot."""
+        info = self._get_snapshot()['servers'].get(six.text_type(server_id))
+        if info is None:
+            raise exceptions.NotFound(404, _("Server %s not found.") %
+                                      server_id)
+        return self._server(info)
+
+    def _flavor_filter(self, flavor_id):
+        if self.manager.api_version < api_versions.APIVersion('2.47'):
+            return flavor_id
+        # the servers only have the name of their flavor, like the server
+        # side filter the option is the ID of the flavor
+        try:
+            return self.manager.api.flavors.get(flavor_id).name
+        except exceptions.NotFound:
+            return None
+
+    def list(self, search_opts=None, sort_keys=None, sort_dirs=None):
+        """Returns the :class:`Server` of the snapshot matching a search.
+
+        :param search_opts: Search options like the ones of the server
+            listings, see ``_FILTERS`` for the supported ones. The tracked
+            options given must be the ones of the inventory.
+        :param sort_keys: List of sort keys of the API
+        :param sort_dirs: List of sort directions
+        """
+        filters = []
+        for opt, value in (search_opts or {}).items():
+            if not value:
+                continue
+            if opt == 'all_tenants':
+                if not self.search_opts.get('all_tenants'):
+                    raise ValueError(_("The inventory does not track the "
+                                       "servers of all the projects."))
+            elif opt == 'flavor':
+                filters.append((_FILTERS[opt], self._flavor_filter(value)))
+            elif opt in _FILTERS:
+                filters.append((_FILTERS[opt], value))
+            else:
+                raise ValueError(_("Inventories can't be searched by %s.") %
+                                 opt)
+
+        result = base.ListWithMeta(
+            [self._server(info)
+             for info in self._get_snapshot()['servers'].values()
+             if all(match(info, value) for match, value in filters)], None)
+        self.manager._sort(result, sort_keys, sort_dirs)
+        return result
+
+    def findall(self, **kwargs):
+        """Returns the :class:`Server` of the snapshot with the attributes
+        of ``**kwargs``.
+        """
+        found = base.ListWithMeta([], None)
+        for server in self.list():
+            try:
+                if all(getattr(server, attr) == value
+                       for attr, value in kwargs.items()):
+                    found.append(server)
+            except AttributeError:
+                continue
+        return found
+
+    def find(self, **kwargs):
+        """Returns the single :class:`Server` with the attributes of
+        ``**kwargs``.
+        """
+        matches = self.findall(**kwargs)
+        if not matches:
+            raise exceptions.NotFound(404, "No Server matching %s." % kwargs)
+        if len(matches) > 1:
+            raise exceptions.NoUniqueMatch
+        return matches[0]
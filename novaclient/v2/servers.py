@@ -20,8 +20,16 @@ Server interface.
 """
 
 import base64
+import contextlib
+import datetime
+import functools
+import threading
+import time
 
+from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
 import six
 from six.moves.urllib import parse
 
@@ -30,6 +38,7 @@ from novaclient import base
 from novaclient import crypto
 from novaclient import exceptions
 from novaclient.i18n import _
+from novaclient import utils
 
 
 REBOOT_SOFT, REBOOT_HARD = 'SOFT', 'HARD'
@@ -42,6 +51,43 @@ CONSOLE_TYPE_ACTION_MAPPING = {
     'serial': 'os-getSerialConsole'
 }
 
+# Clock skew tolerated between the client and the API when polling for
+# changed servers with the 'changes-since' filter, in seconds.
+CHANGES_SINCE_MARGIN = 60
+
+# Number of servers fetched by each uuid filtered listing of get_many.
+GET_MANY_BATCH_SIZE = 50
+
+# Seconds the gets made in ServerManager.coalesce_gets are waited for to be
+# batched together.
+COALESCE_WINDOW = 0.01
+
+# Search options which sharded listings find the values of by themselves.
+SHARD_KEYS = ('host', 'availability_zone')
+
+# Statuses of the servers which may have no host or availability zone yet.
+# They are listed separately by the listings sharded by these keys.
+_UNPLACED_STATUSES = ('BUILD', 'ERROR', 'SHELVED_OFFLOADED')
+
+# Attributes of the servers for the sort keys of the API which differ.
+_SORT_KEY_ATTRS = {
+    'access_ip_v4': 'accessIPv4',
+    'access_ip_v6': 'accessIPv6',
+    'availability_zone': 'OS-EXT-AZ:availability_zone',
+    'created_at': 'created',
+    'display_name': 'name',
+    'host': 'OS-EXT-SRV-ATTR:host',
+    'hostname': 'OS-EXT-SRV-ATTR:hostname',
+    'launched_at': 'OS-SRV-USG:launched_at',
+    'power_state': 'OS-EXT-STS:power_state',
+    'project_id': 'tenant_id',
+    'task_state': 'OS-EXT-STS:task_state',
+    'terminated_at': 'OS-SRV-USG:terminated_at',
+    'updated_at': 'updated',
+    'uuid': 'id',
+    'vm_state': 'OS-EXT-STS:vm_state',
+}
+
 CONSOLE_TYPE_PROTOCOL_MAPPING = {
     'novnc': 'vnc',
     'xvpvnc': 'vnc',
@@ -618,9 +664,101 @@ class SecurityGroup(base.Resource):
         return str(self.id)
 
 
+class _GetBatch(object):
+    def __init__(self):
+        self.ids = []
+        self.results = {}
+        self.done = threading.Event()
+
+
+class _GetCoalescer(object):
+    """Serves the gets of servers made by concurrent threads together.
+
+    The first get of a batch waits up to ``window`` seconds, or until
+    ``max_batch`` gets are pending, then fetches all of them with
+    `ServerManager._get_many` while the other callers wait for it.
+    """
+
+    def __init__(self, manager, window, max_batch):
+        self.manager = manager
+        self.window = window
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._batch = None
+
+    def get(self, server_id):
+        with self._cond:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _GetBatch()
+            batch.ids.append(server_id)
+            if len(batch.ids) >= self.max_batch:
+                self._batch = None
+                self._cond.notify_all()
+            elif leader:
+                deadline = time.time() + self.window
+                while self._batch is batch:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._batch = None
+                        break
+                    self._cond.wait(remaining)
+
+        if leader:
+            try:
+                batch.results = self.manager._get_many(batch.ids)
+            except Exception as e:
+                batch.results = dict((i, (None, e)) for i in batch.ids)
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        server, error = batch.results[server_id]
+        if error is not None:
+            raise error
+        return server
+
+    @contextlib.contextmanager
+    def active(self):
+        """Serve the gets made by the current thread in the block."""
+        local = self.manager._coalescing
+        previous = getattr(local, 'coalescer', None)
+        local.coalescer = self
+        try:
+            yield
+        finally:
+            local.coalescer = previous
+
+    def bind(self, func):
+        """Wrap ``func`` so the gets it makes, in any thread, are served."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.active():
+                return func(*args, **kwargs)
+        return wrapper
+
+
 class ServerManager(base.BootingManagerWithFind):
     resource_class = Server
 
+    # Set once a listing returned servers the uuid filter should have left
+    # out, so get_many stops listing and only gets the servers one by one.
+    _uuid_filter_ignored = False
+
+    def __init__(self, api):
+        super(ServerManager, self).__init__(api)
+        # Coalescer serving the gets of each thread, see coalesce_gets.
+        self._coalescing = threading.local()
+
+    list_filters = {
+        'status': ('status', 'status'),
+        'host': ('host', 'OS-EXT-SRV-ATTR:host'),
+        'tenant_id': ('tenant_id', 'tenant_id'),
+        'user_id': ('user_id', 'user_id'),
+    }
+
     @staticmethod
     def transform_userdata(userdata):
         if hasattr(userdata, 'read'):
@@ -778,10 +916,100 @@ class ServerManager(base.BootingManagerWithFind):
         :param server: ID of the :class:`Server` to get.
         :rtype: :class:`Server`
         """
+        coalescer = getattr(self._coalescing, 'coalescer', None)
+        if coalescer is not None:
+            return coalescer.get(six.text_type(base.getid(server)))
         return self._get("/servers/%s" % base.getid(server), "server")
 
+    def get_many(self, servers, all_tenants=False):
+        """
+        Get many servers with a few listings filtered by their UUIDs.
+
+        The servers which are not returned by the listings, e.g. because
+        the server ignores the filter or their ID is not an UUID, are got
+        one by one.
+
+        :param servers: List of :class:`Server` objects (or their IDs).
+        :param all_tenants: Whether the servers may belong to other
+                            projects (admin only).
+        :raises: :class:`novaclient.exceptions.NotFound` if a server does
+                 not exist.
+        :rtype: list of :class:`Server` in the order of ``servers``
+        """
+        ids = [six.text_type(base.getid(server)) for server in servers]
+        results = self._get_many(ids, all_tenants)
+        found = []
+        for server_id in ids:
+            server, error = results[server_id]
+            if error is not None:
+                raise error
+            found.append(server)
+        return found
+
+    def _get_many(self, ids, all_tenants=False):
+        """Returns a dict of ``(server, error)`` tuples by server ID."""
+        results = {}
+        uuids = sorted(set(i for i in ids if uuidutils.is_uuid_like(i)))
+        if self._uuid_filter_ignored:
+            uuids = []
+        for start in range(0, len(uuids), GET_MANY_BATCH_SIZE):
+            batch = uuids[start:start + GET_MANY_BATCH_SIZE]
+            search_opts = {'uuid': batch}
+            if all_tenants:
+                search_opts['all_tenants'] = True
+            # NOTE: The limit bounds the listing to a single page when the
+            # uuid filter is ignored, e.g. by older APIs.
+            found = 0
+            for server in self.iter(search_opts=search_opts,
+                                    limit=len(batch), prefetch=False):
+                server_id = six.text_type(server.id)
+                if server_id not in batch:
+                    self._uuid_filter_ignored = True
+                    break
+                results[server_id] = (server, None)
+                found += 1
+            if not found or self._uuid_filter_ignored:
+                # The other batches would not be more useful, get the
+                # remaining servers one by one instead.
+                break
+
+        missing = [i for i in ids if i not in results]
+        for server_id, server, error in utils.run_concurrently(
+                lambda i: self._get("/servers/%s" % i, "server"),
+                sorted(set(missing)), self.detail_concurrency):
+            results[server_id] = (server, error)
+        return results
+
+    @contextlib.contextmanager
+    def coalesce_gets(self, max_batch=GET_MANY_BATCH_SIZE,
+                      window=COALESCE_WINDOW):
+        """
+        Batch the :meth:`get` calls made concurrently in the block.
+
+        The gets made within ``window`` seconds by the current thread, and
+        by the functions wrapped with the ``bind`` method of the yielded
+        coalescer, are served together by :meth:`get_many`, e.g.::
+
+            with cs.servers.coalesce_gets(max_batch=10) as coalescer:
+                utils.run_concurrently(coalescer.bind(cs.servers.get),
+                                       ids, 10)
+
+        The gets of the other threads are not batched. Blocks may be nested
+        or overlap in different threads, each one only serves its own gets.
+
+        :param max_batch: Maximum number of gets served together. A batch
+                          is served without waiting for the end of the
+                          window once it is full, so it should be the
+                          number of threads making gets.
+        :param window: Seconds the first get of a batch waits for others.
+        """
+        coalescer = _GetCoalescer(self, window, max_batch)
+        with coalescer.active():
+            yield coalescer
+
     def list(self, detailed=True, search_opts=None, marker=None, limit=None,
-             sort_keys=None, sort_dirs=None):
+             sort_keys=None, sort_dirs=None, shard_by=None, shards=None,
+             shard_concurrency=4):
         """
         Get a list of servers.
 
@@ -796,6 +1024,15 @@ class ServerManager(base.BootingManagerWithFind):
         :param limit: Maximum number of servers to return (optional).
         :param sort_keys: List of sort keys
         :param sort_dirs: List of sort directions
+        :param shard_by: Search option to split the listing by, e.g. 'host'
+                         or 'tenant_id'. The listings of every value are
+                         made concurrently then merged, which can't be used
+                         with ``marker``.
+        :param shards: List of the values of ``shard_by`` to list the
+                       servers of. They are found by the listing for the
+                       ``SHARD_KEYS``, e.g. all the compute hosts.
+        :param shard_concurrency: Maximum number of shards listed at the
+                                  same time.
 
         :rtype: list of :class:`Server`
 
@@ -808,24 +1045,148 @@ class ServerManager(base.BootingManagerWithFind):
 
         client.servers.list(limit=10) - returns only 10 servers
 
+        client.servers.list(search_opts={'all_tenants': True},
+        shard_by='host', shard_concurrency=8) - returns the servers of all
+        projects, listed host by host with 8 concurrent listings.
+
+        """
+        if shard_by is not None and not (search_opts or {}).get(shard_by):
+            if marker:
+                raise ValueError(_("A marker can't be used to list servers "
+                                   "by shard."))
+            return self._list_sharded(detailed, search_opts, limit,
+                                      sort_keys, sort_dirs, shard_by, shards,
+                                      shard_concurrency)
+
+        result = base.ListWithMeta([], None)
+        for servers in self._list_pages(detailed, search_opts, marker, limit,
+                                        sort_keys, sort_dirs):
+            result.extend(servers)
+            result.append_request_ids(servers.request_ids)
+        return result
+
+    def _get_shards(self, shard_by):
+        if shard_by == 'host':
+            services = self.api.services.list(binary='nova-compute')
+            return sorted(set(service.host for service in services))
+        if shard_by == 'availability_zone':
+            zones = self.api.availability_zones.list(detailed=False)
+            return sorted(set(zone.zoneName for zone in zones))
+        raise ValueError(_("The shards of '%s' must be given.") % shard_by)
+
+    def _list_sharded(self, detailed, search_opts, limit, sort_keys,
+                      sort_dirs, shard_by, shards, shard_concurrency):
+        search_opts = dict(search_opts or {})
+        if shards is None:
+            shards = self._get_shards(shard_by)
+
+        shard_opts = []
+        for value in shards:
+            opts = dict(search_opts)
+            opts[shard_by] = value
+            shard_opts.append(opts)
+        if shard_by in SHARD_KEYS:
+            # NOTE: Servers which are not scheduled yet, failed to be or are
+            # offloaded have no host, and maybe no availability zone, so
+            # that they aren't in any shard.
+            status = search_opts.get('status')
+            if not status:
+                for unplaced in _UNPLACED_STATUSES:
+                    opts = dict(search_opts)
+                    opts['status'] = unplaced
+                    shard_opts.append(opts)
+            elif status.upper() in _UNPLACED_STATUSES:
+                shard_opts.append(search_opts)
+
+        result = base.ListWithMeta([], None)
+        seen = set()
+        for _opts, servers, error in utils.run_concurrently(
+                lambda opts: self.list(detailed, opts, limit=limit,
+                                       sort_keys=sort_keys,
+                                       sort_dirs=sort_dirs),
+                shard_opts, shard_concurrency):
+            if error is not None:
+                raise error
+            result.append_request_ids(servers.request_ids)
+            for server in servers:
+                if server.id not in seen:
+                    seen.add(server.id)
+                    result.append(server)
+
+        self._sort(result, sort_keys, sort_dirs)
+        if limit and limit != -1:
+            del result[limit:]
+        return result
+
+    @staticmethod
+    def _sort(servers, sort_keys=None, sort_dirs=None):
+        """Sorts servers in place like the API does."""
+        sort_keys = list(sort_keys or ['created_at', 'id'])
+        sort_dirs = list(sort_dirs or [])
+
+        def sort_value(server, attr):
+            # NOTE: _info is used to not load summary servers lazily.
+            value = server._info.get(attr)
+            if isinstance(value, (dict, list)):
+                value = jsonutils.dumps(value, sort_keys=True)
+            return (value is not None, value)
+
+        # the sort is stable, so sorting by the last key first orders by all
+        for i in reversed(range(len(sort_keys))):
+            attr = _SORT_KEY_ATTRS.get(sort_keys[i], sort_keys[i])
+            sort_dir = sort_dirs[i] if i < len(sort_dirs) else 'desc'
+            servers.sort(key=lambda server: sort_value(server, attr),
+                         reverse=(sort_dir == 'desc'))
+
+    def iter(self, detailed=True, search_opts=None, marker=None, limit=None,
+             sort_keys=None, sort_dirs=None, prefetch=True):
+        """
+        Iterate over servers, fetching them page by page.
+
+        Takes the same arguments as :meth:`list`, but servers are yielded as
+        soon as their page arrives and only one page is kept in memory at a
+        time.
+
+        :param prefetch: Request the next page in the background while the
+                         caller is still processing the current one.
+
+        :rtype: generator of :class:`Server`
+        """
+        for servers in self._list_pages(detailed, search_opts, marker, limit,
+                                        sort_keys, sort_dirs,
+                                        prefetch=prefetch):
+            for server in servers:
+                yield server
+
+    def _list_pages(self, detailed=True, search_opts=None, marker=None,
+                    limit=None, sort_keys=None, sort_dirs=None,
+                    prefetch=False):
+        """
+        Follow the pagination markers and yield each page of servers.
         """
         if search_opts is None:
             search_opts = {}
 
         qparams = {}
 
+        def encode(val):
+            if isinstance(val, six.text_type):
+                return val.encode('utf-8')
+            return val
+
         for opt, val in search_opts.items():
             if val:
-                if isinstance(val, six.text_type):
-                    val = val.encode('utf-8')
-                qparams[opt] = val
+                if isinstance(val, (list, tuple)):
+                    # the parameter is repeated for each value
+                    qparams[opt] = [encode(v) for v in val]
+                else:
+                    qparams[opt] = encode(val)
 
         detail = ""
         if detailed:
             detail = "/detail"
 
-        result = base.ListWithMeta([], None)
-        while True:
+        def get_page(marker, limit):
             if marker:
                 qparams['marker'] = marker
 
@@ -838,7 +1199,12 @@ class ServerManager(base.BootingManagerWithFind):
                 # sort keys and directions are unique since the same parameter
                 # key is repeated for each associated value
                 # (ie, &sort_key=key1&sort_key=key2&sort_key=key3)
-                items = list(qparams.items())
+                items = []
+                for key, val in qparams.items():
+                    if isinstance(val, list):
+                        items.extend((key, v) for v in val)
+                    else:
+                        items.append((key, val))
                 if sort_keys:
                     items.extend(('sort_key', sort_key)
                                  for sort_key in sort_keys)
@@ -850,18 +1216,26 @@ class ServerManager(base.BootingManagerWithFind):
             else:
                 query_string = ""
 
-            servers = self._list("/servers%s%s" % (detail, query_string),
-                                 "servers")
-            result.extend(servers)
-            result.append_request_ids(servers.request_ids)
+            return self._list("/servers%s%s" % (detail, query_string),
+                              "servers")
+
+        fetch_page = functools.partial(get_page, marker, limit)
+        while True:
+            servers = fetch_page()
 
             if limit and limit != -1:
                 limit = max(limit - len(servers), 0)
 
             if not servers or limit == 0:
+                yield servers
                 break
-            marker = result[-1].id
-        return result
+
+            marker = servers[-1].id
+            if prefetch:
+                fetch_page = utils.call_in_background(get_page, marker, limit)
+            else:
+                fetch_page = functools.partial(get_page, marker, limit)
+            yield servers
 
     def get_vnc_console(self, server, console_type):
         """
@@ -1884,6 +2258,143 @@ class ServerManager(base.BootingManagerWithFind):
         """Trigger crash dump in an instance"""
         return self._action("trigger_crash_dump", server)
 
+    def bulk_action(self, action, servers, concurrency=1, **kwargs):
+        """
+        Run the same action on many servers concurrently.
+
+        :param action: Name of a method of this manager which takes a server
+                       as its first argument, e.g. 'delete', 'stop', 'lock'.
+        :param servers: List of :class:`Server` objects (or their IDs).
+        :param concurrency: Maximum number of requests in flight.
+        :param kwargs: Additional keyword arguments for the action.
+        :returns: list of ``(server, result, error)`` tuples in the order of
+                  ``servers``, where ``error`` is the exception raised by
+                  the action for that server or None on success.
+        """
+        func = getattr(self, action, None)
+        if action.startswith('_') or not callable(func):
+            raise ValueError(_("'%s' is not a server action.") % action)
+        return list(utils.run_concurrently(
+            lambda server: func(server, **kwargs),
+            servers, concurrency))
+
+    def wait_for_status(self, servers, final_ok_states, poll_period=5,
+                        max_poll_period=60, timeout=None, search_opts=None,
+                        since=None, callback=None):
+        """
+        Wait until all given servers reach one of the final states.
+
+        Instead of one GET per server, the servers are tracked together with
+        detailed listings filtered by ``changes-since``, so every poll costs
+        one (usually single page) request whatever the number of servers.
+        The polling period doubles, up to ``max_poll_period``, while none of
+        the servers changes.
+
+        :param servers: List of :class:`Server` objects (or their IDs).
+        :param final_ok_states: List of statuses to wait for, e.g.
+                                ['active'] (case insensitive).
+        :param poll_period: Initial number of seconds between polls.
+        :param max_poll_period: Maximum number of seconds between polls.
+        :param timeout: Number of seconds to wait at most, None to wait
+                        forever.
+        :param search_opts: Extra search options for the listings, e.g.
+                            {'all_tenants': True} for servers of other
+                            projects.
+        :param since: :class:`datetime.datetime` (UTC) of when the action
+                      on the servers was requested. If given, the first
+                      poll is a listing too; otherwise the servers are
+                      fetched one by one the first time.
+        :param callback: Function called with each :class:`Server` every
+                         time a new state of it is seen.
+        :returns: list of ``(server_id, server, error)`` tuples in the order
+                  of ``servers``, where ``server`` is the last seen
+                  :class:`Server` and ``error`` is None on success or one of
+                  :class:`novaclient.exceptions.ResourceInErrorState`,
+                  :class:`novaclient.exceptions.InstanceInDeletedState` and
+                  :class:`novaclient.exceptions.ResourceWaitTimeout`.
+        """
+        final_ok_states = [state.lower() for state in final_ok_states]
+        ids = [base.getid(server) for server in servers]
+        pending = set(six.text_type(server_id) for server_id in ids)
+        last_seen = {}
+        errors = {}
+        deadline = time.time() + timeout if timeout is not None else None
+        margin = datetime.timedelta(seconds=CHANGES_SINCE_MARGIN)
+        period = poll_period
+
+        def state_of(server):
+            return (getattr(server, 'status', None),
+                    getattr(server, 'OS-EXT-STS:task_state', None),
+                    getattr(server, 'progress', None))
+
+        while pending:
+            poll_started = timeutils.utcnow()
+            if since is None:
+                found = []
+                all_tenants = bool((search_opts or {}).get('all_tenants'))
+                results = self._get_many(pending, all_tenants)
+                for server_id, (server, error) in results.items():
+                    if isinstance(error, exceptions.NotFound):
+                        errors[server_id] = exceptions.InstanceInDeletedState(
+                            _("Server %s not found.") % server_id)
+                    elif error is not None:
+                        raise error
+                    else:
+                        found.append(server)
+                pending.difference_update(errors)
+            else:
+                opts = dict(search_opts or {})
+                opts['changes-since'] = (since - margin).strftime(
+                    '%Y-%m-%dT%H:%M:%SZ')
+                found = [server for server in self.list(search_opts=opts)
+                         if six.text_type(server.id) in pending]
+            since = poll_started
+
+            changed = False
+            for server in found:
+                server_id = six.text_type(server.id)
+                previous = last_seen.get(server_id)
+                last_seen[server_id] = server
+                if previous is not None and state_of(previous) == state_of(
+                        server):
+                    continue
+                changed = True
+                if callback:
+                    callback(server)
+
+                status = (getattr(server, 'status', None) or '').lower()
+                if status in final_ok_states:
+                    pending.discard(server_id)
+                elif status == 'error':
+                    errors[server_id] = exceptions.ResourceInErrorState(
+                        server)
+                    pending.discard(server_id)
+                elif status == 'deleted':
+                    fault = getattr(server, 'fault', None) or {}
+                    errors[server_id] = exceptions.InstanceInDeletedState(
+                        fault.get('message'))
+                    pending.discard(server_id)
+
+            if not pending:
+                break
+            if deadline is not None and time.time() >= deadline:
+                for server_id in pending:
+                    errors[server_id] = exceptions.ResourceWaitTimeout(
+                        _("Server %s did not reach any of the states %s.") %
+                        (server_id, ', '.join(final_ok_states)))
+                break
+
+            period = poll_period if changed else min(period * 2,
+                                                     max_poll_period)
+            if deadline is not None:
+                period = max(min(period, deadline - time.time()), 0)
+            time.sleep(period)
+
+        return [(server_id,
+                 last_seen.get(six.text_type(server_id)),
+                 errors.get(six.text_type(server_id)))
+                for server_id in ids]
+
     def _action(self, action, server, info=None, **kwargs):
         """
         Perform a server "action" -- reboot/rebuild/resize/etc.
@@ -21,8 +21,10 @@ from __future__ import print_function
 import argparse
 import codecs
 import collections
+import contextlib
 import datetime
 import getpass
+import itertools
 import logging
 import os
 import pprint
@@ -43,6 +45,8 @@ from novaclient.i18n import _
 from novaclient import shell
 from novaclient import utils
 from novaclient.v2 import availability_zones
+from novaclient.v2 import capacity
+from novaclient.v2 import inventory
 from novaclient.v2 import quotas
 from novaclient.v2 import servers
 
@@ -881,7 +885,7 @@ def do_boot(cs, args):
     server = cs.servers.create(*boot_args, **boot_kwargs)
     if boot_kwargs['reservation_id']:
         new_server = {'reservation_id': server}
-        utils.print_dict(new_server)
+        utils.print_dict(new_server, output_format=args.output_format)
         return
     else:
         _print_server(cs, args, server)
@@ -938,6 +942,34 @@ def _poll_for_status(poll_fn, obj_id, action, final_ok_states,
         time.sleep(poll_period)
 
 
+def _poll_for_servers_status(cs, servers, action, final_ok_states,
+                             poll_period=5, since=None):
+    """Block until all servers reach one of the final states, printing
+    a line for each server as it finishes.
+    """
+    def print_progress(server):
+        status = (getattr(server, 'status', None) or '').lower()
+        if status in final_ok_states:
+            print(_("Server %(server)s %(action)s... Finished") %
+                  {'server': server.id, 'action': action})
+
+    print(_("Waiting for %(count)s server(s) %(action)s...") %
+          {'count': len(servers), 'action': action})
+    failure_flag = False
+    for server_id, _server, error in cs.servers.wait_for_status(
+            servers, final_ok_states, poll_period=poll_period, since=since,
+            callback=print_progress):
+        if error is not None:
+            failure_flag = True
+            print(_("Error %(action)s server %(server)s: %(error)s") %
+                  {'action': action, 'server': server_id,
+                   'error': getattr(error, 'message', None) or error})
+
+    if failure_flag:
+        raise exceptions.CommandError(
+            _("Wait for specified server(s) failed."))
+
+
 def _expand_dict_attr(collection, attr):
     """Expand item attribute whose value is a dict.
 
@@ -1001,7 +1033,8 @@ def _print_flavor_extra_specs(flavor):
         return "N/A"
 
 
-def _print_flavor_list(cs, flavors, show_extra_specs=False):
+def _print_flavor_list(cs, flavors, show_extra_specs=False,
+                       output_format='table'):
     _translate_flavor_keys(flavors)
 
     headers = [
@@ -1025,7 +1058,7 @@ def _print_flavor_list(cs, flavors, show_extra_specs=False):
     if cs.api_version >= api_versions.APIVersion('2.55'):
         headers.append('Description')
 
-    utils.print_list(flavors, headers, formatters)
+    utils.print_list(flavors, headers, formatters, output_format=output_format)
 
 
 @utils.arg(
@@ -1090,7 +1123,8 @@ def do_flavor_list(cs, args):
         flavors = cs.flavors.list(marker=args.marker, min_disk=args.min_disk,
                                   min_ram=args.min_ram, sort_key=args.sort_key,
                                   sort_dir=args.sort_dir, limit=args.limit)
-    _print_flavor_list(cs, flavors, args.extra_specs)
+    _print_flavor_list(cs, flavors, args.extra_specs,
+                       output_format=args.output_format)
 
 
 @utils.arg(
@@ -1101,7 +1135,7 @@ def do_flavor_delete(cs, args):
     """Delete a specific flavor"""
     flavorid = _find_flavor(cs, args.flavor)
     cs.flavors.delete(flavorid)
-    _print_flavor_list(cs, [flavorid])
+    _print_flavor_list(cs, [flavorid], output_format=args.output_format)
 
 
 @utils.arg(
@@ -1111,7 +1145,7 @@ def do_flavor_delete(cs, args):
 def do_flavor_show(cs, args):
     """Show details about the given flavor."""
     flavor = _find_flavor(cs, args.flavor)
-    _print_flavor(flavor)
+    _print_flavor(flavor, output_format=args.output_format)
 
 
 @utils.arg(
@@ -1171,7 +1205,7 @@ def do_flavor_create(cs, args):
     f = cs.flavors.create(args.name, args.ram, args.vcpus, args.disk, args.id,
                           args.ephemeral, args.swap, args.rxtx_factor,
                           args.is_public, description)
-    _print_flavor_list(cs, [f])
+    _print_flavor_list(cs, [f], output_format=args.output_format)
 
 
 @api_versions.wraps('2.55')
@@ -1188,7 +1222,7 @@ def do_flavor_update(cs, args):
     """Update the description of an existing flavor."""
     flavorid = _find_flavor(cs, args.flavor)
     flavor = cs.flavors.update(flavorid, args.description)
-    _print_flavor_list(cs, [flavor])
+    _print_flavor_list(cs, [flavor], output_format=args.output_format)
 
 
 @utils.arg(
@@ -1240,7 +1274,7 @@ def do_flavor_access_list(cs, args):
         raise exceptions.CommandError("%s" % str(e))
 
     columns = ['Flavor_ID', 'Tenant_ID']
-    utils.print_list(access_list, columns)
+    utils.print_list(access_list, columns, output_format=args.output_format)
 
 
 @utils.arg(
@@ -1255,7 +1289,7 @@ def do_flavor_access_add(cs, args):
     flavor = _find_flavor(cs, args.flavor)
     access_list = cs.flavor_access.add_tenant_access(flavor, args.tenant)
     columns = ['Flavor_ID', 'Tenant_ID']
-    utils.print_list(access_list, columns)
+    utils.print_list(access_list, columns, output_format=args.output_format)
 
 
 @utils.arg(
@@ -1270,7 +1304,7 @@ def do_flavor_access_remove(cs, args):
     flavor = _find_flavor(cs, args.flavor)
     access_list = cs.flavor_access.remove_tenant_access(flavor, args.tenant)
     columns = ['Flavor_ID', 'Tenant_ID']
-    utils.print_list(access_list, columns)
+    utils.print_list(access_list, columns, output_format=args.output_format)
 
 
 def _extract_metadata(args):
@@ -1288,7 +1322,7 @@ def _extract_metadata(args):
     return metadata
 
 
-def _print_image(image):
+def _print_image(image, output_format='table'):
     info = image.to_dict()
 
     # ignore links, we don't need to present those
@@ -1310,15 +1344,15 @@ def _print_image(image):
     except AttributeError:
         pass
 
-    utils.print_dict(info)
+    utils.print_dict(info, output_format=output_format)
 
 
-def _print_flavor(flavor):
+def _print_flavor(flavor, output_format='table'):
     info = flavor.to_dict()
     # ignore links, we don't need to present those
     info.pop('links')
     info.update({"extra_specs": _print_flavor_extra_specs(flavor)})
-    utils.print_dict(info)
+    utils.print_dict(info, output_format=output_format)
 
 
 @utils.arg(
@@ -1441,6 +1475,32 @@ def _print_flavor(flavor):
            "will be displayed. If limit is bigger than 'CONF.api.max_limit' "
            "option of Nova API, multiple requests will be sent and results "
            "will be merged."))
+@utils.arg(
+    '--inventory',
+    dest='inventory',
+    action='store_true',
+    default=False,
+    help=_("Answer from a local snapshot of the servers, which is only "
+           "updated with the servers changed since the previous call. It "
+           "can't be used with --marker, --limit, --deleted, "
+           "--changes-since, --shard-by and the tag filters."))
+@utils.arg(
+    '--shard-by',
+    dest='shard_by',
+    metavar='<key>',
+    choices=servers.SHARD_KEYS,
+    default=None,
+    help=_("List the servers of each compute host ('host') or availability "
+           "zone ('availability_zone') concurrently and merge the results, "
+           "which is faster with many servers (Admin only). It can't be "
+           "used with --marker."))
+@utils.arg(
+    '--concurrency',
+    metavar='<concurrency>',
+    type=int,
+    default=4,
+    help=_('Maximum number of shards listed at the same time with '
+           '--shard-by. (Default=4)'))
 @utils.arg(
     '--changes-since',
     dest='changes_since',
@@ -1553,32 +1613,61 @@ def do_list(cs, args):
             raise exceptions.CommandError(_('Invalid changes-since value: %s')
                                           % search_opts['changes-since'])
 
-    servers = cs.servers.list(detailed=detailed,
-                              search_opts=search_opts,
-                              sort_keys=sort_keys,
-                              sort_dirs=sort_dirs,
-                              marker=args.marker,
-                              limit=args.limit)
+    if args.shard_by and args.marker:
+        raise exceptions.CommandError(_("--marker can't be used with "
+                                        "--shard-by."))
+
     convert = [('OS-EXT-SRV-ATTR:host', 'host'),
                ('OS-EXT-STS:task_state', 'task_state'),
                ('OS-EXT-SRV-ATTR:instance_name', 'instance_name'),
                ('OS-EXT-STS:power_state', 'power_state'),
                ('hostId', 'host_id')]
-    _translate_keys(servers, convert)
-    _translate_extended_states(servers)
+
+    def prepare(servers):
+        _translate_keys(servers, convert)
+        _translate_extended_states(servers)
+        # For detailed lists, if we have embedded flavor information then
+        # replace the "flavor" attribute with more detailed information.
+        if detailed and have_embedded_flavor_info:
+            _expand_dict_attr(servers, 'flavor')
+        return servers
+
+    if args.inventory:
+        servers = prepare(_list_from_inventory(cs, args, search_opts,
+                                               sort_keys, sort_dirs))
+        sample = servers
+    elif (args.output_format in utils.STREAMING_OUTPUT_FORMATS and
+            not args.shard_by):
+        # NOTE: The servers are printed as their pages arrive, the first one
+        # is only used to check the fields.
+        stream = (server
+                  for page_server in cs.servers.iter(detailed=detailed,
+                                                     search_opts=search_opts,
+                                                     sort_keys=sort_keys,
+                                                     sort_dirs=sort_dirs,
+                                                     marker=args.marker,
+                                                     limit=args.limit)
+                  for server in prepare([page_server]))
+        sample = list(itertools.islice(stream, 1))
+        servers = itertools.chain(sample, stream)
+    else:
+        servers = prepare(cs.servers.list(detailed=detailed,
+                                          search_opts=search_opts,
+                                          sort_keys=sort_keys,
+                                          sort_dirs=sort_dirs,
+                                          marker=args.marker,
+                                          limit=args.limit,
+                                          shard_by=args.shard_by,
+                                          shard_concurrency=args.concurrency))
+        sample = servers
 
     formatters = {}
     cols = []
     fmts = {}
 
-    # For detailed lists, if we have embedded flavor information then replace
-    # the "flavor" attribute with more detailed information.
-    if detailed and have_embedded_flavor_info:
-        _expand_dict_attr(servers, 'flavor')
-
-    if servers:
+    if sample:
         cols, fmts = _get_list_table_columns_and_formatters(
-            args.fields, servers, exclude_fields=('id',), filters=filters)
+            args.fields, sample, exclude_fields=('id',), filters=filters)
 
     if args.minimal:
         columns = [
@@ -1607,7 +1696,26 @@ def do_list(cs, args):
     if args.sort:
         sortby_index = None
     utils.print_list(servers, columns,
-                     formatters, sortby_index=sortby_index)
+                     formatters, sortby_index=sortby_index,
+                     output_format=args.output_format)
+
+
+def _list_from_inventory(cs, args, search_opts, sort_keys, sort_dirs):
+    if (args.marker or args.limit or args.deleted or args.shard_by or
+            search_opts['changes-since'] or
+            any(search_opts.get(arg) for arg in ('tags', 'tags-any',
+                                                 'not-tags', 'not-tags-any'))):
+        raise exceptions.CommandError(_(
+            "--inventory can't be used with --marker, --limit, --deleted, "
+            "--changes-since, --shard-by and the tag filters."))
+    # NOTE: The snapshot is shared by all the listings of the same projects,
+    # the other options are applied to it.
+    server_inventory = inventory.ServerInventory.for_client(
+        cs, {'all_tenants': search_opts['all_tenants']})
+    return server_inventory.list(
+        dict((opt, value) for opt, value in search_opts.items()
+             if opt not in ('deleted', 'changes-since')),
+        sort_keys=sort_keys, sort_dirs=sort_dirs)
 
 
 def _get_list_table_columns_and_formatters(fields, objs, exclude_fields=(),
@@ -1682,6 +1790,19 @@ def _get_list_table_columns_and_formatters(fields, objs, exclude_fields=(),
     return columns, formatters
 
 
+def _add_concurrency_arg(func):
+    """Adds the --concurrency option of the commands acting on servers."""
+    utils.add_arg(
+        func,
+        '--concurrency',
+        metavar='<concurrency>',
+        type=int,
+        default=1,
+        help=_('Maximum number of servers to process at the same time. '
+               '(Default=1)'))
+    return func
+
+
 @utils.arg(
     '--hard',
     dest='reboot_type',
@@ -1702,22 +1823,28 @@ def _get_list_table_columns_and_formatters(fields, objs, exclude_fields=(),
     action="store_true",
     default=False,
     help=_('Poll until reboot is complete.'))
+@_add_concurrency_arg
 def do_reboot(cs, args):
     """Reboot a server."""
-    servers = [_find_server(cs, s) for s in args.server]
+    servers = []
+    with _coalesced_server_gets(cs, args.concurrency) as batched:
+        for _server, found, error in utils.run_concurrently(
+                batched(lambda s: _find_server(cs, s)), args.server,
+                args.concurrency):
+            if error is not None:
+                raise error
+            servers.append(found)
+    requested_at = timeutils.utcnow()
     utils.do_action_on_many(
         lambda s: s.reboot(args.reboot_type),
         servers,
         _("Request to reboot server %s has been accepted."),
-        _("Unable to reboot the specified server(s)."))
+        _("Unable to reboot the specified server(s)."),
+        concurrency=args.concurrency)
 
     if args.poll:
-        utils.do_action_on_many(
-            lambda s: _poll_for_status(cs.servers.get, s.id, 'rebooting',
-                                       ['active'], show_progress=False),
-            servers,
-            _("Wait for server %s reboot."),
-            _("Wait for specified server(s) failed."))
+        _poll_for_servers_status(cs, servers, 'rebooting', ['active'],
+                                 since=requested_at)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -1973,14 +2100,17 @@ def do_unpause(cs, args):
     'server',
     metavar='<server>', nargs='+',
     help=_('Name or ID of server(s).'))
+@_add_concurrency_arg
 def do_stop(cs, args):
     """Stop the server(s)."""
     find_args = {'all_tenants': args.all_tenants}
-    utils.do_action_on_many(
-        lambda s: _find_server(cs, s, **find_args).stop(),
-        args.server,
-        _("Request to stop server %s has been accepted."),
-        _("Unable to stop the specified server(s)."))
+    with _coalesced_server_gets(cs, args.concurrency) as batched:
+        utils.do_action_on_many(
+            batched(lambda s: _find_server(cs, s, **find_args).stop()),
+            args.server,
+            _("Request to stop server %s has been accepted."),
+            _("Unable to stop the specified server(s)."),
+            concurrency=args.concurrency)
 
 
 @utils.arg(
@@ -1993,14 +2123,17 @@ def do_stop(cs, args):
     'server',
     metavar='<server>', nargs='+',
     help=_('Name or ID of server(s).'))
+@_add_concurrency_arg
 def do_start(cs, args):
     """Start the server(s)."""
     find_args = {'all_tenants': args.all_tenants}
-    utils.do_action_on_many(
-        lambda s: _find_server(cs, s, **find_args).start(),
-        args.server,
-        _("Request to start server %s has been accepted."),
-        _("Unable to start the specified server(s)."))
+    with _coalesced_server_gets(cs, args.concurrency) as batched:
+        utils.do_action_on_many(
+            batched(lambda s: _find_server(cs, s, **find_args).start()),
+            args.server,
+            _("Request to start server %s has been accepted."),
+            _("Unable to start the specified server(s)."),
+            concurrency=args.concurrency)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2050,7 +2183,8 @@ def do_rescue(cs, args):
         kwargs['image'] = _find_image(cs, args.image)
     if args.password:
         kwargs['password'] = args.password
-    utils.print_dict(_find_server(cs, args.server).rescue(**kwargs)[1])
+    utils.print_dict(_find_server(cs, args.server).rescue(**kwargs)[1],
+                     output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2081,7 +2215,8 @@ def do_unshelve(cs, args):
 def do_diagnostics(cs, args):
     """Retrieve server diagnostics."""
     server = _find_server(cs, args.server)
-    utils.print_dict(cs.servers.diagnostics(server)[1], wrap=80)
+    utils.print_dict(cs.servers.diagnostics(server)[1], wrap=80,
+                     output_format=args.output_format)
 
 
 @utils.arg(
@@ -2156,7 +2291,8 @@ def do_image_create(cs, args):
                              show_progress=False, silent=True)
 
     if args.show:
-        _print_image(_find_image(cs, image_uuid))
+        _print_image(_find_image(cs, image_uuid),
+                     output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2176,7 +2312,8 @@ def do_backup(cs, args):
     # Microversion >= 2.45 will return a DictWithMeta that has the image_id
     # in it for the backup snapshot image.
     if cs.api_version >= api_versions.APIVersion('2.45'):
-        _print_image(_find_image(cs, result['image_id']))
+        _print_image(_find_image(cs, result['image_id']),
+                     output_format=args.output_format)
 
 
 @utils.arg(
@@ -2273,7 +2410,7 @@ def _print_server(cs, args, server=None, wrap=0):
     info.pop('links', None)
     info.pop('addresses', None)
 
-    utils.print_dict(info, wrap=wrap)
+    utils.print_dict(info, wrap=wrap, output_format=args.output_format)
 
 
 @utils.arg(
@@ -2300,14 +2437,30 @@ def do_show(cs, args):
 @utils.arg(
     'server', metavar='<server>', nargs='+',
     help=_('Name or ID of server(s).'))
+@_add_concurrency_arg
 def do_delete(cs, args):
     """Immediately shut down and delete specified server(s)."""
     find_args = {'all_tenants': args.all_tenants}
-    utils.do_action_on_many(
-        lambda s: _find_server(cs, s, **find_args).delete(),
-        args.server,
-        _("Request to delete server %s has been accepted."),
-        _("Unable to delete the specified server(s)."))
+    with _coalesced_server_gets(cs, args.concurrency) as batched:
+        utils.do_action_on_many(
+            batched(lambda s: _find_server(cs, s, **find_args).delete()),
+            args.server,
+            _("Request to delete server %s has been accepted."),
+            _("Unable to delete the specified server(s)."),
+            concurrency=args.concurrency)
+
+
+@contextlib.contextmanager
+def _coalesced_server_gets(cs, concurrency):
+    """Batch the gets of servers made by up to ``concurrency`` threads.
+
+    Yields a function wrapping the functions which gets are batched.
+    """
+    if concurrency > 1:
+        with cs.servers.coalesce_gets(max_batch=concurrency) as coalescer:
+            yield coalescer.bind
+    else:
+        yield lambda func: func
 
 
 def _find_server(cs, server, raise_if_notfound=True, **find_args):
@@ -2355,8 +2508,8 @@ def _find_network_id(cs, net_name):
         raise exceptions.CommandError(six.text_type(e))
 
 
-def _print_volume(volume):
-    utils.print_dict(volume.to_dict())
+def _print_volume(volume, output_format='table'):
+    utils.print_dict(volume.to_dict(), output_format=output_format)
 
 
 def _translate_availability_zone_keys(collection):
@@ -2402,7 +2555,7 @@ def do_volume_attach(cs, args):
                                              args.volume,
                                              args.device,
                                              **update_kwargs)
-    _print_volume(volume)
+    _print_volume(volume, output_format=args.output_format)
 
 
 @utils.arg(
@@ -2451,7 +2604,8 @@ def do_volume_attachments(cs, args):
     """List all the volumes attached to a server."""
     volumes = cs.volumes.get_server_volumes(_find_server(cs, args.server).id)
     _translate_volume_attachments_keys(volumes)
-    utils.print_list(volumes, ['ID', 'DEVICE', 'SERVER ID', 'VOLUME ID'])
+    utils.print_list(volumes, ['ID', 'DEVICE', 'SERVER ID', 'VOLUME ID'],
+                     output_format=args.output_format)
 
 
 @api_versions.wraps('2.0', '2.5')
@@ -2470,9 +2624,9 @@ class Console(object):
         self.url = console_dict['url']
 
 
-def print_console(cs, data):
+def print_console(cs, data, output_format='table'):
     utils.print_list([Console(console_dict_accessor(cs, data))],
-                     ['Type', 'Url'])
+                     ['Type', 'Url'], output_format=output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2485,7 +2639,7 @@ def do_get_vnc_console(cs, args):
     server = _find_server(cs, args.server)
     data = server.get_vnc_console(args.console_type)
 
-    print_console(cs, data)
+    print_console(cs, data, output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2498,7 +2652,7 @@ def do_get_spice_console(cs, args):
     server = _find_server(cs, args.server)
     data = server.get_spice_console(args.console_type)
 
-    print_console(cs, data)
+    print_console(cs, data, output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2511,7 +2665,7 @@ def do_get_rdp_console(cs, args):
     server = _find_server(cs, args.server)
     data = server.get_rdp_console(args.console_type)
 
-    print_console(cs, data)
+    print_console(cs, data, output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2529,7 +2683,7 @@ def do_get_serial_console(cs, args):
     server = _find_server(cs, args.server)
     data = server.get_serial_console(args.console_type)
 
-    print_console(cs, data)
+    print_console(cs, data, output_format=args.output_format)
 
 
 @api_versions.wraps('2.8')
@@ -2539,7 +2693,7 @@ def do_get_mks_console(cs, args):
     server = _find_server(cs, args.server)
     data = server.get_mks_console()
 
-    print_console(cs, data)
+    print_console(cs, data, output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2571,12 +2725,13 @@ def do_clear_password(cs, args):
     server.clear_password()
 
 
-def _print_floating_ip_list(floating_ips):
+def _print_floating_ip_list(floating_ips, output_format='table'):
     convert = [('instance_id', 'server_id')]
     _translate_keys(floating_ips, convert)
 
     utils.print_list(floating_ips,
-                     ['Id', 'IP', 'Server Id', 'Fixed IP', 'Pool'])
+                     ['Id', 'IP', 'Server Id', 'Fixed IP', 'Pool'],
+                     output_format=output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -2622,11 +2777,12 @@ def do_list_secgroup(cs, args):
     """List Security Group(s) of a server."""
     server = _find_server(cs, args.server)
     groups = server.list_security_group()
-    _print_secgroups(groups)
+    _print_secgroups(groups, output_format=args.output_format)
 
 
-def _print_secgroups(secgroups):
-    utils.print_list(secgroups, ['Id', 'Name', 'Description'])
+def _print_secgroups(secgroups, output_format='table'):
+    utils.print_list(secgroups, ['Id', 'Name', 'Description'],
+                     output_format=output_format)
 
 
 @api_versions.wraps("2.0", "2.1")
@@ -2722,7 +2878,7 @@ def do_keypair_list(cs, args):
     """Print a list of keypairs for a user"""
     keypairs = cs.keypairs.list()
     columns = _get_keypairs_list_columns(cs, args)
-    utils.print_list(keypairs, columns)
+    utils.print_list(keypairs, columns, output_format=args.output_format)
 
 
 @api_versions.wraps("2.10", "2.34")
@@ -2735,7 +2891,7 @@ def do_keypair_list(cs, args):
     """Print a list of keypairs for a user"""
     keypairs = cs.keypairs.list(args.user)
     columns = _get_keypairs_list_columns(cs, args)
-    utils.print_list(keypairs, columns)
+    utils.print_list(keypairs, columns, output_format=args.output_format)
 
 
 @api_versions.wraps("2.35")
@@ -2764,11 +2920,14 @@ def do_keypair_list(cs, args):
     """Print a list of keypairs for a user"""
     keypairs = cs.keypairs.list(args.user, args.marker, args.limit)
     columns = _get_keypairs_list_columns(cs, args)
-    utils.print_list(keypairs, columns)
+    utils.print_list(keypairs, columns, output_format=args.output_format)
 
 
-def _print_keypair(keypair):
+def _print_keypair(keypair, output_format='table'):
     kp = keypair.to_dict()
+    if output_format != 'table':
+        utils.print_dict(kp, output_format=output_format)
+        return
     pk = kp.pop('public_key')
     utils.print_dict(kp)
     print(_("Public key: %s") % pk)
@@ -2782,7 +2941,7 @@ def _print_keypair(keypair):
 def do_keypair_show(cs, args):
     """Show details about the given keypair."""
     keypair = _find_keypair(cs, args.keypair)
-    _print_keypair(keypair)
+    _print_keypair(keypair, output_format=args.output_format)
 
 
 @api_versions.wraps("2.10")
@@ -2798,7 +2957,7 @@ def do_keypair_show(cs, args):
 def do_keypair_show(cs, args):
     """Show details about the given keypair."""
     keypair = cs.keypairs.get(args.keypair, args.user)
-    _print_keypair(keypair)
+    _print_keypair(keypair, output_format=args.output_format)
 
 
 def _find_keypair(cs, keypair):
@@ -2806,8 +2965,8 @@ def _find_keypair(cs, keypair):
     return utils.find_resource(cs.keypairs, keypair)
 
 
-def _print_absolute_limits(limits):
-    """Prints absolute limits."""
+def _get_absolute_limits(limits):
+    """Returns the columns and the rows of absolute limits."""
     class Limit(object):
         def __init__(self, name, used, max, other):
             self.name = name
@@ -2866,13 +3025,28 @@ def _print_absolute_limits(limits):
                   other.get(name, "-"))
         limit_list.append(l)
 
-    utils.print_list(limit_list, columns)
+    return columns, limit_list
+
+
+def _print_absolute_limits(limits, output_format='table'):
+    """Prints absolute limits."""
+    columns, limit_list = _get_absolute_limits(limits)
+    utils.print_list(limit_list, columns, output_format=output_format)
+
+
+_RATE_LIMIT_COLUMNS = ['Verb', 'URI', 'Value', 'Remain', 'Unit',
+                       'Next_Available']
 
 
-def _print_rate_limits(limits):
+def _print_rate_limits(limits, output_format='table'):
     """print rate limits."""
-    columns = ['Verb', 'URI', 'Value', 'Remain', 'Unit', 'Next_Available']
-    utils.print_list(limits, columns)
+    utils.print_list(limits, _RATE_LIMIT_COLUMNS, output_format=output_format)
+
+
+def _limit_rows(limits, columns):
+    return [dict((column, getattr(limit, column.lower(), ''))
+                 for column in columns)
+            for limit in limits]
 
 
 @utils.arg(
@@ -2891,8 +3065,15 @@ def _print_rate_limits(limits):
 def do_limits(cs, args):
     """Print rate and absolute limits."""
     limits = cs.limits.get(args.reserved, args.tenant)
-    _print_rate_limits(limits.rate)
-    _print_absolute_limits(limits.absolute)
+    if args.output_format == 'table':
+        _print_rate_limits(limits.rate)
+        _print_absolute_limits(limits.absolute)
+        return
+    # both kinds of limits in a single document
+    columns, absolute = _get_absolute_limits(limits.absolute)
+    utils.print_dict({'rate': _limit_rows(limits.rate, _RATE_LIMIT_COLUMNS),
+                      'absolute': _limit_rows(absolute, columns)},
+                     output_format=args.output_format)
 
 
 def _get_usage_marker(usage):
@@ -2935,6 +3116,21 @@ def _merge_usage_list(usages, next_usage_list):
     metavar='<end>',
     help=_('Usage range end date, ex 2012-01-20. (default: tomorrow)'),
     default=None)
+@utils.arg(
+    '--window',
+    metavar='<days>',
+    type=int,
+    default=None,
+    help=_('Fetch the usage of the range by windows of <days> days '
+           'concurrently, and merge the usage of the tenants as it is '
+           'received.'))
+@utils.arg(
+    '--concurrency',
+    metavar='<concurrency>',
+    type=int,
+    default=4,
+    help=_('Maximum number of windows fetched at once with --window. '
+           '(Default 4)'))
 def do_usage_list(cs, args):
     """List usage data for all tenants."""
     dateformat = "%Y-%m-%d"
@@ -2953,16 +3149,23 @@ def do_usage_list(cs, args):
     else:
         end = now + datetime.timedelta(days=1)
 
-    def simplify_usage(u):
+    def simplify_usage(u, server_count):
         simplerows = [x.lower().replace(" ", "_") for x in rows]
 
         setattr(u, simplerows[0], u.tenant_id)
-        setattr(u, simplerows[1], "%d" % len(u.server_usages))
+        setattr(u, simplerows[1], "%d" % server_count)
         setattr(u, simplerows[2], "%.2f" % u.total_memory_mb_usage)
         setattr(u, simplerows[3], "%.2f" % u.total_vcpus_usage)
         setattr(u, simplerows[4], "%.2f" % u.total_local_gb_usage)
 
-    if cs.api_version < api_versions.APIVersion('2.40'):
+    if args.window is not None:
+        if args.window < 1:
+            raise exceptions.CommandError(
+                _("The window must be at least one day."))
+        usage_list = cs.usage.collect(
+            start, end, window=datetime.timedelta(days=args.window),
+            concurrency=args.concurrency)
+    elif cs.api_version < api_versions.APIVersion('2.40'):
         usage_list = cs.usage.list(start, end, detailed=True)
     else:
         # If the number of instances used to calculate the usage is greater
@@ -2980,14 +3183,18 @@ def do_usage_list(cs, args):
                 _merge_usage_list(usages, next_usage_list)
         usage_list = list(usages.values())
 
-    print(_("Usage from %(start)s to %(end)s:") %
-          {'start': start.strftime(dateformat),
-           'end': end.strftime(dateformat)})
+    if args.output_format == 'table':
+        print(_("Usage from %(start)s to %(end)s:") %
+              {'start': start.strftime(dateformat),
+               'end': end.strftime(dateformat)})
 
     for usage in usage_list:
-        simplify_usage(usage)
+        if args.window is not None:
+            simplify_usage(usage, usage.server_count)
+        else:
+            simplify_usage(usage, len(usage.server_usages))
 
-    utils.print_list(usage_list, rows)
+    utils.print_list(usage_list, rows, output_format=args.output_format)
 
 
 @utils.arg(
@@ -3052,6 +3259,14 @@ def do_usage(cs, args):
             if marker:
                 _merge_usage(usage, next_usage)
 
+    if args.output_format != 'table':
+        usages = []
+        if getattr(usage, 'total_vcpus_usage', None):
+            simplify_usage(usage)
+            usages.append(usage)
+        utils.print_list(usages, rows, output_format=args.output_format)
+        return
+
     print(_("Usage from %(start)s to %(end)s:") %
           {'start': start.strftime(dateformat),
            'end': end.strftime(dateformat)})
@@ -3073,7 +3288,7 @@ def do_agent_list(cs, args):
     result = cs.agents.list(args.hypervisor)
     columns = ["Agent_id", "Hypervisor", "OS", "Architecture", "Version",
                'Md5hash', 'Url']
-    utils.print_list(result, columns)
+    utils.print_list(result, columns, output_format=args.output_format)
 
 
 @utils.arg('os', metavar='<os>', help=_('Type of OS.'))
@@ -3094,7 +3309,7 @@ def do_agent_create(cs, args):
     result = cs.agents.create(args.os, args.architecture,
                               args.version, args.url,
                               args.md5hash, args.hypervisor)
-    utils.print_dict(result.to_dict())
+    utils.print_dict(result.to_dict(), output_format=args.output_format)
 
 
 @utils.arg('id', metavar='<id>', help=_('ID of the agent-build.'))
@@ -3111,7 +3326,7 @@ def do_agent_modify(cs, args):
     """Modify existing agent build."""
     result = cs.agents.update(args.id, args.version,
                               args.url, args.md5hash)
-    utils.print_dict(result.to_dict())
+    utils.print_dict(result.to_dict(), output_format=args.output_format)
 
 
 def _find_aggregate(cs, aggregate):
@@ -3125,7 +3340,7 @@ def do_aggregate_list(cs, args):
     columns = ['Id', 'Name', 'Availability Zone']
     if cs.api_version >= api_versions.APIVersion('2.41'):
         columns.append('UUID')
-    utils.print_list(aggregates, columns)
+    utils.print_list(aggregates, columns, output_format=args.output_format)
 
 
 @utils.arg('name', metavar='<name>', help=_('Name of aggregate.'))
@@ -3138,7 +3353,7 @@ def do_aggregate_list(cs, args):
 def do_aggregate_create(cs, args):
     """Create a new aggregate with the specified details."""
     aggregate = cs.aggregates.create(args.name, args.availability_zone)
-    _print_aggregate_details(cs, aggregate)
+    _print_aggregate_details(cs, aggregate, output_format=args.output_format)
 
 
 @utils.arg(
@@ -3176,8 +3391,9 @@ def do_aggregate_update(cs, args):
         updates["availability_zone"] = args.availability_zone
 
     aggregate = cs.aggregates.update(aggregate.id, updates)
-    print(_("Aggregate %s has been successfully updated.") % aggregate.id)
-    _print_aggregate_details(cs, aggregate)
+    if args.output_format == 'table':
+        print(_("Aggregate %s has been successfully updated.") % aggregate.id)
+    _print_aggregate_details(cs, aggregate, output_format=args.output_format)
 
 
 @utils.arg(
@@ -3204,9 +3420,10 @@ def do_aggregate_set_metadata(cs, args):
                                           " hence can not be deleted")
                                           % key)
     aggregate = cs.aggregates.set_metadata(aggregate.id, metadata)
-    print(_("Metadata has been successfully updated for aggregate %s.") %
-          aggregate.id)
-    _print_aggregate_details(cs, aggregate)
+    if args.output_format == 'table':
+        print(_("Metadata has been successfully updated for aggregate %s.") %
+              aggregate.id)
+    _print_aggregate_details(cs, aggregate, output_format=args.output_format)
 
 
 @utils.arg(
@@ -3219,10 +3436,11 @@ def do_aggregate_add_host(cs, args):
     """Add the host to the specified aggregate."""
     aggregate = _find_aggregate(cs, args.aggregate)
     aggregate = cs.aggregates.add_host(aggregate.id, args.host)
-    print(_("Host %(host)s has been successfully added for aggregate "
-            "%(aggregate_id)s ") % {'host': args.host,
-                                    'aggregate_id': aggregate.id})
-    _print_aggregate_details(cs, aggregate)
+    if args.output_format == 'table':
+        print(_("Host %(host)s has been successfully added for aggregate "
+                "%(aggregate_id)s ") % {'host': args.host,
+                                        'aggregate_id': aggregate.id})
+    _print_aggregate_details(cs, aggregate, output_format=args.output_format)
 
 
 @utils.arg(
@@ -3235,10 +3453,11 @@ def do_aggregate_remove_host(cs, args):
     """Remove the specified host from the specified aggregate."""
     aggregate = _find_aggregate(cs, args.aggregate)
     aggregate = cs.aggregates.remove_host(aggregate.id, args.host)
-    print(_("Host %(host)s has been successfully removed from aggregate "
-            "%(aggregate_id)s ") % {'host': args.host,
-                                    'aggregate_id': aggregate.id})
-    _print_aggregate_details(cs, aggregate)
+    if args.output_format == 'table':
+        print(_("Host %(host)s has been successfully removed from aggregate "
+                "%(aggregate_id)s ") % {'host': args.host,
+                                        'aggregate_id': aggregate.id})
+    _print_aggregate_details(cs, aggregate, output_format=args.output_format)
 
 
 @utils.arg(
@@ -3247,10 +3466,10 @@ def do_aggregate_remove_host(cs, args):
 def do_aggregate_show(cs, args):
     """Show details of the specified aggregate."""
     aggregate = _find_aggregate(cs, args.aggregate)
-    _print_aggregate_details(cs, aggregate)
+    _print_aggregate_details(cs, aggregate, output_format=args.output_format)
 
 
-def _print_aggregate_details(cs, aggregate):
+def _print_aggregate_details(cs, aggregate, output_format='table'):
     columns = ['Id', 'Name', 'Availability Zone', 'Hosts', 'Metadata']
     if cs.api_version >= api_versions.APIVersion('2.41'):
         columns.append('UUID')
@@ -3265,7 +3484,8 @@ def _print_aggregate_details(cs, aggregate):
         'Metadata': parser_metadata,
         'Hosts': parser_hosts,
     }
-    utils.print_list([aggregate], columns, formatters=formatters)
+    utils.print_list([aggregate], columns, formatters=formatters,
+                     output_format=output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -3345,7 +3565,8 @@ def do_server_migration_list(cs, args):
                      format_key)
     formatters = dict(zip(format_name, formatters))
 
-    utils.print_list(migrations, fields + format_name, formatters)
+    utils.print_list(migrations, fields + format_name, formatters,
+                     output_format=args.output_format)
 
 
 @api_versions.wraps("2.23")
@@ -3355,7 +3576,7 @@ def do_server_migration_show(cs, args):
     """Get the migration of specified server."""
     server = _find_server(cs, args.server)
     migration = cs.server_migrations.get(server, args.migration)
-    utils.print_dict(migration.to_dict())
+    utils.print_dict(migration.to_dict(), output_format=args.output_format)
 
 
 @api_versions.wraps("2.24")
@@ -3381,20 +3602,24 @@ def do_live_migration_abort(cs, args):
     default='error', const='active',
     help=_('Request the server be reset to "active" state instead '
            'of "error" state (the default).'))
+@_add_concurrency_arg
 def do_reset_state(cs, args):
     """Reset the state of a server."""
     failure_flag = False
     find_args = {'all_tenants': args.all_tenants}
 
-    for server in args.server:
-        try:
-            _find_server(cs, server, **find_args).reset_state(args.state)
-            msg = "Reset state for server %s succeeded; new state is %s"
-            print(msg % (server, args.state))
-        except Exception as e:
-            failure_flag = True
-            msg = "Reset state for server %s failed: %s" % (server, e)
-            print(msg)
+    with _coalesced_server_gets(cs, args.concurrency) as batched:
+        for server, _result, e in utils.run_concurrently(
+                batched(lambda s: _find_server(
+                    cs, s, **find_args).reset_state(args.state)),
+                args.server, args.concurrency):
+            if e is None:
+                msg = "Reset state for server %s succeeded; new state is %s"
+                print(msg % (server, args.state))
+            else:
+                failure_flag = True
+                msg = "Reset state for server %s failed: %s" % (server, e)
+                print(msg)
 
     if failure_flag:
         msg = "Unable to reset the state for the specified server(s)."
@@ -3425,7 +3650,7 @@ def do_service_list(cs, args):
     if cs.api_version >= api_versions.APIVersion('2.11'):
         columns.append("Forced down")
 
-    utils.print_list(result, columns)
+    utils.print_list(result, columns, output_format=args.output_format)
 
 
 # Before microversion 2.53, the service was identified using it's host/binary
@@ -3435,7 +3660,8 @@ def do_service_list(cs, args):
 def do_service_enable(cs, args):
     """Enable the service."""
     result = cs.services.enable(args.host, 'nova-compute')
-    utils.print_list([result], ['Host', 'Binary', 'Status'])
+    utils.print_list([result], ['Host', 'Binary', 'Status'],
+                     output_format=args.output_format)
 
 
 # Starting in microversion 2.53, the service is identified by UUID ID.
@@ -3444,7 +3670,8 @@ def do_service_enable(cs, args):
 def do_service_enable(cs, args):
     """Enable the service."""
     result = cs.services.enable(args.id)
-    utils.print_list([result], ['ID', 'Host', 'Binary', 'Status'])
+    utils.print_list([result], ['ID', 'Host', 'Binary', 'Status'],
+                     output_format=args.output_format)
 
 
 # Before microversion 2.53, the service was identified using it's host/binary
@@ -3461,10 +3688,12 @@ def do_service_disable(cs, args):
         result = cs.services.disable_log_reason(args.host, 'nova-compute',
                                                 args.reason)
         utils.print_list([result], ['Host', 'Binary', 'Status',
-                         'Disabled Reason'])
+                         'Disabled Reason'],
+                         output_format=args.output_format)
     else:
         result = cs.services.disable(args.host, 'nova-compute')
-        utils.print_list([result], ['Host', 'Binary', 'Status'])
+        utils.print_list([result], ['Host', 'Binary', 'Status'],
+                         output_format=args.output_format)
 
 
 # Starting in microversion 2.53, the service is identified by UUID ID.
@@ -3479,10 +3708,12 @@ def do_service_disable(cs, args):
     if args.reason:
         result = cs.services.disable_log_reason(args.id, args.reason)
         utils.print_list(
-            [result], ['ID', 'Host', 'Binary', 'Status', 'Disabled Reason'])
+            [result], ['ID', 'Host', 'Binary', 'Status', 'Disabled Reason'],
+            output_format=args.output_format)
     else:
         result = cs.services.disable(args.id)
-        utils.print_list([result], ['ID', 'Host', 'Binary', 'Status'])
+        utils.print_list([result], ['ID', 'Host', 'Binary', 'Status'],
+                         output_format=args.output_format)
 
 
 # Before microversion 2.53, the service was identified using it's host/binary
@@ -3498,7 +3729,8 @@ def do_service_disable(cs, args):
 def do_service_force_down(cs, args):
     """Force service to down."""
     result = cs.services.force_down(args.host, 'nova-compute', args.force_down)
-    utils.print_list([result], ['Host', 'Binary', 'Forced down'])
+    utils.print_list([result], ['Host', 'Binary', 'Forced down'],
+                     output_format=args.output_format)
 
 
 # Starting in microversion 2.53, the service is identified by UUID ID.
@@ -3513,7 +3745,8 @@ def do_service_force_down(cs, args):
 def do_service_force_down(cs, args):
     """Force service to down."""
     result = cs.services.force_down(args.id, args.force_down)
-    utils.print_list([result], ['ID', 'Host', 'Binary', 'Forced down'])
+    utils.print_list([result], ['ID', 'Host', 'Binary', 'Forced down'],
+                     output_format=args.output_format)
 
 
 # Before microversion 2.53, the service was identified using it's host/binary
@@ -3540,10 +3773,12 @@ def _find_hypervisor(cs, hypervisor):
     return utils.find_resource(cs.hypervisors, hypervisor)
 
 
-def _do_hypervisor_list(cs, matching=None, limit=None, marker=None):
+def _do_hypervisor_list(cs, matching=None, limit=None, marker=None,
+                        output_format='table'):
     columns = ['ID', 'Hypervisor hostname', 'State', 'Status']
     if matching:
-        utils.print_list(cs.hypervisors.search(matching), columns)
+        utils.print_list(cs.hypervisors.search(matching), columns,
+                         output_format=output_format)
     else:
         params = {}
         if limit is not None:
@@ -3552,7 +3787,8 @@ def _do_hypervisor_list(cs, matching=None, limit=None, marker=None):
             params['marker'] = marker
         # Since we're not outputting detail data, choose
         # detailed=False for server-side efficiency
-        utils.print_list(cs.hypervisors.list(False, **params), columns)
+        utils.print_list(cs.hypervisors.list(False, **params), columns,
+                         output_format=output_format)
 
 
 @api_versions.wraps("2.0", "2.32")
@@ -3563,7 +3799,8 @@ def _do_hypervisor_list(cs, matching=None, limit=None, marker=None):
     help=_('List hypervisors matching the given <hostname> (or pattern).'))
 def do_hypervisor_list(cs, args):
     """List hypervisors."""
-    _do_hypervisor_list(cs, matching=args.matching)
+    _do_hypervisor_list(cs, matching=args.matching,
+                        output_format=args.output_format)
 
 
 @api_versions.wraps("2.33")
@@ -3592,7 +3829,8 @@ def do_hypervisor_list(cs, args):
 def do_hypervisor_list(cs, args):
     """List hypervisors."""
     _do_hypervisor_list(
-        cs, matching=args.matching, limit=args.limit, marker=args.marker)
+        cs, matching=args.matching, limit=args.limit, marker=args.marker,
+        output_format=args.output_format)
 
 
 @utils.arg(
@@ -3621,7 +3859,8 @@ def do_hypervisor_servers(cs, args):
 
     # Output the data
     utils.print_list(instances, ['ID', 'Name', 'Hypervisor ID',
-                                 'Hypervisor Hostname'])
+                                 'Hypervisor Hostname'],
+                     output_format=args.output_format)
 
 
 @utils.arg(
@@ -3636,7 +3875,8 @@ def do_hypervisor_servers(cs, args):
 def do_hypervisor_show(cs, args):
     """Display the details of the specified hypervisor."""
     hyper = _find_hypervisor(cs, args.hypervisor)
-    utils.print_dict(utils.flatten_dict(hyper.to_dict()), wrap=int(args.wrap))
+    utils.print_dict(utils.flatten_dict(hyper.to_dict()), wrap=int(args.wrap),
+                     output_format=args.output_format)
 
 
 @utils.arg(
@@ -3650,13 +3890,91 @@ def do_hypervisor_uptime(cs, args):
     hyper = cs.hypervisors.uptime(hyper)
 
     # Output the uptime information
-    utils.print_dict(hyper.to_dict())
+    utils.print_dict(hyper.to_dict(), output_format=args.output_format)
 
 
 def do_hypervisor_stats(cs, args):
     """Get hypervisor statistics over all compute nodes."""
     stats = cs.hypervisor_stats.statistics()
-    utils.print_dict(stats.to_dict())
+    utils.print_dict(stats.to_dict(), output_format=args.output_format)
+
+
+@utils.arg(
+    '--flavor',
+    metavar='<flavor>',
+    dest='flavors',
+    action='append',
+    default=[],
+    help=_('Name or ID of a flavor to count the servers fitting in the free '
+           'capacity of, may be repeated. (Default: all the flavors)'))
+@utils.arg(
+    '--group-by',
+    metavar='<group-by>',
+    choices=capacity.GROUP_BY,
+    default='zone',
+    help=_('Group the compute nodes by "zone", "aggregate" or "host". '
+           '(Default: zone)'))
+@utils.arg(
+    '--cpu-allocation-ratio',
+    metavar='<ratio>',
+    type=float,
+    default=1.0,
+    help=_('Virtual CPUs per physical CPU of the compute nodes. '
+           '(Default: 1.0)'))
+@utils.arg(
+    '--ram-allocation-ratio',
+    metavar='<ratio>',
+    type=float,
+    default=1.0,
+    help=_('Virtual RAM per physical RAM of the compute nodes. '
+           '(Default: 1.0)'))
+@utils.arg(
+    '--disk-allocation-ratio',
+    metavar='<ratio>',
+    type=float,
+    default=1.0,
+    help=_('Virtual disk per physical disk of the compute nodes. '
+           '(Default: 1.0)'))
+def do_capacity(cs, args):
+    """Display the free capacity of the compute nodes and the number of
+    servers of flavors fitting in it.
+    """
+    if args.flavors:
+        flavors = []
+        for flavor in args.flavors:
+            flavor = _find_flavor(cs, flavor)
+            if flavor.id not in [f.id for f in flavors]:
+                flavors.append(flavor)
+    else:
+        flavors = cs.flavors.list()
+    summary = capacity.Capacity.for_client(
+        cs, cpu_allocation_ratio=args.cpu_allocation_ratio,
+        ram_allocation_ratio=args.ram_allocation_ratio,
+        disk_allocation_ratio=args.disk_allocation_ratio).summary(
+            flavors, group_by=args.group_by)
+
+    group_column = {'zone': 'Availability Zone',
+                    'aggregate': 'Aggregate',
+                    'host': 'Host'}[args.group_by]
+    columns = [group_column, 'Nodes', 'Free VCPUs', 'Free RAM MB',
+               'Free Disk GB']
+    formatters = {group_column: lambda group: group['group'] or '-',
+                  'Nodes': lambda group: group['nodes'],
+                  'Free VCPUs': lambda group: group['free_vcpus'],
+                  'Free RAM MB': lambda group: group['free_ram_mb'],
+                  'Free Disk GB': lambda group: group['free_disk_gb']}
+    # the flavor columns are prefixed not to collide with the fixed ones,
+    # flavors sharing a name are told apart by their ID
+    names = collections.Counter(flavor.name for flavor in flavors)
+    for flavor in flavors:
+        column = 'Fits %s' % flavor.name
+        if names[flavor.name] > 1:
+            column = '%s (%s)' % (column, flavor.id)
+        columns.append(column)
+        formatters[column] = (
+            lambda group, flavor_id=flavor.id: group['fits'][flavor_id])
+    utils.print_list(summary, columns, formatters=formatters,
+                     output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -3783,7 +4101,7 @@ _quota_resources = ['instances', 'cores', 'ram',
                     'server_groups', 'server_group_members']
 
 
-def _quota_show(quotas):
+def _quota_show(quotas, output_format='table'):
     class FormattedQuota(object):
         def __init__(self, key, value):
             setattr(self, 'quota', key)
@@ -3797,7 +4115,7 @@ def _quota_show(quotas):
         except AttributeError:
             pass
     columns = ['Quota', 'Limit']
-    utils.print_list(quota_list, columns)
+    utils.print_list(quota_list, columns, output_format=output_format)
 
 
 def _quota_update(manager, identifier, args):
@@ -3846,7 +4164,8 @@ def do_quota_show(cs, args):
         project_id = cs.client.tenant_id
 
     _quota_show(cs.quotas.get(project_id, user_id=args.user,
-                              detail=args.detail))
+                              detail=args.detail),
+                output_format=args.output_format)
 
 
 @utils.arg(
@@ -3865,7 +4184,8 @@ def do_quota_defaults(cs, args):
     else:
         project_id = cs.client.tenant_id
 
-    _quota_show(cs.quotas.defaults(project_id))
+    _quota_show(cs.quotas.defaults(project_id),
+                output_format=args.output_format)
 
 
 @api_versions.wraps("2.0", "2.35")
@@ -4086,7 +4406,8 @@ def do_quota_delete(cs, args):
 def do_quota_class_show(cs, args):
     """List the quotas for a quota class."""
 
-    _quota_show(cs.quota_classes.get(args.class_name))
+    _quota_show(cs.quota_classes.get(args.class_name),
+                output_format=args.output_format)
 
 
 @api_versions.wraps("2.0", "2.49")
@@ -4299,10 +4620,10 @@ def do_evacuate(cs, args):
     res = server.evacuate(host=args.host, password=args.password,
                           **update_kwargs)[1]
     if isinstance(res, dict):
-        utils.print_dict(res)
+        utils.print_dict(res, output_format=args.output_format)
 
 
-def _print_interfaces(interfaces):
+def _print_interfaces(interfaces, output_format='table'):
     columns = ['Port State', 'Port ID', 'Net ID', 'IP addresses',
                'MAC Addr']
 
@@ -4314,7 +4635,8 @@ def _print_interfaces(interfaces):
                     setattr(self, key, getattr(interface, key))
             self.ip_addresses = ",".join([fip['ip_address']
                                           for fip in interface.fixed_ips])
-    utils.print_list([FormattedInterface(i) for i in interfaces], columns)
+    utils.print_list([FormattedInterface(i) for i in interfaces], columns,
+                     output_format=output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -4324,7 +4646,7 @@ def do_interface_list(cs, args):
 
     res = server.interface_list()
     if isinstance(res, list):
-        _print_interfaces(res)
+        _print_interfaces(res, output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -4361,7 +4683,7 @@ def do_interface_attach(cs, args):
     res = server.interface_attach(args.port_id, args.net_id, args.fixed_ip,
                                   **update_kwargs)
     if isinstance(res, dict):
-        utils.print_dict(res)
+        utils.print_dict(res, output_format=args.output_format)
 
 
 @utils.arg('server', metavar='<server>', help=_('Name or ID of server.'))
@@ -4372,7 +4694,7 @@ def do_interface_detach(cs, args):
 
     res = server.interface_detach(args.port_id)
     if isinstance(res, dict):
-        utils.print_dict(res)
+        utils.print_dict(res, output_format=args.output_format)
 
 
 @api_versions.wraps("2.17")
@@ -4426,7 +4748,7 @@ def _treeizeAvailabilityZone(zone):
 
 
 @utils.service_type('compute')
-def do_availability_zone_list(cs, _args):
+def do_availability_zone_list(cs, args):
     """List all the availability zones."""
     try:
         availability_zones = cs.availability_zones.list()
@@ -4441,20 +4763,21 @@ def do_availability_zone_list(cs, _args):
         result += _treeizeAvailabilityZone(zone)
     _translate_availability_zone_keys(result)
     utils.print_list(result, ['Name', 'Status'],
-                     sortby_index=None)
+                     sortby_index=None, output_format=args.output_format)
 
 
 @api_versions.wraps("2.0", "2.12")
-def _print_server_group_details(cs, server_group):
+def _print_server_group_details(cs, server_group, output_format='table'):
     columns = ['Id', 'Name', 'Policies', 'Members', 'Metadata']
-    utils.print_list(server_group, columns)
+    utils.print_list(server_group, columns, output_format=output_format)
 
 
 @api_versions.wraps("2.13")
-def _print_server_group_details(cs, server_group):    # noqa
+def _print_server_group_details(cs, server_group,    # noqa
+                                output_format='table'):
     columns = ['Id', 'Name', 'Project Id', 'User Id',
                'Policies', 'Members', 'Metadata']
-    utils.print_list(server_group, columns)
+    utils.print_list(server_group, columns, output_format=output_format)
 
 
 @utils.arg(
@@ -4485,7 +4808,8 @@ def do_server_group_list(cs, args):
     server_groups = cs.server_groups.list(all_projects=args.all_projects,
                                           limit=args.limit,
                                           offset=args.offset)
-    _print_server_group_details(cs, server_groups)
+    _print_server_group_details(cs, server_groups,
+                                output_format=args.output_format)
 
 
 @utils.arg('name', metavar='<name>', help=_('Server group name.'))
@@ -4498,7 +4822,8 @@ def do_server_group_create(cs, args):
     """Create a new server group with the specified details."""
     server_group = cs.server_groups.create(name=args.name,
                                            policies=args.policy)
-    _print_server_group_details(cs, [server_group])
+    _print_server_group_details(cs, [server_group],
+                                output_format=args.output_format)
 
 
 @utils.arg(
@@ -4530,7 +4855,8 @@ def do_server_group_delete(cs, args):
 def do_server_group_get(cs, args):
     """Get a specific server group."""
     server_group = cs.server_groups.get(args.id)
-    _print_server_group_details(cs, [server_group])
+    _print_server_group_details(cs, [server_group],
+                                output_format=args.output_format)
 
 
 def do_version_list(cs, args):
@@ -4541,6 +4867,10 @@ def do_version_list(cs, args):
     else:
         columns = ["Id", "Status", "Updated"]
 
+    if args.output_format != 'table':
+        utils.print_list(result, columns, output_format=args.output_format)
+        return
+
     print(_("Client supported API versions:"))
     print(_("Minimum version %(v)s") %
           {'v': novaclient.API_MIN_VERSION.get_string()})
@@ -4558,7 +4888,8 @@ def do_server_tag_list(cs, args):
     server = _find_server(cs, args.server)
     tags = server.tag_list()
     formatters = {'Tag': lambda o: o}
-    utils.print_list(tags, ['Tag'], formatters=formatters)
+    utils.print_list(tags, ['Tag'], formatters=formatters,
+                     output_format=args.output_format)
 
 
 @api_versions.wraps("2.26")
@@ -4611,7 +4942,7 @@ def do_server_tag_delete_all(cs, args):
 def do_cell_show(cs, args):
     """Show details of a given cell."""
     cell = cs.cells.get(args.cell)
-    utils.print_dict(cell.to_dict())
+    utils.print_dict(cell.to_dict(), output_format=args.output_format)
 
 
 @utils.arg(
@@ -4622,6 +4953,9 @@ def do_cell_show(cs, args):
 def do_cell_capacities(cs, args):
     """Get cell capacities for all cells or a given cell."""
     cell = cs.cells.capacities(args.cell)
+    if args.output_format != 'table':
+        utils.print_dict(cell.capacities, output_format=args.output_format)
+        return
     print(_("Ram Available: %s MB") % cell.capacities['ram_free']['total_mb'])
     utils.print_dict(cell.capacities['ram_free']['units_by_mb'],
                      dict_property='Ram(MB)', dict_value="Units")
@@ -4690,6 +5024,164 @@ def _hyper_servers(cs, host, strict):
             raise exceptions.NotFound(404, msg)
 
 
+# Statuses of a migration record once it is not moving the server anymore.
+_MIGRATION_FINAL_STATUSES = ('cancelled', 'completed', 'confirmed', 'done',
+                             'error', 'failed', 'finished', 'reverted')
+
+# Polls after which a migration without any record is considered failed.
+_MAX_POLLS_WITHOUT_MIGRATION = 12
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return '-'
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+def _latest_migration_id(cs, uuid):
+    return max([migration.id for migration in
+                cs.migrations.list(instance_uuid=uuid)] or [0])
+
+
+def _drain_servers(cs, server_list, start_migration, max_in_flight,
+                   max_per_destination=None, poll_period=5, timeout=None):
+    """Migrate servers with a bounded number of migrations in progress.
+
+    A new migration is started only while less than ``max_in_flight`` are
+    in progress and no destination host already runs
+    ``max_per_destination`` of them (the scheduler may pick any host, so
+    a saturated destination holds all new migrations back). Progress is
+    tracked through the migration records of the servers created after the
+    migration was started, i.e. with a greater id than the previous ones,
+    and a line with the throughput and ETA is printed after every poll.
+    A migration without any record after ``_MAX_POLLS_WITHOUT_MIGRATION``
+    polls is considered failed.
+
+    :param timeout: Seconds after which no new migration is started and
+                    the migrations in progress are not waited for anymore
+    :returns: list of the responses of ``start_migration``, each with a
+              ``migration_status`` attribute.
+    """
+    queue = list(server_list)
+    total = len(queue)
+    responses = []
+    # uuid -> [response, id of the latest previous migration, polls]
+    in_flight = {}
+    finished = 0
+    destination_full = False
+    drain_started = time.time()
+    deadline = drain_started + timeout if timeout else None
+
+    while queue or in_flight:
+        if deadline is not None and time.time() >= deadline:
+            for response, _previous, _polls in in_flight.values():
+                response.migration_status = 'timed out'
+            print(_("Timed out with %(in_flight)s migrations in progress "
+                    "and %(queued)s not started.") %
+                  {'in_flight': len(in_flight), 'queued': len(queue)})
+            break
+
+        while (queue and len(in_flight) < max_in_flight and
+                not destination_full):
+            server = queue.pop(0)
+            previous = _latest_migration_id(cs, server['uuid'])
+            response = start_migration(server)
+            responses.append(response)
+            if response.error_message:
+                response.migration_status = '-'
+                finished += 1
+            else:
+                response.migration_status = 'accepted'
+                in_flight[server['uuid']] = [response, previous, 0]
+
+        if not in_flight:
+            continue
+
+        time.sleep(poll_period)
+
+        per_destination = collections.Counter()
+        for uuid, state in list(in_flight.items()):
+            response, previous, polls = state
+            latest = None
+            for migration in cs.migrations.list(instance_uuid=uuid):
+                if migration.id <= previous:
+                    continue
+                if latest is None or migration.id > latest.id:
+                    latest = migration
+            if latest is None:
+                state[2] = polls + 1
+                if state[2] >= _MAX_POLLS_WITHOUT_MIGRATION:
+                    response.migration_status = 'no migration'
+                    del in_flight[uuid]
+                    finished += 1
+                continue
+            response.migration_status = latest.status
+            if latest.status.lower() in _MIGRATION_FINAL_STATUSES:
+                del in_flight[uuid]
+                finished += 1
+            else:
+                per_destination[latest.dest_compute] += 1
+
+        destination_full = bool(
+            max_per_destination and per_destination and
+            max(per_destination.values()) >= max_per_destination)
+
+        elapsed = time.time() - drain_started
+        rate = finished / elapsed if elapsed else 0
+        eta = (total - finished) / rate if rate else None
+        print(_("%(finished)s/%(total)s migrations finished, %(in_flight)s "
+                "in progress, %(rate).1f per minute, ETA %(eta)s") %
+              {'finished': finished, 'total': total,
+               'in_flight': len(in_flight), 'rate': rate * 60,
+               'eta': _format_eta(eta)})
+
+    return responses
+
+
+def _host_migrate_servers(cs, args, servers, start_migration, columns):
+    if args.max_in_flight:
+        responses = _drain_servers(
+            cs, servers, start_migration, args.max_in_flight,
+            max_per_destination=args.max_per_destination,
+            timeout=args.drain_timeout)
+        columns = columns + ["Migration Status"]
+    else:
+        responses = [start_migration(server) for server in servers]
+    utils.print_list(responses, columns, output_format=args.output_format)
+
+
+def _add_drain_args(func):
+    utils.add_arg(
+        func,
+        '--drain-timeout',
+        type=int,
+        dest='drain_timeout',
+        metavar='<seconds>',
+        default=None,
+        help=_('With --max-in-flight, stop starting and waiting for '
+               'migrations after this many seconds.'))
+    utils.add_arg(
+        func,
+        '--max-per-destination',
+        type=int,
+        dest='max_per_destination',
+        metavar='<max_per_destination>',
+        default=None,
+        help=_('With --max-in-flight, do not start new migrations while a '
+               'destination host has this many migrations in progress.'))
+    utils.add_arg(
+        func,
+        '--max-in-flight',
+        type=int,
+        dest='max_in_flight',
+        metavar='<max_in_flight>',
+        default=None,
+        help=_('Wait for the migrations to complete, keeping at most this '
+               'many in progress at the same time, and report throughput '
+               'and ETA.'))
+    return func
+
+
 @utils.arg('host', metavar='<host>',
            help='The hypervisor hostname (or pattern) to search for. '
                 'WARNING: Use a fully qualified domain name if you only '
@@ -4721,16 +5213,13 @@ def _hyper_servers(cs, host, strict):
     action='store_true',
     default=False,
     help=_('Evacuate host with exact hypervisor hostname match'))
+@_add_drain_args
 def do_host_evacuate(cs, args):
     """Evacuate all instances from failed host."""
-    response = []
-    for server in _hyper_servers(cs, args.host, args.strict):
-        response.append(_server_evacuate(cs, server, args))
-    utils.print_list(response, [
-        "Server UUID",
-        "Evacuate Accepted",
-        "Error Message",
-    ])
+    _host_migrate_servers(
+        cs, args, _hyper_servers(cs, args.host, args.strict),
+        lambda server: _server_evacuate(cs, server, args),
+        ["Server UUID", "Evacuate Accepted", "Error Message"])
 
 
 def _server_live_migrate(cs, server, args):
@@ -4806,23 +5295,21 @@ def _server_live_migrate(cs, server, args):
     action='store_true',
     default=False,
     help=_('live Evacuate host with exact hypervisor hostname match'))
+@_add_drain_args
 def do_host_evacuate_live(cs, args):
     """Live migrate all instances of the specified host
     to other available hosts.
     """
-    response = []
-    migrating = 0
+    servers = []
     for server in _hyper_servers(cs, args.host, args.strict):
-        response.append(_server_live_migrate(cs, server, args))
-        migrating = migrating + 1
+        servers.append(server)
         if (args.max_servers is not None and
-                migrating >= args.max_servers):
+                len(servers) >= args.max_servers):
             break
-    utils.print_list(response, [
-        "Server UUID",
-        "Live Migration Accepted",
-        "Error Message",
-    ])
+    _host_migrate_servers(
+        cs, args, servers,
+        lambda server: _server_live_migrate(cs, server, args),
+        ["Server UUID", "Live Migration Accepted", "Error Message"])
 
 
 class HostServersMigrateResponse(base.Resource):
@@ -4853,18 +5340,15 @@ def _server_migrate(cs, server):
     action='store_true',
     default=False,
     help=_('Migrate host with exact hypervisor hostname match'))
+@_add_drain_args
 def do_host_servers_migrate(cs, args):
     """Cold migrate all instances off the specified host to other available
     hosts.
     """
-    response = []
-    for server in _hyper_servers(cs, args.host, args.strict):
-        response.append(_server_migrate(cs, server))
-    utils.print_list(response, [
-        "Server UUID",
-        "Migration Accepted",
-        "Error Message",
-    ])
+    _host_migrate_servers(
+        cs, args, _hyper_servers(cs, args.host, args.strict),
+        lambda server: _server_migrate(cs, server),
+        ["Server UUID", "Migration Accepted", "Error Message"])
 
 
 @utils.arg(
@@ -4892,7 +5376,7 @@ def do_instance_action(cs, args):
     action = action_resource.to_dict()
     if 'events' in action:
         action['events'] = pprint.pformat(action['events'])
-    utils.print_dict(action)
+    utils.print_dict(action, output_format=args.output_format)
 
 
 @api_versions.wraps("2.0", "2.57")
@@ -4916,7 +5400,8 @@ def do_instance_action_list(cs, args):
     actions = cs.instance_action.list(server)
     utils.print_list(actions,
                      ['Action', 'Request_ID', 'Message', 'Start_Time'],
-                     sortby_index=3)
+                     sortby_index=3,
+                     output_format=args.output_format)
 
 
 @api_versions.wraps("2.58")
@@ -4966,16 +5451,17 @@ def do_instance_action_list(cs, args):
     utils.print_list(actions,
                      ['Action', 'Request_ID', 'Message', 'Start_Time',
                       'Updated_At'],
-                     sortby_index=3)
+                     sortby_index=3,
+                     output_format=args.output_format)
 
 
-def do_list_extensions(cs, _args):
+def do_list_extensions(cs, args):
     """
     List all the os-api extensions that are available.
     """
     extensions = cs.list_extensions.show_all()
     fields = ["Name", "Summary", "Alias", "Updated"]
-    utils.print_list(extensions, fields)
+    utils.print_list(extensions, fields, output_format=args.output_format)
 
 
 @utils.arg('host', metavar='<host>',
@@ -5010,7 +5496,7 @@ def do_host_meta(cs, args):
             cs.servers.delete_meta(server['uuid'], metadata.keys())
 
 
-def _print_migrations(cs, migrations):
+def _print_migrations(cs, migrations, output_format='table'):
     fields = ['Source Node', 'Dest Node', 'Source Compute', 'Dest Compute',
               'Dest Host', 'Status', 'Instance UUID', 'Old Flavor',
               'New Flavor', 'Created At', 'Updated At']
@@ -5035,7 +5521,8 @@ def _print_migrations(cs, migrations):
         fields.append("Type")
         formatters.update({"Type": migration_type})
 
-    utils.print_list(migrations, fields, formatters)
+    utils.print_list(migrations, fields, formatters,
+                     output_format=output_format)
 
 
 @api_versions.wraps("2.0", "2.58")
@@ -5058,7 +5545,7 @@ def do_migration_list(cs, args):
     """Print a list of migrations."""
     migrations = cs.migrations.list(args.host, args.status,
                                     instance_uuid=args.instance_uuid)
-    _print_migrations(cs, migrations)
+    _print_migrations(cs, migrations, output_format=args.output_format)
 
 
 @api_versions.wraps("2.59")
@@ -5117,7 +5604,7 @@ def do_migration_list(cs, args):
                                     marker=args.marker, limit=args.limit,
                                     changes_since=args.changes_since)
     # TODO(yikun): Output a "Marker" column if there is a next link?
-    _print_migrations(cs, migrations)
+    _print_migrations(cs, migrations, output_format=args.output_format)
 
 
 @utils.arg(
@@ -5134,4 +5621,4 @@ def do_instance_usage_audit_log(cs, args):
     audit_log = cs.instance_usage_audit_log.get(before=args.before).to_dict()
     if 'hosts_not_run' in audit_log:
         audit_log['hosts_not_run'] = pprint.pformat(audit_log['hosts_not_run'])
-    utils.print_dict(audit_log)
+    utils.print_dict(audit_log, output_format=args.output_format)
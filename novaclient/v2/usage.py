@@ -15,10 +15,22 @@
 Usage interface.
 """
 
+import collections
+import datetime
+
 import oslo_utils
 
 from novaclient import api_versions
 from novaclient import base
+from novaclient.i18n import _
+from novaclient import utils
+
+# Length of the time windows whose usage is fetched concurrently by
+# UsageManager.collect.
+DEFAULT_WINDOW = datetime.timedelta(days=1)
+
+_TOTALS = ('total_hours', 'total_memory_mb_usage', 'total_vcpus_usage',
+           'total_local_gb_usage')
 
 
 class Usage(base.Resource):
@@ -126,3 +138,81 @@ class UsageManager(base.ManagerWithFind):
         query_string = self._usage_query(start, end, marker, limit)
         url = '/%s/%s%s' % (self.usage_prefix, tenant_id, query_string)
         return self._get(url, 'tenant_usage')
+
+    def _list_window(self, window):
+        """Returns the totals of the tenants over a time window.
+
+        The pages of the window are merged as they are received, only the
+        IDs of the servers of their usage are kept.
+        """
+        start, end = window
+        paginated = self.api_version >= api_versions.APIVersion("2.40")
+        totals = collections.OrderedDict()
+        marker = None
+        while True:
+            if paginated:
+                usage_list = self.list(start, end, detailed=True,
+                                       marker=marker)
+            else:
+                usage_list = self.list(start, end, detailed=True)
+            marker = None
+            for usage in usage_list:
+                info = usage._info
+                server_usages = info.get('server_usages') or []
+                tenant = totals.setdefault(
+                    info['tenant_id'],
+                    (dict((key, 0) for key in _TOTALS), set()))
+                for key in _TOTALS:
+                    tenant[0][key] += info.get(key) or 0
+                tenant[1].update(server['instance_id']
+                                 for server in server_usages)
+                if server_usages:
+                    marker = server_usages[-1]['instance_id']
+            if not paginated or not marker:
+                return totals
+
+    def collect(self, start, end, window=DEFAULT_WINDOW, concurrency=4):
+        """
+        Get usage for all tenants, fetched by time windows concurrently.
+
+        The usage of the windows is merged into per-tenant totals as the
+        windows are received, so the usage of each server is not kept. The
+        :class:`Usage` returned have a ``server_count`` attribute, the number
+        of servers of the tenant over the whole range, instead of their
+        ``server_usages``.
+
+        :param start: :class:`datetime.datetime` Start date in UTC
+        :param end: :class:`datetime.datetime` End date in UTC
+        :param window: :class:`datetime.timedelta` Length of the windows
+        :param concurrency: Maximum number of windows fetched at once
+        :rtype: list of :class:`Usage`.
+        """
+        if window <= datetime.timedelta(0):
+            raise ValueError(_("The usage window must be positive."))
+        windows = []
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + window, end)
+            windows.append((window_start, window_end))
+            window_start = window_end
+
+        totals = collections.OrderedDict()
+        for _window, window_totals, error in utils.run_concurrently(
+                self._list_window, windows, concurrency):
+            if error is not None:
+                raise error
+            for tenant_id, (tenant_totals, server_ids) in (
+                    window_totals.items()):
+                tenant = totals.setdefault(
+                    tenant_id, (dict((key, 0) for key in _TOTALS), set()))
+                for key in _TOTALS:
+                    tenant[0][key] += tenant_totals[key]
+                tenant[1].update(server_ids)
+
+        usages = []
+        for tenant_id, (tenant_totals, server_ids) in totals.items():
+            info = dict(tenant_totals, tenant_id=tenant_id,
+                        start=start.isoformat(), stop=end.isoformat(),
+                        server_count=len(server_ids))
+            usages.append(self.resource_class(self, info, loaded=True))
+        return usages